@@ -1,7 +1,7 @@
 import { GoogleGenerativeAI } from "@google/generative-ai";
 import cors from "cors";
 import dotenv from "dotenv";
-import express, { Request, Response } from "express";
+import express, { NextFunction, Request, Response } from "express";
 import axios from "axios";
 import OpenAI from "openai";
 
@@ -28,6 +28,48 @@ app.use(express.urlencoded({ limit: '50mb', extended: true }));
 // Python Flask server URL
 const PYTHON_SERVER_URL = "http://localhost:8090";
 
+// Sent with every agent request; the agent only accepts X-User-Id with it
+const AGENT_SHARED_SECRET = process.env.AGENT_SHARED_SECRET || "";
+// OAuth client whose Google ID tokens sign users in (per-user calendars)
+const GOOGLE_CLIENT_ID = process.env.GOOGLE_CLIENT_ID || "";
+
+// Sign a user in from a Google ID token ("Authorization: Bearer <token>").
+// The user's verified email is forwarded to the agent as X-User-Id, so each
+// user reads their own calendar; requests without a token read the agent's.
+const authenticateUser = async (req: Request, res: Response, next: NextFunction) => {
+  const match = /^Bearer (.+)$/.exec(req.get("Authorization") || "");
+  if (!match) {
+    return next();
+  }
+  if (!GOOGLE_CLIENT_ID || !AGENT_SHARED_SECRET) {
+    return res.status(401).json({ error: "Sign-in is not configured" });
+  }
+  try {
+    const { data } = await axios.get("https://oauth2.googleapis.com/tokeninfo", {
+      params: { id_token: match[1] },
+    });
+    if (data.aud !== GOOGLE_CLIENT_ID || data.email_verified !== "true" || !data.email) {
+      return res.status(401).json({ error: "ID token was not issued for this app" });
+    }
+    res.locals.userId = data.email;
+    next();
+  } catch {
+    res.status(401).json({ error: "Invalid or expired ID token" });
+  }
+};
+app.use("/calendar", authenticateUser);
+
+// Headers identifying this proxy, and the signed-in user, to the agent
+const agentHeaders = (res: Response, headers: Record<string, string> = {}) => {
+  if (AGENT_SHARED_SECRET) {
+    headers["X-Agent-Secret"] = AGENT_SHARED_SECRET;
+  }
+  if (res.locals.userId) {
+    headers["X-User-Id"] = res.locals.userId;
+  }
+  return headers;
+};
+
 // Agent Card endpoint
 app.get("/.well-known/agent.json", (_req, res) => {
   res.json({
@@ -82,12 +124,29 @@ app.get("/health", async (_req, res) => {
   }
 });
 
-// Get calendar events endpoint
+// Relay a GET of an event list, passing the client's validator through so an
+// unchanged calendar is answered with 304 by the Python agent and here.
+const relayEventList = async (path: string, req: Request, res: Response) => {
+  const ifNoneMatch = req.get("If-None-Match");
+  const response = await axios.get(`${PYTHON_SERVER_URL}${path}`, {
+    params: req.query,
+    headers: agentHeaders(res, ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {}),
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.headers.etag) {
+    res.setHeader("ETag", response.headers.etag);
+    res.setHeader("Cache-Control", "private, no-cache");
+  }
+  if (response.status === 304) {
+    return res.status(304).end();
+  }
+  res.json(response.data);
+};
+
+// Get calendar events endpoint (max_results, timezone, fields, format=columns)
 app.get("/calendar/events", async (req: Request, res: Response) => {
   try {
-    const maxResults = req.query.max_results || 10;
-    const response = await axios.get(`${PYTHON_SERVER_URL}/events?max_results=${maxResults}`);
-    res.json(response.data);
+    await relayEventList("/events", req, res);
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : "An unknown error occurred.";
     console.error("Calendar Events Error:", errorMessage);
@@ -95,11 +154,10 @@ app.get("/calendar/events", async (req: Request, res: Response) => {
   }
 });
 
-// Get today's events endpoint
-app.get("/calendar/today", async (_req: Request, res: Response) => {
+// Get today's events endpoint (timezone, fields, format=columns)
+app.get("/calendar/today", async (req: Request, res: Response) => {
   try {
-    const response = await axios.get(`${PYTHON_SERVER_URL}/today`);
-    res.json(response.data);
+    await relayEventList("/today", req, res);
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : "An unknown error occurred.";
     console.error("Today's Events Error:", errorMessage);
@@ -119,7 +177,7 @@ app.post("/calendar/freebusy", async (req: Request, res: Response) => {
     const response = await axios.post(`${PYTHON_SERVER_URL}/freebusy`, {
       start_date,
       end_date
-    });
+    }, { headers: agentHeaders(res) });
     res.json(response.data);
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : "An unknown error occurred.";
@@ -128,17 +186,84 @@ app.post("/calendar/freebusy", async (req: Request, res: Response) => {
   }
 });
 
+// Batched free/busy status for many calendars endpoint
+app.post("/calendar/freebusy/batch", async (req: Request, res: Response) => {
+  try {
+    const { calendars, start_date, end_date, timezone } = req.body;
+    
+    if (!start_date || !end_date) {
+      return res.status(400).json({ error: "start_date and end_date are required" });
+    }
+    if (!Array.isArray(calendars) || calendars.length === 0) {
+      return res.status(400).json({ error: "calendars is required" });
+    }
+    
+    const response = await axios.post(`${PYTHON_SERVER_URL}/freebusy/batch`, {
+      calendars,
+      start_date,
+      end_date,
+      timezone
+    }, { headers: agentHeaders(res) });
+    res.json(response.data);
+  } catch (error) {
+    const errorMessage = error instanceof Error ? error.message : "An unknown error occurred.";
+    console.error("Batch Free/Busy Error:", errorMessage);
+    res.status(500).json({ error: errorMessage });
+  }
+});
+
+// Dashboard endpoint: today's events, upcoming events and free/busy in one call
+app.get("/calendar/dashboard", async (req: Request, res: Response) => {
+  try {
+    const response = await axios.get(`${PYTHON_SERVER_URL}/dashboard`, {
+      params: req.query,
+      headers: agentHeaders(res)
+    });
+    res.json(response.data);
+  } catch (error) {
+    const errorMessage = error instanceof Error ? error.message : "An unknown error occurred.";
+    console.error("Dashboard Error:", errorMessage);
+    res.status(500).json({ error: errorMessage });
+  }
+});
+
 // AI calendar query endpoint
 app.post("/calendar/ai-query", async (req: Request, res: Response) => {
   try {
-    const { question } = req.body;
-    
+    const { question, timezone, stream, include_calendar_data, fields } = req.body;
+
     if (!question) {
       return res.status(400).json({ error: "question is required" });
     }
-    
-    const response = await axios.post(`${PYTHON_SERVER_URL}/ai-query`, {
-      question
+
+    const payload = {
+      question,
+      timezone,
+      stream: Boolean(stream),
+      // Left to the agent's default (echoed) unless the client says otherwise
+      ...(include_calendar_data !== undefined && {
+        include_calendar_data: Boolean(include_calendar_data),
+      }),
+      fields,
+    };
+
+    if (stream) {
+      // Relay server-sent events from the Python agent as they arrive
+      const upstream = await axios.post(`${PYTHON_SERVER_URL}/ai-query`, payload, {
+        responseType: "stream",
+        headers: agentHeaders(res),
+      });
+      res.setHeader("Content-Type", "text/event-stream");
+      res.setHeader("Cache-Control", "no-cache");
+      res.setHeader("X-Accel-Buffering", "no");
+      res.flushHeaders();
+      upstream.data.pipe(res);
+      req.on("close", () => upstream.data.destroy());
+      return;
+    }
+
+    const response = await axios.post(`${PYTHON_SERVER_URL}/ai-query`, payload, {
+      headers: agentHeaders(res),
     });
     res.json(response.data);
   } catch (error) {
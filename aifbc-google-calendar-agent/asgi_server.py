@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""
+Asyncio (ASGI) serving mode for the calendar agent.
+
+Serves the same routes as server.py from an event loop. Routes that only
+read local state (/health, /metrics) are answered inline on the loop; the
+others first wait for a slot of the Calendar concurrency limit and then run
+on a bounded thread pool. Requests waiting for a slot hold no thread.
+
+/ai-query reads the calendar with a Calendar slot too, and only when it is
+about to call Gemini (not for cached or routed answers) trades that slot for
+a Gemini one, which it keeps while the answer streams (see Slots). AI
+questions run on threads of their own, so those waiting for Gemini never
+take the threads Calendar routes need, and a burst of slow questions queues
+behind the Gemini limit without starving /health and /freebusy.
+
+Run with:
+    python asgi_server.py
+or:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 8090
+"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from server import app as flask_app
+
+ASYNC_CALENDAR_CONCURRENCY = int(os.getenv("ASYNC_CALENDAR_CONCURRENCY", "16"))
+ASYNC_GEMINI_CONCURRENCY = int(os.getenv("ASYNC_GEMINI_CONCURRENCY", "4"))
+# Threads for AI questions, whether reading the calendar, waiting for Gemini
+# or streaming its answer.
+ASYNC_AI_WORKERS = int(
+    os.getenv("ASYNC_AI_WORKERS", str(ASYNC_CALENDAR_CONCURRENCY + ASYNC_GEMINI_CONCURRENCY))
+)
+
+# Routes answered on the event loop without touching an upstream.
+INLINE_ROUTES = {"/health", "/metrics"}
+# Routes that may trade their Calendar slot for a Gemini one.
+AI_ROUTES = {"/ai-query"}
+
+UPSTREAM_LIMITS = {
+    "calendar": ASYNC_CALENDAR_CONCURRENCY,
+    "gemini": ASYNC_GEMINI_CONCURRENCY,
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=ASYNC_CALENDAR_CONCURRENCY, thread_name_prefix="asgi-upstream"
+)
+_ai_executor = ThreadPoolExecutor(max_workers=ASYNC_AI_WORKERS, thread_name_prefix="asgi-ai")
+_semaphores = {}
+
+
+def _no_write(data):
+    raise Exception("The WSGI write() callable is not supported")
+
+
+def build_environ(scope, body: bytes):
+    """Build a WSGI environ for an ASGI HTTP scope and its request body."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = name
+        else:
+            key = f"HTTP_{name}"
+        if key in environ and key.startswith("HTTP_"):
+            value = f"{environ[key]},{value}"
+        environ[key] = value
+    return environ
+
+
+def run_wsgi(environ, emit, cancelled):
+    """Run the Flask app for one request, passing its output to `emit`.
+
+    Emits ("start", status, headers), then ("body", chunk) per chunk, and
+    always ("end", error). The response body is iterated on the calling
+    thread, which keeps streamed responses inside their request context.
+    """
+    error = None
+    try:
+        def start_response(status, headers, exc_info=None):
+            emit(("start", int(status.split(" ", 1)[0]), headers))
+            return _no_write
+
+        result = flask_app(environ, start_response)
+        try:
+            for chunk in result:
+                if cancelled.is_set():
+                    break
+                if chunk:
+                    emit(("body", chunk))
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+    except Exception as e:
+        error = e
+    emit(("end", error))
+
+
+async def _read_body(receive) -> bytes:
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.extend(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return bytes(body)
+
+
+def _semaphore(upstream):
+    # Created lazily so they bind to the serving loop.
+    if upstream not in _semaphores:
+        _semaphores[upstream] = asyncio.Semaphore(UPSTREAM_LIMITS[upstream])
+    return _semaphores[upstream]
+
+
+class Slots:
+    """The upstream slot one request holds.
+
+    The request's worker thread calls `enter(upstream)` (server.py passes it
+    on as the "aifbc.enter_upstream" environ key) before it calls another
+    upstream: the slot held is given back and the thread waits for one of
+    that upstream's.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.held = None
+
+    async def take(self, upstream):
+        await _semaphore(upstream).acquire()
+        self.held = upstream
+
+    def enter(self, upstream):
+        if self.held == upstream:
+            return
+        if self.held is not None:
+            self.loop.call_soon_threadsafe(_semaphore(self.held).release)
+            self.held = None
+        asyncio.run_coroutine_threadsafe(self.take(upstream), self.loop).result()
+
+    def release(self):
+        if self.held is not None:
+            _semaphore(self.held).release()
+            self.held = None
+
+
+async def _relay(queue, send, cancelled):
+    """Send queued WSGI output to the ASGI client."""
+    started = False
+    try:
+        while True:
+            item = await queue.get()
+            if item[0] == "start":
+                _, status, headers = item
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": status,
+                        "headers": [
+                            (name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in headers
+                        ],
+                    }
+                )
+                started = True
+            elif item[0] == "body":
+                await send({"type": "http.response.body", "body": item[1], "more_body": True})
+            else:
+                error = item[1]
+                if error is not None:
+                    print(f"Error serving request: {error}")
+                if not started:
+                    await send(
+                        {
+                            "type": "http.response.start",
+                            "status": 500,
+                            "headers": [(b"content-type", b"text/plain")],
+                        }
+                    )
+                    await send({"type": "http.response.body", "body": b"Internal Server Error"})
+                else:
+                    await send({"type": "http.response.body", "body": b""})
+                return
+    except OSError:
+        # Client went away; stop producing the rest of the body.
+        cancelled.set()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=False)
+            _ai_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    environ = build_environ(scope, await _read_body(receive))
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    if scope["path"] in INLINE_ROUTES:
+        run_wsgi(environ, queue.put_nowait, cancelled)
+        await _relay(queue, send, cancelled)
+        return
+
+    def emit(item):
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    slots = Slots(loop)
+    if scope["path"] in AI_ROUTES:
+        # Take the Calendar slot once a thread runs the question, so questions
+        # queued for a thread hold no slot.
+        environ["aifbc.enter_upstream"] = slots.enter
+
+        def run():
+            slots.enter("calendar")
+            run_wsgi(environ, emit, cancelled)
+
+        worker = loop.run_in_executor(_ai_executor, run)
+    else:
+        await slots.take("calendar")
+        worker = loop.run_in_executor(_executor, run_wsgi, environ, emit, cancelled)
+    try:
+        await _relay(queue, send, cancelled)
+        await worker
+    finally:
+        slots.release()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8090)
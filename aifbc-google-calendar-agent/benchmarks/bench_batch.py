@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Compare a cold dashboard load as separate Calendar reads and as one batch.
+
+"Separate" is what the frontend triggers through /today, /events, /ai-query
+and /freebusy/batch: one events().list per cold window or upcoming lookup
+plus the free/busy queries. "Batched" is fetch_dashboard behind /dashboard.
+Both run against the in-process fake Calendar API with a per-round-trip
+latency, starting from an empty event cache each time.
+
+Usage:
+    python benchmarks/bench_batch.py [--latency 0.1] [--calendars 1,5,20,100]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+
+from benchmarks.fake_calendar import FakeCalendarService, synthetic_events
+from calendar_core import (
+    day_range,
+    event_store,
+    fetch_dashboard,
+    fetch_today_events,
+    fetch_upcoming_events,
+    get_calendar_data,
+)
+from freebusy import query_freebusy
+
+TIMEZONE = "Asia/Bangkok"
+
+
+def load_separately(service, calendar_ids):
+    fetch_today_events(service, TIMEZONE)
+    fetch_upcoming_events(service, 10)
+    get_calendar_data(service, timezone_str=TIMEZONE)
+    _, start, end = day_range(TIMEZONE)
+    query_freebusy(
+        lambda token: service, [(calendar_id, None) for calendar_id in calendar_ids], start, end
+    )
+
+
+def load_batched(service, calendar_ids):
+    fetch_dashboard(service, TIMEZONE, 10, calendar_ids)
+
+
+def measure(load, service, calendar_ids, rounds):
+    """Return (best seconds, round trips) over `rounds` cold loads."""
+    best = None
+    for _ in range(rounds):
+        event_store.invalidate()
+        service.calls = 0
+        started = time.perf_counter()
+        load(service, calendar_ids)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, service.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per round trip")
+    parser.add_argument("--calendars", default="1,5,20,100")
+    parser.add_argument("--events", type=int, default=300, help="events per calendar")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    counts = [int(count) for count in args.calendars.split(",")]
+    calendar_ids = ["primary"] + [f"user{i}@example.com" for i in range(max(counts) - 1)]
+    _, start, _ = day_range(TIMEZONE)
+    service = FakeCalendarService(
+        {
+            calendar_id: synthetic_events(args.events, start - timedelta(days=1), seed=i)
+            for i, calendar_id in enumerate(calendar_ids)
+        },
+        latency=args.latency,
+    )
+
+    print(
+        f"{'calendars':>9} {'separate trips':>14} {'separate ms':>11} "
+        f"{'batched trips':>13} {'batched ms':>10} {'speedup':>8}"
+    )
+    for count in counts:
+        ids = calendar_ids[:count]
+        separate, separate_calls = measure(load_separately, service, ids, args.rounds)
+        batched, batched_calls = measure(load_batched, service, ids, args.rounds)
+        print(
+            f"{count:>9} {separate_calls:>14} {separate * 1000:>11.1f} "
+            f"{batched_calls:>13} {batched * 1000:>10.1f} {separate / batched:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Time a cold event window with and without the persistent event store.
+
+Simulates a restart: the in-memory cache is emptied and the same range is
+read again, once with nothing on disk (a full download through the fake
+Calendar API) and once restored from the SQLite store plus an incremental
+sync. Also times indexed range lookups straight from the store.
+
+Usage:
+    python benchmarks/bench_event_db.py [--events 20000] [--days 365] [--latency 0.1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+
+import pytz
+
+from benchmarks.fake_calendar import FakeCalendarService, synthetic_events
+from event_db import EventDatabase
+from event_store import EventStore
+
+
+def cold_read(store, service, time_min, time_max):
+    """Return (seconds, round trips, events) for reading a range from cold."""
+    store._windows.clear()
+    service.calls = 0
+    started = time.perf_counter()
+    events = store.get_events(service, "primary", time_min, time_max)
+    return time.perf_counter() - started, service.calls, len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per page")
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    now = datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    time_min = now - timedelta(days=args.days)
+    service = FakeCalendarService(
+        {"primary": synthetic_events(args.events, time_min, days=args.days)},
+        latency=args.latency,
+    )
+    path = os.path.join(tempfile.mkdtemp(), "events.db")
+    store = EventStore(max_events=10**9, database=EventDatabase(path))
+
+    full = cold_read(store, service, time_min, now)
+    restored = cold_read(store, service, time_min, now)
+    print(f"{'':>10} {'seconds':>8} {'round trips':>11} {'events':>7}")
+    for name, (seconds, calls, count) in (("download", full), ("restore", restored)):
+        print(f"{name:>10} {seconds:>8.3f} {calls:>11} {count:>7}")
+
+    started = time.perf_counter()
+    for i in range(args.lookups):
+        day = time_min + timedelta(days=i % args.days)
+        store.database.query("primary", day, day + timedelta(days=1))
+    elapsed = time.perf_counter() - started
+    print(f"indexed day lookup: {elapsed / args.lookups * 1e6:.1f} µs")
+    size = sum(
+        os.path.getsize(name) for name in (path, path + "-wal") if os.path.exists(name)
+    )
+    print(f"database: {path} ({size / 1e6:.1f} MB with its write-ahead log)")
+
+
+if __name__ == "__main__":
+    main()
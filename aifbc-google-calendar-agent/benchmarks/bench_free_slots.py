@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark the free-slot engine on many attendees over a quarter.
+
+Attendees draw their busy blocks from a shared pool of meetings, as
+colleagues do, so the calendars overlap and free slots remain. Every slot
+found is checked against the busy blocks.
+
+Usage:
+    python benchmarks/bench_free_slots.py [--attendees 100,300,500] [--events 400]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+
+from free_slots import find_free_slots, to_epoch, union_intervals
+
+
+def overlaps_busy(slot, busy_starts, busy_ends):
+    """Whether a (start, end, ...) slot overlaps any merged busy interval."""
+    index = bisect_right(busy_starts, slot[0]) - 1
+    if index >= 0 and busy_ends[index] > slot[0]:
+        return True
+    return index + 1 < len(busy_starts) and busy_starts[index + 1] < slot[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attendees", default="100,300,500")
+    parser.add_argument("--events", type=int, default=400, help="busy blocks per attendee")
+    parser.add_argument("--meetings", type=int, default=800, help="shared meeting pool")
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    time_min = datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    time_max = time_min + timedelta(days=args.days)
+    lower = to_epoch(time_min)
+    quarter_hours = args.days * 24 * 4
+    timezones = ["Asia/Bangkok", "Asia/Ho_Chi_Minh", "Asia/Singapore", "Asia/Tokyo"]
+
+    meetings = []
+    for _ in range(args.meetings):
+        start = lower + rng.randrange(quarter_hours) * 900
+        meetings.append((start, start + rng.choice((1800, 3600, 5400))))
+
+    print(f"{'attendees':>10} {'intervals':>10} {'slots':>6} {'time (ms)':>10}")
+    for attendees in (int(count) for count in args.attendees.split(",")):
+        busy = [rng.choice(meetings) for _ in range(attendees * args.events)]
+        attendee_hours = [(timezones[i % len(timezones)], None) for i in range(attendees)]
+
+        started = time.perf_counter()
+        slots = find_free_slots(busy, time_min, time_max, attendee_hours, limit=0)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        busy_starts, busy_ends = union_intervals(*zip(*busy))
+        clashing = [slot for slot in slots if overlaps_busy(slot, busy_starts, busy_ends)]
+        if clashing:
+            sys.exit(f"{len(clashing)} slots overlap busy time, e.g. {clashing[0]}")
+
+        print(f"{attendees:>10} {len(busy):>10} {len(slots):>6} {elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
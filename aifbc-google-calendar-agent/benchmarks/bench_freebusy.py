@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark free/busy lookups as the number of calendars grows.
+
+Compares one freebusy().query per calendar (what the Express agent has to do
+against /freebusy today) with the chunked, concurrent fan-out behind
+/freebusy/batch, against the in-process fake Calendar API.
+
+Usage:
+    python benchmarks/bench_freebusy.py [--latency 0.05] [--counts 1,10,50,200,500]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+
+import pytz
+
+from benchmarks.fake_calendar import FakeCalendarService, synthetic_events
+from freebusy import query_freebusy
+
+
+def run_sequential(service, calendar_ids, time_min, time_max):
+    for calendar_id in calendar_ids:
+        query_freebusy(
+            lambda token: service, [(calendar_id, None)], time_min, time_max
+        )
+
+
+def run_batched(service, calendar_ids, time_min, time_max):
+    query_freebusy(
+        lambda token: service,
+        [(calendar_id, None) for calendar_id in calendar_ids],
+        time_min,
+        time_max,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+    parser.add_argument("--counts", default="1,10,50,200,500")
+    parser.add_argument("--events", type=int, default=40, help="events per calendar")
+    args = parser.parse_args()
+
+    counts = [int(count) for count in args.counts.split(",")]
+    time_min = datetime.now(pytz.utc)
+    time_max = time_min + timedelta(days=7)
+    calendars = {
+        f"user{i}@example.com": synthetic_events(args.events, seed=i)
+        for i in range(max(counts))
+    }
+    service = FakeCalendarService(calendars, latency=args.latency)
+
+    print(f"{'calendars':>10} {'sequential (s)':>15} {'batched (s)':>12} {'calls':>6}")
+    for count in counts:
+        calendar_ids = list(calendars)[:count]
+
+        started = time.perf_counter()
+        run_sequential(service, calendar_ids, time_min, time_max)
+        sequential = time.perf_counter() - started
+
+        service.calls = 0
+        started = time.perf_counter()
+        run_batched(service, calendar_ids, time_min, time_max)
+        batched = time.perf_counter() - started
+
+        print(f"{count:>10} {sequential:>15.3f} {batched:>12.3f} {service.calls:>6}")
+
+
+if __name__ == "__main__":
+    main()
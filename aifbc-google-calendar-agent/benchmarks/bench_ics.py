@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Generate a large synthetic ICS file and time loading it into the ICS backend.
+
+Most events are one-off TZID-qualified meetings; every 50th is a weekly
+series with an EXDATE, to exercise RRULE expansion.
+
+Usage:
+    python benchmarks/bench_ics.py [--events 100000] [--keep path.ics]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ics_backend import load_ics
+
+ICS_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def write_synthetic_ics(path, count, seed=0, timezone_str="Asia/Ho_Chi_Minh"):
+    """Write `count` VEVENTs spread over two years around today."""
+    rng = random.Random(seed)
+    origin = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    origin -= timedelta(days=365)
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//AIFBC Benchmark//EN\r\n")
+        for i in range(count):
+            start = origin + timedelta(
+                days=rng.randrange(730), hours=rng.randrange(8, 18), minutes=rng.choice((0, 30))
+            )
+            end = start + timedelta(minutes=rng.choice((30, 60, 90)))
+            out.write("BEGIN:VEVENT\r\n")
+            out.write(f"UID:bench-{i}@example.com\r\n")
+            out.write(f"DTSTART;TZID={timezone_str}:{start.strftime(ICS_FORMAT)}\r\n")
+            out.write(f"DTEND;TZID={timezone_str}:{end.strftime(ICS_FORMAT)}\r\n")
+            out.write(f"SUMMARY:Synthetic meeting {i}\r\n")
+            out.write("LOCATION:Room 1\r\n")
+            out.write(
+                "DESCRIPTION:Generated for load testing\\, with an escaped comma\r\n"
+                " and a folded continuation line.\r\n"
+            )
+            if i % 50 == 0:
+                out.write("RRULE:FREQ=WEEKLY;COUNT=20\r\n")
+                skipped = start + timedelta(weeks=2)
+                out.write(f"EXDATE;TZID={timezone_str}:{skipped.strftime(ICS_FORMAT)}\r\n")
+            out.write("END:VEVENT\r\n")
+        out.write("END:VCALENDAR\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--keep", help="write the ICS file here instead of a temp file")
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "synthetic.ics")
+    started = time.perf_counter()
+    write_synthetic_ics(path, args.events)
+    generated = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = load_ics(path)
+    loaded = time.perf_counter() - started
+
+    started = time.perf_counter()
+    now = int(time.time())
+    week = index.query(now, now + 7 * 86400)
+    queried = time.perf_counter() - started
+
+    print(f"file:      {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    print(f"generate:  {generated:.2f} s")
+    print(f"load:      {loaded:.2f} s ({len(index)} indexed events)")
+    print(f"week query: {queried * 1000:.2f} ms ({len(week)} events)")
+
+    if not args.keep:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
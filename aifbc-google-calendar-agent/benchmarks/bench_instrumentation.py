@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Measure the overhead of the built-in instrumentation, enabled and disabled.
+
+Times a bare `stage()` block against an empty loop, then serves warm-cache
+/today and /events requests through the Flask test client with the
+instrumentation switched on and off (alternating rounds to even out noise).
+
+Usage:
+    python benchmarks/bench_instrumentation.py [--iterations 200000] [--requests 2000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+os.environ.setdefault("PREFETCH_ENABLED", "false")
+
+import pytz
+
+import calendar_core
+import instrumentation
+import server
+from benchmarks.fake_calendar import FakeCalendarService, synthetic_events
+
+
+def time_stage_calls(iterations):
+    """Return ns per iteration of an empty loop and of a `stage()` block."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    empty = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with instrumentation.stage("bench"):
+            pass
+    staged = time.perf_counter() - started
+    return empty / iterations * 1e9, staged / iterations * 1e9
+
+
+def time_requests(client, paths, count):
+    """Return mean µs per request over `count` requests cycling through paths."""
+    started = time.perf_counter()
+    for i in range(count):
+        response = client.get(paths[i % len(paths)])
+        response.close()
+        if response.status_code != 200:
+            raise Exception(f"{paths[i % len(paths)]} returned {response.status_code}")
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--events", type=int, default=500)
+    args = parser.parse_args()
+
+    for enabled in (False, True):
+        instrumentation.INSTRUMENTATION_ENABLED = enabled
+        empty_ns, staged_ns = time_stage_calls(args.iterations)
+        print(
+            f"stage() {'enabled ' if enabled else 'disabled'}: "
+            f"{staged_ns - empty_ns:7.1f} ns per block"
+        )
+
+    now = datetime.now(pytz.utc)
+    service = FakeCalendarService(
+        {"primary": synthetic_events(args.events, now - timedelta(days=1))}
+    )
+    calendar_core.service_holder.get_service = lambda: service
+    client = server.app.test_client()
+    paths = ["/today", "/events?max_results=10"]
+    time_requests(client, paths, 50)  # warm the event cache
+
+    results = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            instrumentation.INSTRUMENTATION_ENABLED = enabled
+            results[enabled].append(time_requests(client, paths, args.requests))
+
+    disabled = min(results[False])
+    enabled = min(results[True])
+    print(
+        f"requests, instrumentation disabled: {disabled:8.1f} µs per request (best round)"
+    )
+    print(
+        f"requests, instrumentation enabled:  {enabled:8.1f} µs per request (best round)"
+    )
+    print(
+        f"overhead when enabled: {enabled - disabled:+.1f} µs ({(enabled / disabled - 1) * 100:+.1f}%)"
+    )
+
+
+if __name__ == "__main__":
+    main()
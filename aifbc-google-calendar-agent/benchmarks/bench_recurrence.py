@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Compare expanded (singleEvents) and series-mode event caching on recurring calendars.
+
+Each persona calendar is generated with a large share of weekly series (see
+personas.py), stored as series masters in the fake Calendar API, with a
+cancelled or moved occurrence in some of them. The same 30-day window is
+then cached both ways (EVENT_CACHE_SERIES off and on) and compared on what
+a full sync downloads, what the window holds, how long a warm lookup takes
+(series are expanded per lookup) and the size of an overview prompt built
+from it with no token budget.
+
+Usage:
+    python benchmarks/bench_recurrence.py [--density typical] [--days 30] [--recurring 0.5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+
+import pytz
+
+import calendar_core
+from benchmarks.fake_calendar import FakeCalendarService
+from benchmarks.personas import DENSITIES, load_persona, persona_events, persona_paths
+from calendar_fetch import iter_event_pages
+from event_store import EventStore
+from prompt_builder import build_calendar_prompt
+from recurrence import Series, is_series
+
+QUESTION = "What does my schedule look like?"
+
+
+def add_exceptions(events, seed):
+    """Cancel one occurrence of about a third of the series and move one of
+    another third, the way Google stores such exceptions."""
+    rng = random.Random(seed)
+    exceptions = []
+    for event in events:
+        if not is_series(event):
+            continue
+        choice = rng.random()
+        if choice > 2 / 3:
+            continue
+        series = Series(event)
+        occurrences = series.occurrences(series.start, series.span_end())
+        instance = rng.choice(occurrences)[2]
+        del instance["recurrence"]
+        if choice < 1 / 3:
+            exceptions.append(
+                {
+                    "id": instance["id"],
+                    "status": "cancelled",
+                    "recurringEventId": event["id"],
+                    "originalStartTime": instance["originalStartTime"],
+                }
+            )
+            continue
+        for key in ("start", "end"):
+            moment = datetime.fromisoformat(instance[key]["dateTime"]) + timedelta(hours=1)
+            instance[key] = dict(instance[key], dateTime=moment.isoformat())
+        exceptions.append(instance)
+    return events + exceptions
+
+
+def download(service, calendar_id, window, single_events):
+    """Return (items, JSON bytes) of a full sync of the window."""
+    items = size = 0
+    for page in iter_event_pages(
+        service,
+        calendar_id,
+        singleEvents=single_events,
+        timeMin=window.time_min.isoformat(),
+        timeMax=window.time_max.isoformat(),
+    ):
+        items += len(page.get("items", []))
+        size += len(json.dumps(page, separators=(",", ":")))
+    return items, size
+
+
+def measure(service, calendar_id, timezone_str, days, series, lookups):
+    store = EventStore(max_events=10**9, series=series)
+    now = datetime.now(pytz.utc)
+    time_max = now + timedelta(days=days)
+    events = store.get_events(service, calendar_id, now, time_max)
+    window = store.window_for(service, calendar_id, now, time_max)
+    items, size = download(service, calendar_id, window, not series)
+    started = time.perf_counter()
+    for _ in range(lookups):
+        store.get_events(service, calendar_id, now, time_max)
+    seconds = (time.perf_counter() - started) / lookups
+    _, stats = build_calendar_prompt(
+        calendar_core.format_events(events, timezone_str),
+        QUESTION,
+        timezone_str,
+        token_budget=10**9,
+    )
+    return {
+        "events": len(events),
+        "items": items,
+        "kb": size / 1024,
+        "held": window.size(),
+        "held_kb": len(json.dumps(window.resources(), separators=(",", ":"))) / 1024,
+        "ms": seconds * 1e3,
+        "tokens": stats.estimated_tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--density", choices=sorted(DENSITIES), default="typical")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument(
+        "--recurring", type=float, default=0.5, help="share of templates drawn as series"
+    )
+    parser.add_argument("--lookups", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{args.density} density ({DENSITIES[args.density]} events/day), "
+        f"{args.days} days, {args.recurring:.0%} of templates recurring"
+    )
+    print(
+        f"{'persona':<20} {'mode':<9} {'events':>6} {'items':>6} {'KB down':>8} "
+        f"{'held':>5} {'KB held':>8} {'lookup ms':>9} {'tokens':>7}"
+    )
+    for name, path in persona_paths().items():
+        timezone_str = load_persona(path)[0]
+        events = persona_events(
+            path,
+            DENSITIES[args.density],
+            args.days,
+            seed=args.seed,
+            recurring=args.recurring,
+            masters=True,
+        )
+        service = FakeCalendarService({name: add_exceptions(events, args.seed)})
+        for mode, series in (("expanded", False), ("series", True)):
+            result = measure(service, name, timezone_str, args.days, series, args.lookups)
+            print(
+                f"{name:<20} {mode:<9} {result['events']:>6} {result['items']:>6} "
+                f"{result['kb']:>8.1f} {result['held']:>5} {result['held_kb']:>8.1f} "
+                f"{result['ms']:>9.2f} {result['tokens']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Load test the Flask and asyncio (ASGI) serving modes against stubbed upstreams.
+
+Both servers run in-process on the same routes with the Calendar service and
+the Gemini model replaced by in-process fakes with configurable latency.
+Slow clients loop on /ai-query while fast clients alternate between /health
+and /freebusy/batch; requests/sec and latency percentiles are reported per
+route, showing whether slow AI calls hold up the cheap routes.
+
+Usage:
+    python benchmarks/bench_serving.py [--duration 10] [--ai-clients 32] [--clients 16]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+os.environ.setdefault("GEMINI_RATE_PER_SECOND", "0")
+
+import pytz
+import uvicorn
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import asgi_server
+import calendar_core
+import server
+from benchmarks.fake_calendar import FakeCalendarService, synthetic_events
+from benchmarks.fake_gemini import FakeGeminiModel
+
+CALENDAR_IDS = ["primary", "team@example.com", "room@example.com"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception(f"Server on port {port} did not start")
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_flask(port):
+    """Werkzeug's threaded server, as used by app.run()."""
+    httpd = make_server(
+        "127.0.0.1", port, server.app, threaded=True, request_handler=QuietRequestHandler
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd.shutdown
+
+
+def start_asgi(port):
+    config = uvicorn.Config(
+        asgi_server.app, host="127.0.0.1", port=port, log_level="warning"
+    )
+    uvicorn_server = uvicorn.Server(config)
+    thread = threading.Thread(target=uvicorn_server.run, daemon=True)
+    thread.start()
+
+    def stop():
+        uvicorn_server.should_exit = True
+        thread.join()
+
+    return stop
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_load(port, duration, ai_clients, clients):
+    """Drive the server until `duration` elapses; return per-route latencies."""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    counter = iter(range(10**9))
+    today = datetime.now(pytz.utc).date()
+    freebusy_body = {
+        "calendars": CALENDAR_IDS,
+        "start_date": today.isoformat(),
+        "end_date": (today + timedelta(days=7)).isoformat(),
+    }
+
+    def record(route, started, status):
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[route].append(elapsed)
+            if status != 200:
+                errors[route] += 1
+
+    def ai_client():
+        while time.monotonic() < deadline:
+            # A distinct question per request, so the answer cache never hits
+            body = {"question": f"What should I prepare for item {next(counter)}?"}
+            started = time.perf_counter()
+            status = request(port, "POST", "/ai-query", body)
+            record("/ai-query", started, status)
+
+    def fast_client():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            record("/health", started, request(port, "GET", "/health"))
+            started = time.perf_counter()
+            status = request(port, "POST", "/freebusy/batch", freebusy_body)
+            record("/freebusy/batch", started, status)
+
+    threads = [threading.Thread(target=ai_client) for _ in range(ai_clients)]
+    threads += [threading.Thread(target=fast_client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def report(name, latencies, errors, elapsed):
+    print(f"\n{name}")
+    print(
+        f"{'route':>16} {'requests':>9} {'req/s':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for route in sorted(latencies):
+        values = sorted(latencies[route])
+        print(
+            f"{route:>16} {len(values):>9} {len(values) / elapsed:>8.1f} "
+            f"{percentile(values, 0.50) * 1000:>8.1f} "
+            f"{percentile(values, 0.95) * 1000:>8.1f} "
+            f"{percentile(values, 0.99) * 1000:>8.1f} {errors[route]:>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per server")
+    parser.add_argument("--ai-clients", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--calendar-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    calendar = FakeCalendarService(
+        {
+            calendar_id: synthetic_events(200, seed=i)
+            for i, calendar_id in enumerate(CALENDAR_IDS)
+        },
+        latency=args.calendar_latency,
+    )
+    gemini = FakeGeminiModel(latency=args.gemini_latency)
+    calendar_core.service_holder.get_service = lambda: calendar
+    server.get_gemini_model = lambda: gemini
+    # Keep per-request prompt logging out of the report
+    calendar_core.log_prompt_stats = lambda *args, **kwargs: None
+
+    modes = (("Flask (threaded dev server)", start_flask), ("ASGI (uvicorn)", start_asgi))
+    for name, start in modes:
+        server.event_store.invalidate()
+        server.response_cache.clear()
+        port = free_port()
+        stop = start(port)
+        wait_for_port(port)
+        try:
+            latencies, errors, elapsed = run_load(
+                port, args.duration, args.ai_clients, args.clients
+            )
+        finally:
+            stop()
+        report(name, latencies, errors, elapsed)
+
+    print(
+        f"\nlimits: calendar={asgi_server.ASYNC_CALENDAR_CONCURRENCY} "
+        f"gemini={asgi_server.ASYNC_GEMINI_CONCURRENCY} (ASGI only)"
+    )
+
+
+if __name__ == "__main__":
+    main()
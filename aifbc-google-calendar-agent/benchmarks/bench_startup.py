@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Measure cold-start import time of the CLI and the Flask worker.
+
+Each entry point is imported in a fresh interpreter under `python -X
+importtime`; the cumulative time of the top-level module is compared with
+its target, and the heaviest imports of the slowest run are listed. Exits
+non-zero when a target is missed.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold-start targets in milliseconds of cumulative import time.
+TARGETS_MS = {"chat_cli": 250, "server": 400}
+
+
+def import_profile(module):
+    """Import `module` in a fresh interpreter.
+
+    Returns (cumulative import ms of the module, wall-clock ms of the whole
+    process, [(cumulative ms, imported name), ...]).
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=AGENT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise Exception(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        entries.append((int(cumulative) / 1000, name.strip()))
+    total_ms = next(ms for ms, name in reversed(entries) if name == module)
+    return total_ms, wall_ms, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    args = parser.parse_args()
+
+    failed = False
+    for module, target_ms in TARGETS_MS.items():
+        runs = [import_profile(module) for _ in range(args.runs)]
+        imports = [run[0] for run in runs]
+        walls = [run[1] for run in runs]
+        median_ms = statistics.median(imports)
+        status = "ok" if median_ms <= target_ms else "OVER TARGET"
+        failed = failed or median_ms > target_ms
+
+        print(
+            f"{module}: import {median_ms:.0f} ms median "
+            f"(min {min(imports):.0f}, max {max(imports):.0f}), "
+            f"process {statistics.median(walls):.0f} ms, "
+            f"target {target_ms} ms -> {status}"
+        )
+        slowest = max(runs, key=lambda run: run[0])[2]
+        for ms, name in sorted(slowest, reverse=True)[1 : args.top + 1]:
+            print(f"    {ms:8.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+"""
+Repeatable end-to-end benchmark of the agent's routes against local stand-ins.
+
+The Calendar service and the Gemini model are replaced by the in-process
+fakes (with configurable latency), and calendars are generated from the dummy
+ICS personas at several densities. Each scenario sends a fixed number of
+requests to a real server on a local port, single-client for the individual
+routes and multi-client for the mixes, and reports throughput, p50/p95/p99
+latency and memory. Results can be saved as JSON and compared against an
+earlier run; the exit status is 1 when a scenario regressed.
+
+Usage:
+    python benchmarks/bench_suite.py [--server flask] [--densities light,typical,heavy]
+        [--scenarios events,today,...] [--output results.json]
+        [--compare baseline.json --tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+os.environ.setdefault("GEMINI_RATE_PER_SECOND", "0")
+# Background refreshes would make runs depend on timing.
+os.environ.setdefault("PREFETCH_ENABLED", "false")
+
+import pytz
+
+import calendar_core
+import server
+from benchmarks.bench_serving import (
+    free_port,
+    percentile,
+    request,
+    start_asgi,
+    start_flask,
+    wait_for_port,
+)
+from benchmarks.fake_calendar import FakeCalendarService
+from benchmarks.fake_gemini import FakeGeminiModel
+from benchmarks.personas import DENSITIES, persona_events, persona_paths
+
+TIMEZONE = "Asia/Ho_Chi_Minh"
+SERVERS = {"flask": start_flask, "asgi": start_asgi}
+
+
+SIMPLE_QUESTIONS = [
+    "What's next?",
+    "Am I free tomorrow at 3pm?",
+    "How many meetings do I have today?",
+    "What do I have on Friday?",
+]
+
+
+def route_requests(today):
+    """Request factories per route: counter -> (method, path, body)."""
+    week = {
+        "start_date": today.isoformat(),
+        "end_date": (today + timedelta(days=7)).isoformat(),
+        "timezone": TIMEZONE,
+    }
+    return {
+        "events": lambda i: ("GET", f"/events?max_results=10&timezone={TIMEZONE}", None),
+        "today": lambda i: ("GET", f"/today?timezone={TIMEZONE}", None),
+        "freebusy": lambda i: ("POST", "/freebusy", week),
+        "dashboard": lambda i: (
+            "GET",
+            f"/dashboard?timezone={TIMEZONE}&calendars={','.join(sorted(persona_paths()))}",
+            None,
+        ),
+        "freebusy-batch": lambda i: (
+            "POST",
+            "/freebusy/batch",
+            dict(week, calendars=sorted(persona_paths())),
+        ),
+        # A distinct question per request, so the answer cache never hits
+        "ai-query": lambda i: (
+            "POST",
+            "/ai-query",
+            {
+                "question": f"What should I prepare for item {i}?",
+                "timezone": TIMEZONE,
+                "include_calendar_data": False,
+            },
+        ),
+        # Questions the intent router answers without Gemini
+        "ai-query-simple": lambda i: (
+            "POST",
+            "/ai-query",
+            {
+                "question": SIMPLE_QUESTIONS[i % len(SIMPLE_QUESTIONS)],
+                "timezone": TIMEZONE,
+                "include_calendar_data": False,
+            },
+        ),
+    }
+
+
+# name -> (routes cycled through, concurrent clients: 1 or None for --clients)
+SCENARIOS = {
+    "events": (["events"], 1),
+    "today": (["today"], 1),
+    "freebusy": (["freebusy"], 1),
+    "freebusy-batch": (["freebusy-batch"], 1),
+    "dashboard": (["dashboard"], 1),
+    "ai-query": (["ai-query"], 1),
+    "ai-query-simple": (["ai-query-simple"], 1),
+    "mix": (["events", "today", "freebusy", "freebusy-batch"], None),
+    "mix-ai": (["events", "today", "freebusy", "ai-query"], None),
+}
+
+
+def rss_mb():
+    """Current resident set size, or the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def build_calendars(events_per_day, days, seed):
+    """Persona calendars; the corporate executive is also "primary"."""
+    calendars = {
+        name: persona_events(path, events_per_day, days, seed=seed + i)
+        for i, (name, path) in enumerate(persona_paths().items())
+    }
+    calendars["primary"] = calendars["corporate_executive"]
+    return calendars
+
+
+def run_scenario(port, factories, routes, clients, count, warmup):
+    """Send `count` requests over `clients` threads; return the measurements."""
+    for i in range(warmup):
+        request(port, *factories[routes[i % len(routes)]](i))
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(count))
+
+    def client():
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            status = request(port, *factories[routes[i % len(routes)]](warmup + i))
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors, time.perf_counter() - started
+
+
+def run_suite(args):
+    today = datetime.now(pytz.timezone(TIMEZONE)).date()
+    factories = route_requests(today)
+    gemini = FakeGeminiModel(latency=args.gemini_latency)
+    server.get_gemini_model = lambda: gemini
+    # Keep per-request prompt logging out of the report
+    calendar_core.log_prompt_stats = lambda *args, **kwargs: None
+
+    port = free_port()
+    stop = SERVERS[args.server](port)
+    wait_for_port(port)
+    results = []
+    try:
+        for density in args.densities:
+            calendars = build_calendars(DENSITIES[density], args.days, args.seed)
+            calendar = FakeCalendarService(calendars, latency=args.calendar_latency)
+            calendar_core.service_holder.get_service = lambda: calendar
+
+            for name in args.scenarios:
+                routes, clients = SCENARIOS[name]
+                clients = clients or args.clients
+                count = args.ai_requests if "ai-query" in routes else args.requests
+                server.event_store.invalidate()
+                server.response_cache.clear()
+                calendar.calls = gemini.calls = 0
+                rss_before = rss_mb()
+                if args.tracemalloc:
+                    tracemalloc.start()
+
+                latencies, errors, elapsed = run_scenario(
+                    port, factories, routes, clients, count, args.warmup
+                )
+
+                heap_peak = None
+                if args.tracemalloc:
+                    heap_peak = tracemalloc.get_traced_memory()[1] / 2**20
+                    tracemalloc.stop()
+                results.append(
+                    {
+                        "server": args.server,
+                        "density": density,
+                        "events": len(calendars["primary"]),
+                        "scenario": name,
+                        "clients": clients,
+                        "requests": len(latencies),
+                        "errors": errors,
+                        "seconds": round(elapsed, 3),
+                        "throughput_rps": round(len(latencies) / elapsed, 2),
+                        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                        "rss_mb": round(rss_mb(), 1),
+                        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+                        "heap_peak_mb": None if heap_peak is None else round(heap_peak, 1),
+                        "calendar_calls": calendar.calls,
+                        "gemini_calls": gemini.calls,
+                    }
+                )
+                report_row(results[-1])
+    finally:
+        stop()
+    return results
+
+
+def report_header():
+    print(
+        f"{'density':>8} {'events':>7} {'scenario':>15} {'req':>5} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7} {'errors':>6}"
+    )
+
+
+def report_row(row):
+    print(
+        f"{row['density']:>8} {row['events']:>7} {row['scenario']:>15} "
+        f"{row['requests']:>5} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.1f} "
+        f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['rss_mb']:>7.1f} "
+        f"{row['errors']:>6}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline run; return the regressed scenarios.
+
+    A scenario regresses when its p95 latency grew, or its throughput fell,
+    by more than `tolerance` (a fraction).
+    """
+    previous = {
+        (row["server"], row["density"], row["scenario"]): row
+        for row in baseline["results"]
+    }
+    regressions = []
+    print(f"\ncompared with {baseline['meta']['started']}:")
+    for row in results:
+        key = (row["server"], row["density"], row["scenario"])
+        old = previous.get(key)
+        if old is None:
+            continue
+        p95 = row["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        rps = row["throughput_rps"] / old["throughput_rps"] - 1
+        regressed = p95 > tolerance or rps < -tolerance
+        if regressed:
+            regressions.append(key)
+        print(
+            f"{row['density']:>8} {row['scenario']:>15} p95 {p95 * 100:+7.1f}% "
+            f"req/s {rps * 100:+7.1f}%{'  REGRESSED' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--server", choices=sorted(SERVERS), default="flask")
+    parser.add_argument("--densities", default=",".join(DENSITIES))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--ai-requests", type=int, default=40, help="per AI scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=8, help="for the mixes")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calendar-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="also record the Python heap peak (slows every request)",
+    )
+    parser.add_argument("--output", help="save the results as JSON here")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    args.densities = [name for name in args.densities.split(",") if name]
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in args.densities if name not in DENSITIES]
+    unknown += [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown density or scenario: {', '.join(unknown)}")
+
+    started = datetime.now(pytz.utc).isoformat()
+    report_header()
+    results = run_suite(args)
+
+    if args.output:
+        meta = {
+            "started": started,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "compare")
+            },
+        }
+        with open(args.output, "w") as out:
+            json.dump({"meta": meta, "results": results}, out, indent=2)
+        print(f"\nresults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
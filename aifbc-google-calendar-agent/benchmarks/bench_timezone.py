@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark per-event vs. batch timezone conversion.
+
+The per-event path reproduces the old convert_to_timezone(): parse one ISO
+string, look up the pytz zone and localize/convert an aware datetime, twice
+per event.
+
+Usage:
+    python benchmarks/bench_timezone.py [--events 10000] [--timezone America/New_York]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+
+from benchmarks.fake_calendar import synthetic_events
+from tz_convert import convert_batch
+
+
+def convert_one(date_str, timezone_str):
+    dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+    target_tz = pytz.timezone(timezone_str)
+    if dt.tzinfo is None:
+        dt = pytz.utc.localize(dt)
+    return dt.astimezone(target_tz).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def per_event(events, timezone_str):
+    return [
+        (
+            convert_one(event["start"]["dateTime"], timezone_str),
+            convert_one(event["end"]["dateTime"], timezone_str),
+        )
+        for event in events
+    ]
+
+
+def batch(events, timezone_str):
+    values = [event["start"]["dateTime"] for event in events]
+    values += [event["end"]["dateTime"] for event in events]
+    return convert_batch(values, timezone_str)
+
+
+def best_of(runs, func, *args):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--timezone", default="America/New_York")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events, days=365)
+
+    # Both paths must agree before timing them
+    expected = per_event(events, args.timezone)
+    converted = batch(events, args.timezone)
+    starts = [item.formatted for item in converted[: len(events)]]
+    assert starts == [pair[0] for pair in expected], "batch conversion mismatch"
+
+    slow = best_of(args.runs, per_event, events, args.timezone)
+    fast = best_of(args.runs, batch, events, args.timezone)
+    print(f"events:    {args.events}")
+    print(f"per-event: {slow * 1000:.1f} ms")
+    print(f"batch:     {fast * 1000:.1f} ms ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
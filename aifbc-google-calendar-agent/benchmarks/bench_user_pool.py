@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Load test the per-user credential store and Calendar client pool.
+
+Enrolls thousands of simulated users with expired access tokens and points
+the pool at a local fake token endpoint, then has many threads ask the pool for users'
+clients, hot users more often than cold ones (Zipf-like). Reports lookup
+latency, token refreshes (each user must be refreshed exactly once while
+their client stays pooled), pool hits/evictions and memory. A final burst
+sends concurrent lookups for one cold user to check that they share a
+single load and refresh.
+
+Usage:
+    python benchmarks/bench_user_pool.py [--users 5000] [--lookups 50000]
+        [--threads 32] [--max-clients 256] [--token-latency 0.02]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the pool itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+
+from cryptography.fernet import Fernet
+
+from benchmarks.bench_serving import percentile
+from benchmarks.bench_suite import rss_mb
+from benchmarks.fake_token_endpoint import FakeTokenEndpoint
+from user_credentials import CredentialStore, UserClientPool
+
+
+def enroll(store, users):
+    """Store expired credentials for `users` simulated users."""
+    expired = (datetime.utcnow() - timedelta(hours=1)).isoformat() + "Z"
+    for i in range(users):
+        store.save(
+            f"user{i}",
+            {
+                "token": f"stale-{i}",
+                "refresh_token": f"refresh-{i}",
+                "client_id": "bench-client",
+                "client_secret": "bench-secret",
+                "expiry": expired,
+            },
+            f"user{i}@example.com",
+        )
+
+
+def run_lookups(pool, users, lookups, threads, skew, seed):
+    """Look up clients from `threads` threads; return (latencies, errors, seconds)."""
+    weights = [1 / (rank + 1) ** skew for rank in range(users)]
+    picks = random.Random(seed).choices(range(users), weights=weights, k=lookups)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(picks)
+
+    def client():
+        nonlocal errors
+        while True:
+            with lock:
+                user = next(counter, None)
+            if user is None:
+                return
+            started = time.perf_counter()
+            try:
+                pool.get(f"user{user}")
+                failed = False
+            except Exception as e:
+                print(f"user{user}: {e}")
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += failed
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sorted(latencies), errors, time.perf_counter() - started
+
+
+def burst(pool, user_id, threads):
+    """Look up one cold user from `threads` threads at once."""
+    barrier = threading.Barrier(threads)
+
+    def client():
+        barrier.wait()
+        pool.get(user_id)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--max-clients", type=int, default=256)
+    parser.add_argument("--idle-seconds", type=float, default=900)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    endpoint = FakeTokenEndpoint(latency=args.token_latency)
+    path = os.path.join(tempfile.mkdtemp(), "users.db")
+    store = CredentialStore(path, Fernet.generate_key())
+    started = time.perf_counter()
+    enroll(store, args.users + 1)
+    print(f"enrolled {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    pool = UserClientPool(
+        store, args.max_clients, args.idle_seconds, token_uri=endpoint.token_uri
+    )
+    rss_before = rss_mb()
+    latencies, errors, elapsed = run_lookups(
+        pool, args.users, args.lookups, args.threads, args.skew, args.seed
+    )
+    stats = pool.snapshot()
+    print(
+        f"{len(latencies)} lookups from {args.threads} threads: "
+        f"{len(latencies) / elapsed:.0f}/s, p50 {percentile(latencies, 0.5) * 1e3:.2f} ms, "
+        f"p95 {percentile(latencies, 0.95) * 1e3:.2f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1e3:.2f} ms, {errors} errors"
+    )
+    print(
+        f"pool: {stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['evictions']} evictions, {stats['idle_evictions']} idle evictions, "
+        f"{stats['clients']}/{stats['max_clients']} clients"
+    )
+    print(
+        f"token endpoint: {endpoint.total()} refreshes for {len(endpoint.refreshes)} "
+        f"users ({stats['refreshes']} written back)"
+    )
+    print(f"rss: {rss_mb():.1f} MB ({rss_mb() - rss_before:+.1f} MB during the run)")
+
+    cold = f"user{args.users}"
+    before = endpoint.total()
+    burst(pool, cold, args.threads)
+    print(
+        f"burst of {args.threads} lookups for one cold user: "
+        f"{endpoint.total() - before} refresh(es)"
+    )
+    endpoint.close()
+
+
+if __name__ == "__main__":
+    main()
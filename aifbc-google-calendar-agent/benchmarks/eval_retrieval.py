@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Evaluate question-to-event retrieval offline on the persona calendars.
+
+Each persona calendar is generated at the given density (see personas.py) and
+asked targeted questions: hand-written paraphrases ("when do I work at the
+coffee house?") and each event title verbatim ("When is my Final Exam:
+Marketing (MKTG310)?"). An event is relevant when its title is the one the
+question is about. Reports how many questions were narrowed down, recall of
+the relevant events (out of at most top-K) and precision, whether the first
+relevant event made it into the prompt, and the estimated prompt tokens with
+and without retrieval. Overview questions are checked to keep every event.
+
+Usage:
+    python benchmarks/eval_retrieval.py [--density typical] [--days 30] [--top-k 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Measure the agent itself, not the upstream rate limits (see resilience.py).
+os.environ.setdefault("CALENDAR_RATE_PER_SECOND", "0")
+
+import calendar_core
+from benchmarks.fake_calendar import FakeCalendarService
+from benchmarks.personas import DENSITIES, load_persona, persona_events, persona_paths
+from prompt_builder import build_calendar_prompt
+
+# persona -> [(question, title of the events it is about)]
+QUESTIONS = {
+    "corporate_executive": [
+        ("When is the investor call?", "Investor Relations Call"),
+        ("When do I fly to Singapore?", "Business Trip to Singapore"),
+        ("Who am I interviewing for head of marketing?", "Candidate Interview: Head of Marketing"),
+        ("Where is the AmCham networking event?", "AmCham Networking Event"),
+        ("When is the debrief with leadership after my trip?", "Post-Trip Debrief with Leadership Team"),
+        ("When is the offsite at Ho Tram?", "Management Offsite"),
+    ],
+    "freelance_designer": [
+        ("When is the kick-off for the e-commerce site?", "Client Kick-off Call: E-commerce Site"),
+        ("When do I do my invoicing?", "Admin & Invoicing"),
+        ("When is the UI/UX webinar?", "Webinar: The Future of UI/UX"),
+        ("When am I at The Hive?", "Co-working & Networking"),
+        ("When do I get client feedback on the mobile app?", "Client Feedback Session: Mobile App UI"),
+    ],
+    "university_student": [
+        ("When is my marketing exam?", "Final Exam: Marketing (MKTG310)"),
+        ("When do I work at the coffee house?", "Part-time Shift at The Coffee House"),
+        ("When is my meeting with Professor Minh?", "Meeting with Professor Minh"),
+        ("When is the ECON201 lecture?", "Economics Lecture (ECON201)"),
+        ("When is movie night?", "Movie Night with Friends"),
+        ("Where is my CS lab?", "Computer Science Lab"),
+    ],
+}
+
+OVERVIEW_QUESTIONS = [
+    "How many meetings do I have this week?",
+    "Am I free on Friday afternoon?",
+    "What does my schedule look like?",
+]
+
+
+def evaluate(service, calendar_id, timezone_str, question, title, days):
+    """Score one targeted question; returns a dict of its measurements."""
+    full = calendar_core.get_calendar_data(service, days, timezone_str, question, calendar_id)
+    started = time.perf_counter()
+    data, retrieval = calendar_core.get_question_data(
+        service, question, days, timezone_str, calendar_id
+    )
+    seconds = time.perf_counter() - started
+    relevant = [event for event in full if event["summary"] == title]
+    found = [event for event in data if event["summary"] == title]
+    full_prompt = build_calendar_prompt(full, question, timezone_str)[1]
+    prompt = build_calendar_prompt(data, question, timezone_str, retrieval=retrieval)[1]
+    return {
+        "narrowed": retrieval is not None,
+        "recall": len(found) / min(len(relevant), calendar_core.RETRIEVAL_TOP_K)
+        if relevant
+        else 1.0,
+        "precision": len(found) / len(data) if data else 0.0,
+        "first": bool(relevant) and relevant[0] in data,
+        "full_tokens": full_prompt.estimated_tokens,
+        "tokens": prompt.estimated_tokens,
+        "seconds": seconds,
+    }
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--density", choices=sorted(DENSITIES), default="typical")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=calendar_core.RETRIEVAL_TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="print every question")
+    args = parser.parse_args()
+    calendar_core.RETRIEVAL_TOP_K = args.top_k
+
+    print(
+        f"{args.density} density ({DENSITIES[args.density]} events/day), "
+        f"{args.days} days, top {args.top_k}"
+    )
+    print(
+        f"{'persona':<20} {'questions':>9} {'narrowed':>8} {'recall':>7} {'precision':>9} "
+        f"{'first':>6} {'tokens':>14} {'ms':>6}"
+    )
+    overview_kept = 0
+    for name, path in persona_paths().items():
+        timezone_str = load_persona(path)[0]
+        service = FakeCalendarService(
+            {name: persona_events(path, DENSITIES[args.density], args.days, seed=args.seed)}
+        )
+        questions = list(QUESTIONS.get(name, []))
+        questions += [
+            (f"When is my {template.summary}?", template.summary)
+            for template in load_persona(path)[1]
+        ]
+        results = []
+        for question, title in questions:
+            result = evaluate(service, name, timezone_str, question, title, args.days)
+            results.append(result)
+            if args.verbose:
+                print(
+                    f"  {question!r}: recall {result['recall']:.2f}, "
+                    f"precision {result['precision']:.2f}, "
+                    f"{result['full_tokens']} -> {result['tokens']} tokens"
+                )
+        for question in OVERVIEW_QUESTIONS:
+            retrieval = calendar_core.get_question_data(
+                service, question, args.days, timezone_str, name
+            )[1]
+            overview_kept += retrieval is None
+        full_tokens = mean([result["full_tokens"] for result in results])
+        tokens = mean([result["tokens"] for result in results])
+        print(
+            f"{name:<20} {len(results):>9} "
+            f"{sum(result['narrowed'] for result in results):>8} "
+            f"{mean([result['recall'] for result in results]):>7.2f} "
+            f"{mean([result['precision'] for result in results]):>9.2f} "
+            f"{sum(result['first'] for result in results):>6} "
+            f"{full_tokens:>6.0f} -> {tokens:>4.0f} "
+            f"{mean([result['seconds'] for result in results]) * 1e3:>6.2f}"
+        )
+    total = len(OVERVIEW_QUESTIONS) * len(persona_paths())
+    print(f"overview questions keeping every event: {overview_kept}/{total}")
+
+
+if __name__ == "__main__":
+    main()
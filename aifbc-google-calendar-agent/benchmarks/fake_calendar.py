@@ -0,0 +1,305 @@
+"""
+In-process stand-in for the Google Calendar v3 service object.
+
+Mimics the parts of the discovery client the agent uses
+(`events().list(...).execute()` and `freebusy().query(...).execute()`),
+including pagination, incremental sync tokens, batch requests, the freebusy
+per-query item limit and a configurable per-call latency, so performance can
+be measured without Google credentials. `calls` counts HTTP round trips; a
+batch is one.
+
+Recurring events are stored as series masters (with `recurrence` lines) and
+their exceptions; singleEvents=True lists expand them into instances, as
+Google does.
+"""
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httplib2
+import pytz
+from googleapiclient.errors import HttpError
+
+from freebusy import FREEBUSY_MAX_ITEMS, merge_intervals, parse_api_time
+from recurrence import Series, instance_time, is_series
+
+# How far open-ended listings expand recurring series
+EXPAND_DAYS = 366
+
+
+class FakeHttpError(Exception):
+    """Raised for requests the real API would reject."""
+
+
+class _Request:
+    def __init__(self, service, handler):
+        self._service = service
+        self._handler = handler
+
+    def execute(self, **kwargs):
+        self._service._record_call()
+        return self._handler()
+
+
+class _Batch:
+    """One HTTP round trip carrying many requests, like BatchHttpRequest."""
+
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request, callback or self._callback, request_id))
+
+    def execute(self, **kwargs):
+        self._service._record_call()
+        with self._service._lock:
+            self._service.batched_requests += len(self._requests)
+        for request, callback, request_id in self._requests:
+            try:
+                response, exception = request._handler(), None
+            except Exception as e:
+                response, exception = None, e
+            callback(request_id, response, exception)
+
+
+class _Events:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, calendarId, **params):
+        return _Request(self._service, lambda: self._service._list(calendarId, params))
+
+
+class _FreeBusy:
+    def __init__(self, service):
+        self._service = service
+
+    def query(self, body):
+        return _Request(self._service, lambda: self._service._freebusy(body))
+
+
+def _event_time(value):
+    if "dateTime" in value:
+        return parse_api_time(value["dateTime"])
+    return pytz.utc.localize(datetime.strptime(value["date"], "%Y-%m-%d"))
+
+
+def _span(event):
+    """(start, end) a stored event is listed by with singleEvents=False."""
+    if "originalStartTime" in event and event.get("status") == "cancelled":
+        start = instance_time(event)
+        return start, start + timedelta(seconds=1)
+    if is_series(event):
+        series = Series(event)
+        return series.start, series.span_end()
+    return _event_time(event["start"]), _event_time(event["end"])
+
+
+def expand_series(events, time_min, time_max):
+    """List stored events the way singleEvents=True does: series expanded
+    into instances over the range, exceptions in place, cancellations
+    dropped."""
+    replaced = {}
+    for event in events:
+        if "recurringEventId" in event and "originalStartTime" in event:
+            replaced.setdefault(event["recurringEventId"], set()).add(instance_time(event))
+    expanded = []
+    for event in events:
+        if is_series(event):
+            occurrences = Series(event).occurrences(
+                time_min, time_max, replaced.get(event["id"])
+            )
+            for _, _, instance in occurrences:
+                # Google's instances don't repeat the series' rules
+                del instance["recurrence"]
+                expanded.append(instance)
+        elif event.get("status") != "cancelled":
+            expanded.append(event)
+    return expanded
+
+
+class FakeCalendarService:
+    """Fake Calendar service backed by in-memory events per calendar.
+
+    `put_event` and `cancel_event` record changes, which later incremental
+    syncs return; a sync token from before `expire_sync_tokens` fails with
+    410 Gone, like an expired Google sync token.
+    """
+
+    def __init__(self, calendars=None, latency=0.0, page_size=250):
+        # calendar id -> list of raw event resources
+        self.calendars = calendars or {}
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = 0
+        self.batched_requests = 0
+        self._lock = threading.Lock()
+        # Every change bumps the version; (version, event) per calendar.
+        self._version = 0
+        self._oldest_version = 0
+        self._changes = {}
+
+    def _record_call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def events(self):
+        return _Events(self)
+
+    def freebusy(self):
+        return _FreeBusy(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+    def put_event(self, calendar_id, event):
+        """Add an event, or replace the one with the same id."""
+        with self._lock:
+            events = self.calendars.setdefault(calendar_id, [])
+            events[:] = [item for item in events if item["id"] != event["id"]]
+            events.append(event)
+            self._record_change(calendar_id, event)
+
+    def cancel_event(self, calendar_id, event_id):
+        """Delete an event; incremental syncs report it as cancelled."""
+        with self._lock:
+            events = self.calendars.get(calendar_id, [])
+            events[:] = [item for item in events if item["id"] != event_id]
+            self._record_change(calendar_id, {"id": event_id, "status": "cancelled"})
+
+    def expire_sync_tokens(self):
+        """Invalidate every sync token issued so far."""
+        with self._lock:
+            self._version += 1
+            self._oldest_version = self._version
+            self._changes.clear()
+
+    def _record_change(self, calendar_id, event):
+        self._version += 1
+        self._changes.setdefault(calendar_id, []).append((self._version, event))
+
+    def _sync_token(self, calendar_id):
+        return f"sync-{calendar_id}-{self._version}"
+
+    def _changes_since(self, calendar_id, sync_token):
+        prefix = f"sync-{calendar_id}-"
+        version = sync_token[len(prefix) :] if sync_token.startswith(prefix) else ""
+        with self._lock:
+            if not version.isdigit() or int(version) < self._oldest_version:
+                raise HttpError(httplib2.Response({"status": 410}), b"Gone")
+            changed = {
+                event["id"]: event
+                for changed_at, event in self._changes.get(calendar_id, [])
+                if changed_at > int(version)
+            }
+            return {
+                "items": list(changed.values()),
+                "nextSyncToken": self._sync_token(calendar_id),
+            }
+
+    def _list(self, calendar_id, params):
+        if params.get("syncToken"):
+            return self._changes_since(calendar_id, params["syncToken"])
+        with self._lock:
+            events = list(self.calendars.get(calendar_id, []))
+            sync_token = self._sync_token(calendar_id)
+
+        time_min = params.get("timeMin")
+        time_max = params.get("timeMax")
+        time_min = parse_api_time(time_min) if time_min else None
+        time_max = parse_api_time(time_max) if time_max else None
+        if params.get("singleEvents"):
+            lower = time_min or datetime.now(pytz.utc)
+            events = expand_series(
+                events, lower, time_max or lower + timedelta(days=EXPAND_DAYS)
+            )
+        selected = [
+            event
+            for event, (start, end) in ((event, _span(event)) for event in events)
+            if (time_min is None or end > time_min)
+            and (time_max is None or start < time_max)
+        ]
+        if params.get("orderBy") == "startTime":
+            selected.sort(key=lambda event: _event_time(event["start"]))
+
+        page_size = min(params.get("maxResults") or self.page_size, 2500)
+        offset = int(params.get("pageToken") or 0)
+        result = {"items": selected[offset : offset + page_size]}
+        if offset + page_size < len(selected):
+            result["nextPageToken"] = str(offset + page_size)
+        else:
+            result["nextSyncToken"] = sync_token
+        return result
+
+    def _freebusy(self, body):
+        if len(body["items"]) > FREEBUSY_MAX_ITEMS:
+            raise FakeHttpError("Too many calendars requested")
+        time_min = parse_api_time(body["timeMin"])
+        time_max = parse_api_time(body["timeMax"])
+
+        calendars = {}
+        for item in body["items"]:
+            calendar_id = item["id"]
+            if calendar_id not in self.calendars:
+                calendars[calendar_id] = {
+                    "busy": [],
+                    "errors": [{"domain": "global", "reason": "notFound"}],
+                }
+                continue
+            busy = merge_intervals(
+                (
+                    max(_event_time(event["start"]), time_min),
+                    min(_event_time(event["end"]), time_max),
+                )
+                for event in expand_series(self.calendars[calendar_id], time_min, time_max)
+                if _event_time(event["end"]) > time_min
+                and _event_time(event["start"]) < time_max
+                and event.get("transparency") != "transparent"
+            )
+            calendars[calendar_id] = {
+                "busy": [
+                    {"start": start.isoformat(), "end": end.isoformat()}
+                    for start, end in busy
+                ]
+            }
+        return {"calendars": calendars}
+
+
+def synthetic_events(
+    count,
+    start=None,
+    days=30,
+    seed=0,
+    durations=(15, 30, 45, 60, 90),
+    working_hours=(8, 18),
+):
+    """Generate `count` timed events spread over working hours of `days` days."""
+    rng = random.Random(seed)
+    start = start or datetime.now(pytz.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    first_hour, last_hour = working_hours
+    events = []
+    for i in range(count):
+        day = start + timedelta(days=rng.randrange(days))
+        begin = day + timedelta(
+            hours=rng.randrange(first_hour, last_hour), minutes=rng.choice((0, 15, 30, 45))
+        )
+        end = begin + timedelta(minutes=rng.choice(durations))
+        events.append(
+            {
+                "id": f"evt{seed}-{i}",
+                "status": "confirmed",
+                "summary": f"Meeting {i}",
+                "description": "",
+                "location": "",
+                "start": {"dateTime": begin.isoformat()},
+                "end": {"dateTime": end.isoformat()},
+            }
+        )
+    return events
@@ -0,0 +1,55 @@
+"""
+In-process stand-in for a google.generativeai GenerativeModel.
+
+Answers `generate_content(prompt)` (optionally with stream=True) after a
+configurable latency, so the AI routes can be load tested without an API key.
+"""
+import threading
+import time
+
+
+class _Usage:
+    def __init__(self, prompt_token_count):
+        self.prompt_token_count = prompt_token_count
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Response:
+    def __init__(self, chunks, usage, chunk_latency):
+        self._chunks = chunks
+        self._chunk_latency = chunk_latency
+        self.usage_metadata = usage
+        self.text = "".join(chunks)
+
+    def __iter__(self):
+        for text in self._chunks:
+            if self._chunk_latency:
+                time.sleep(self._chunk_latency)
+            yield _Chunk(text)
+
+
+class FakeGeminiModel:
+    """Fake model with a fixed first-token latency and per-chunk latency."""
+
+    def __init__(self, latency=0.5, chunk_latency=0.0, chunks=4):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunks = chunks
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        chunks = [f"Part {i + 1} of the answer. " for i in range(self.chunks)]
+        usage = _Usage(len(prompt) // 4)
+        response = _Response(chunks, usage, self.chunk_latency if stream else 0.0)
+        if not stream and self.chunk_latency:
+            time.sleep(self.chunk_latency * self.chunks)
+        return response
@@ -0,0 +1,73 @@
+"""
+Local stand-in for Google's OAuth token endpoint.
+
+Answers refresh_token grants with a new access token after a configurable
+latency and counts the refreshes per refresh token, so credential refreshes
+can be load tested (and checked for duplicates) without a Google account.
+Point credentials at it through their token_uri.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTokenEndpoint:
+    """Threaded HTTP token endpoint on a local port."""
+
+    def __init__(self, latency=0.0, expires_in=3600):
+        self.latency = latency
+        self.expires_in = expires_in
+        self.refreshes = Counter()
+        self._lock = threading.Lock()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                refresh_token = form.get("refresh_token", [""])[0]
+                if endpoint.latency:
+                    time.sleep(endpoint.latency)
+                with endpoint._lock:
+                    endpoint.refreshes[refresh_token] += 1
+                    count = endpoint.refreshes[refresh_token]
+                body = json.dumps(
+                    {
+                        "access_token": f"access-{refresh_token}-{count}",
+                        "expires_in": endpoint.expires_in,
+                        "token_type": "Bearer",
+                    }
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def token_uri(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/token"
+
+    def total(self):
+        with self._lock:
+            return sum(self.refreshes.values())
+
+    def duplicates(self, expected=1):
+        """Refresh tokens refreshed more than `expected` times."""
+        with self._lock:
+            return sum(1 for count in self.refreshes.values() if count > expected)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,147 @@
+"""
+Synthetic calendars modelled on the dummy ICS personas.
+
+Each persona file (corporate executive, freelance designer, university
+student) contributes its event templates: titles, locations, descriptions,
+local start times and durations. Calendars of any density are generated by
+sampling those templates across a range of days, so benchmarks exercise
+realistic text sizes and time-of-day clustering at 2 or 200 events a day.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytz
+
+from ics_backend import (
+    DUMMY_CALENDARS_DIR,
+    iter_vevents,
+    parse_ics_time,
+    unescape_text,
+)
+from tz_convert import utc_offset
+
+# Events per day for the standard benchmark densities.
+DENSITIES = {"light": 2, "typical": 8, "heavy": 30}
+
+
+class EventTemplate:
+    """The reusable parts of one persona event."""
+
+    __slots__ = ("summary", "description", "location", "start_minute", "duration")
+
+    def __init__(self, summary, description, location, start_minute, duration):
+        self.summary = summary
+        self.description = description
+        self.location = location
+        # Minutes after local midnight, and minutes long
+        self.start_minute = start_minute
+        self.duration = duration
+
+
+def persona_paths(directory=DUMMY_CALENDARS_DIR):
+    """Map persona name -> ICS path for the dummy calendars."""
+    directory = os.path.normpath(directory)
+    return {
+        os.path.splitext(name)[0]: os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.endswith(".ics")
+    }
+
+
+def load_persona(path):
+    """Read a persona's timed events into (timezone name, templates)."""
+    templates = []
+    timezone_str = "UTC"
+    with open(path, encoding="utf-8") as stream:
+        for vevent in iter_vevents(stream):
+            if "DTSTART" not in vevent or "DTEND" not in vevent:
+                continue
+            start_params, start_value = vevent["DTSTART"][0]
+            end_params, end_value = vevent["DTEND"][0]
+            start, tz_name, all_day = parse_ics_time(start_value, start_params)
+            end, _, _ = parse_ics_time(end_value, end_params, tz_name or "UTC")
+            if all_day:
+                continue
+            timezone_str = tz_name
+            local = start + utc_offset(tz_name, start)
+            text = {
+                name: unescape_text(vevent[name][0][1]) if name in vevent else ""
+                for name in ("SUMMARY", "DESCRIPTION", "LOCATION")
+            }
+            templates.append(
+                EventTemplate(
+                    text["SUMMARY"] or "No title",
+                    text["DESCRIPTION"],
+                    text["LOCATION"],
+                    local % 86400 // 60,
+                    max(15, (end - start) // 60),
+                )
+            )
+    if not templates:
+        raise ValueError(f"No timed events in {path}")
+    return timezone_str, templates
+
+
+def persona_events(
+    path, events_per_day, days=30, start=None, seed=0, recurring=0.1, masters=False
+):
+    """Generate about events_per_day * days Calendar API events from a persona.
+
+    Start times keep the template's local time of day, shifted by up to an
+    hour either way, on a random day from `start` (default: today, local).
+    A `recurring` fraction of the templates drawn is a weekly series, emitted
+    as singleEvents instances sharing a recurringEventId, or with `masters`
+    as one master event carrying its RRULE.
+    """
+    rng = random.Random(seed)
+    timezone_str, templates = load_persona(path)
+    target_tz = pytz.timezone(timezone_str)
+    first_day = (start or datetime.now(target_tz)).date()
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    def resource(template, day, shift, event_id):
+        begin = target_tz.localize(
+            datetime.combine(day, datetime.min.time())
+            + timedelta(minutes=template.start_minute + shift)
+        )
+        end = begin + timedelta(minutes=template.duration)
+        return {
+            "id": event_id,
+            "status": "confirmed",
+            "summary": template.summary,
+            "description": template.description,
+            "location": template.location,
+            "start": {"dateTime": begin.isoformat(), "timeZone": timezone_str},
+            "end": {"dateTime": end.isoformat(), "timeZone": timezone_str},
+        }
+
+    events = []
+    target = int(events_per_day * days)
+    index = 0
+    # Occurrences generated, counting every occurrence of a master
+    generated = 0
+    while generated < target:
+        template = rng.choice(templates)
+        shift = rng.choice((-60, -30, 0, 0, 30, 60))
+        day = first_day + timedelta(days=rng.randrange(days))
+        if rng.random() < recurring:
+            series_id = f"{name}-{seed}-series{index}"
+            weeks = range(0, days, 7)
+            if masters:
+                first = first_day + timedelta(days=(day - first_day).days % 7)
+                event = resource(template, first, shift, series_id)
+                event["recurrence"] = [f"RRULE:FREQ=WEEKLY;COUNT={len(weeks)}"]
+                events.append(event)
+            else:
+                for week in weeks:
+                    occurrence = first_day + timedelta(days=(day - first_day).days % 7 + week)
+                    event = resource(template, occurrence, shift, f"{series_id}_{week}")
+                    event["recurringEventId"] = series_id
+                    events.append(event)
+            generated += len(weeks)
+        else:
+            events.append(resource(template, day, shift, f"{name}-{seed}-{index}"))
+            generated += 1
+        index += 1
+    return events[:target]
@@ -0,0 +1,143 @@
+"""
+Batched Calendar API reads.
+
+The Calendar API accepts many calls in one multipart HTTP request
+(`service.new_batch_http_request()`). `execute_batch` sends a set of
+`events().list` / `freebusy().query` reads in as few round trips as that
+allows:
+
+- Each sub-request succeeds or fails on its own; a failing read never takes
+  the others down with it.
+- Batches are split at BATCH_MAX_SIZE sub-requests, and halved again if the
+  API still rejects one as too large.
+- Reads whose result carries a nextPageToken get their next page in the
+  following round, batched together with every other read's next page.
+
+Services without batch support (the ICS backend) run the same reads one
+request at a time.
+"""
+import os
+import threading
+
+from googleapiclient.errors import HttpError
+
+from freebusy import chunked
+from resilience import UpstreamError, call_upstream, classify
+
+# Sub-requests per batch; Google recommends at most 50 for the Calendar API.
+BATCH_MAX_SIZE = int(os.getenv("CALENDAR_BATCH_MAX_SIZE", "50"))
+
+# Statuses the batch endpoint answers with when a batch is too large.
+BATCH_TOO_LARGE_STATUSES = {400, 413}
+
+_lock = threading.Lock()
+stats = {
+    "batches": 0,
+    "sub_requests": 0,
+    "sub_request_errors": 0,
+    "splits": 0,
+    "unbatched_requests": 0,
+}
+
+
+def _count(key, amount=1):
+    with _lock:
+        stats[key] += amount
+
+
+def _sub_request_error(exception):
+    """Report a sub-request failure as an UpstreamError where it is one."""
+    return classify("calendar", exception) or exception
+
+
+def _execute_chunk(service, items, user):
+    """Send (key, request) pairs as one batch; return key -> (result, error)."""
+    responses = {}
+
+    def callback(request_id, response, exception):
+        responses[request_id] = (response, exception)
+
+    def send():
+        # A fresh batch per attempt, so retries don't reuse spent requests.
+        responses.clear()
+        batch = service.new_batch_http_request(callback=callback)
+        for index, (_, request) in enumerate(items):
+            batch.add(request, request_id=str(index))
+        batch.execute()
+
+    try:
+        call_upstream("calendar", send, user)
+    except HttpError as error:
+        if error.resp.status not in BATCH_TOO_LARGE_STATUSES or len(items) < 2:
+            return {key: (None, error) for key, _ in items}
+        _count("splits")
+        half = len(items) // 2
+        results = _execute_chunk(service, items[:half], user)
+        results.update(_execute_chunk(service, items[half:], user))
+        return results
+    except UpstreamError as error:
+        return {key: (None, error) for key, _ in items}
+
+    _count("batches")
+    _count("sub_requests", len(items))
+    results = {}
+    for index, (key, _) in enumerate(items):
+        response, exception = responses.get(
+            str(index), (None, Exception("No response in batch"))
+        )
+        if exception is not None:
+            _count("sub_request_errors")
+            results[key] = (None, _sub_request_error(exception))
+        else:
+            results[key] = (response, None)
+    return results
+
+
+def _execute_round(service, requests, user):
+    """Run one round of (key, request) pairs; return key -> (result, error)."""
+    if not hasattr(service, "new_batch_http_request"):
+        results = {}
+        for key, request in requests:
+            _count("unbatched_requests")
+            try:
+                results[key] = (call_upstream("calendar", request.execute, user), None)
+            except Exception as e:
+                results[key] = (None, _sub_request_error(e))
+        return results
+
+    results = {}
+    for chunk in chunked(requests, BATCH_MAX_SIZE):
+        results.update(_execute_chunk(service, chunk, user))
+    return results
+
+
+def execute_batch(service, reads, user=None):
+    """Run many Calendar reads in as few HTTP round trips as possible.
+
+    `reads` maps a caller-chosen key to `build(page_token)`, which returns
+    the request for that page (page_token is None for the first), or None
+    to stop after the pages already read. Returns key -> (pages, error): the
+    result pages read so far, in order, and the exception that stopped the
+    read, if any.
+    """
+    pages = {key: [] for key in reads}
+    errors = {key: None for key in reads}
+    pending = {key: None for key in reads}
+    while pending:
+        requests = [(key, reads[key](page_token)) for key, page_token in pending.items()]
+        requests = [(key, request) for key, request in requests if request is not None]
+        pending = {}
+        for key, (result, error) in _execute_round(service, requests, user).items():
+            if error is not None:
+                errors[key] = error
+                continue
+            pages[key].append(result)
+            if result.get("nextPageToken"):
+                pending[key] = result["nextPageToken"]
+    return {key: (pages[key], errors[key]) for key in reads}
+
+
+def snapshot():
+    """Return batch, sub-request and split counters."""
+    with _lock:
+        return dict(stats)
@@ -0,0 +1,866 @@
+"""
+Shared calendar core for the Flask server and the CLI.
+
+Holds everything both front ends need: credentials and the shared Calendar
+service, the Gemini model, the fetch/normalize pipeline that turns raw
+Calendar API events into timezone-converted `Event` records, and the
+process-wide event and AI response caches. server.py and chat_cli.py only
+add their own presentation on top.
+
+The Google client libraries, the OAuth flow, Gemini and the ICS backend are
+imported inside the functions that use them: together they are most of the
+cold-start time, and most invocations need only some of them.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from typing import Optional
+
+import pytz
+from googleapiclient.errors import HttpError
+
+from calendar_batch import execute_batch
+from calendar_fetch import iter_events
+from event_db import EventDatabase
+from event_store import EVENT_CACHE_DB, EventStore
+from freebusy import (
+    chunked,
+    failed_chunk,
+    freebusy_request,
+    parse_api_time,
+    parse_freebusy_result,
+)
+from instrumentation import observe_prompt, observe_stage, stage
+from event_index import RETRIEVAL_ENABLED, RETRIEVAL_TOP_K, Retrieval, question_terms
+from prompt_builder import build_calendar_prompt, past_window, question_window
+from recurrence import describe_recurrence
+from resilience import AuthError, UpstreamError, call_upstream, classify
+from response_cache import ResponseCache, cache_key
+from single_flight import upstream_flight
+from tz_convert import convert_batch
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = [
+    "https://www.googleapis.com/auth/calendar.readonly",
+    "https://www.googleapis.com/auth/calendar.events.freebusy",
+]
+
+TOKEN_FILE = "token.json"
+
+# "google" talks to the live Calendar API; "ics" serves local ICS files
+# (see ics_backend.ics_paths_from_env) and needs no Google credentials.
+CALENDAR_BACKEND = os.getenv("CALENDAR_BACKEND", "google")
+
+# Ask Gemini for the exact prompt token count of every AI query (costs one
+# extra API call per query).
+PROMPT_COUNT_TOKENS = os.getenv("PROMPT_COUNT_TOKENS", "false").lower() == "true"
+
+# Refresh the access token this long before it actually expires, so a request
+# never starts with a token that dies halfway through.
+TOKEN_REFRESH_MARGIN = timedelta(
+    seconds=int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+)
+
+# Holders for other users' access tokens passed to /freebusy/batch.
+MAX_TOKEN_SERVICES = int(os.getenv("MAX_TOKEN_SERVICES", "64"))
+
+# Events are converted in batches of this size, so streamed responses still
+# start early while the timezone work is amortized across many events.
+FORMAT_BATCH_SIZE = 500
+
+event_store = EventStore(
+    database=EventDatabase(EVENT_CACHE_DB) if EVENT_CACHE_DB else None
+)
+response_cache = ResponseCache()
+logger = logging.getLogger(__name__)
+
+
+def save_credentials(creds, path=TOKEN_FILE):
+    """Atomically write credentials to disk.
+
+    The token is written to a temporary file in the same directory and then
+    renamed over the old one, so a concurrent reader never sees a half-written
+    token.json.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".token-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as token:
+            token.write(creds.to_json())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_credentials(token_path=TOKEN_FILE, interactive=True):
+    """Get valid user credentials from storage or user input.
+
+    Without `interactive`, missing or unrefreshable credentials raise
+    AuthError instead of starting the browser sign-in flow.
+    """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    creds = None
+    # The file token.json stores the user's access and refresh tokens.
+    if os.path.exists(token_path):
+        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+
+    # If there are no (valid) credentials available, let the user log in.
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        elif not interactive:
+            raise AuthError(
+                "calendar",
+                f"No usable Google credentials in {token_path}; "
+                "run `python chat_cli.py` once to sign in",
+            )
+        else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+
+            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+            print(f"Starting OAuth server on http://localhost:8080")
+            creds = flow.run_local_server(port=8080)
+
+        # Save the credentials for the next run
+        save_credentials(creds, token_path)
+
+    return creds
+
+
+def credentials_need_refresh(creds, margin=TOKEN_REFRESH_MARGIN) -> bool:
+    """Check whether credentials are expired or about to expire."""
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+    # google-auth stores expiry as a naive UTC datetime.
+    return creds.expiry - margin <= datetime.utcnow()
+
+
+@lru_cache(maxsize=1)
+def calendar_discovery_document():
+    """The Calendar API discovery document bundled with the client library.
+
+    Parsed once and shared by every service object built from it, instead
+    of being re-read and re-parsed for each one.
+    """
+    import json
+
+    from googleapiclient.discovery_cache import get_static_doc
+
+    return json.loads(get_static_doc("calendar", "v3"))
+
+
+class CalendarServiceHolder:
+    """Process-wide holder for the Calendar service and its credentials.
+
+    The discovery-based service object is built once and shared by every
+    request thread. httplib2 transports are not thread-safe, so each thread
+    gets its own AuthorizedHttp wrapping the shared credentials; the service's
+    request builder picks up the calling thread's transport.
+    """
+
+    def __init__(self, token_path=TOKEN_FILE, creds=None, interactive=True, on_refresh=None):
+        # With explicit credentials and no token_path, nothing is read from
+        # or written to disk; on_refresh(creds) is called to keep refreshed
+        # credentials elsewhere.
+        self.token_path = token_path
+        # Whether a missing token may start the browser sign-in flow
+        self.interactive = interactive
+        self.on_refresh = on_refresh
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._creds = creds
+        self._service = None
+        self.stats = {
+            "service_builds": 0,
+            "service_reuses": 0,
+            "credential_loads": 0,
+            "credential_refreshes": 0,
+            "transports_created": 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _thread_http(self):
+        """Get the calling thread's authorized transport, creating it once."""
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+
+        http = getattr(self._local, "http", None)
+        if http is None or http.credentials is not self._creds:
+            http = AuthorizedHttp(self._creds, http=httplib2.Http())
+            self._local.http = http
+            self._count("transports_created")
+        return http
+
+    def _build_request(self, http, *args, **kwargs):
+        """Request builder that routes every call through a per-thread transport."""
+        from googleapiclient.http import HttpRequest
+
+        return HttpRequest(self._thread_http(), *args, **kwargs)
+
+    def get_credentials(self):
+        """Get shared credentials, refreshing them shortly before expiry."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = get_credentials(self.token_path, self.interactive)
+                self.stats["credential_loads"] += 1
+
+            if credentials_need_refresh(self._creds):
+                if self._creds.refresh_token:
+                    from google.auth.transport.requests import Request
+
+                    self._creds.refresh(Request())
+                    if self.token_path:
+                        save_credentials(self._creds, self.token_path)
+                    if self.on_refresh is not None:
+                        self.on_refresh(self._creds)
+                    self.stats["credential_refreshes"] += 1
+                elif self.token_path:
+                    # Nothing to refresh with; fall back to the full flow.
+                    self._creds = get_credentials(self.token_path, self.interactive)
+                    self.stats["credential_loads"] += 1
+                else:
+                    raise AuthError(
+                        "calendar", "Access token expired and cannot be refreshed"
+                    )
+
+            return self._creds
+
+    def get_service(self):
+        """Get the shared Calendar service, building it on first use."""
+        creds = self.get_credentials()
+        with self._lock:
+            if self._service is None:
+                import httplib2
+                from google_auth_httplib2 import AuthorizedHttp
+                from googleapiclient.discovery import build_from_document
+
+                self._service = build_from_document(
+                    calendar_discovery_document(),
+                    http=AuthorizedHttp(creds, http=httplib2.Http()),
+                    requestBuilder=self._build_request,
+                )
+                self.stats["service_builds"] += 1
+            else:
+                self.stats["service_reuses"] += 1
+            return self._service
+
+    def reset(self):
+        """Drop the cached service and credentials (e.g. after token revocation)."""
+        with self._lock:
+            self._creds = None
+            self._service = None
+            self._local = threading.local()
+
+    def snapshot(self):
+        """Return a copy of the build/reuse counters."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["credentials_expiry"] = (
+                self._creds.expiry.isoformat() + "Z"
+                if self._creds is not None and self._creds.expiry
+                else None
+            )
+            return stats
+
+
+service_holder = CalendarServiceHolder()
+
+_token_holders = OrderedDict()
+_token_holders_lock = threading.Lock()
+
+_ics_service = None
+_ics_service_lock = threading.Lock()
+
+
+def get_ics_service():
+    """Get the process-wide service backed by local ICS files."""
+    global _ics_service
+    with _ics_service_lock:
+        if _ics_service is None:
+            from ics_backend import IcsCalendarService, ics_paths_from_env
+
+            _ics_service = IcsCalendarService(ics_paths_from_env())
+        return _ics_service
+
+
+def get_service():
+    """Get Google Calendar service using OAuth credentials.
+
+    Raises FileNotFoundError when credentials.json is missing.
+    """
+    with stage("get_service"):
+        if CALENDAR_BACKEND == "ics":
+            return get_ics_service()
+        try:
+            return service_holder.get_service()
+        except FileNotFoundError:
+            raise FileNotFoundError("credentials.json not found")
+        except Exception as e:
+            # e.g. a revoked refresh token, reported as an auth failure
+            error = classify("calendar", e)
+            if error is not None:
+                raise error from e
+            raise Exception(f"Error building service: {e}")
+
+
+def service_for_token(token: Optional[str] = None):
+    """Get a Calendar service for a caller-supplied access token.
+
+    None selects the process's own credentials. Services for other tokens are
+    kept in a small LRU so repeated batch queries reuse them.
+    """
+    if token is None or CALENDAR_BACKEND == "ics":
+        return get_service()
+    with _token_holders_lock:
+        holder = _token_holders.get(token)
+        if holder is None:
+            from google.oauth2.credentials import Credentials
+
+            holder = CalendarServiceHolder(token_path=None, creds=Credentials(token))
+            _token_holders[token] = holder
+            while len(_token_holders) > MAX_TOKEN_SERVICES:
+                _token_holders.popitem(last=False)
+        else:
+            _token_holders.move_to_end(token)
+    return holder.get_service()
+
+
+def get_gemini_model():
+    """Get Gemini AI model."""
+    gemini_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_key:
+        raise Exception("GEMINI_API_KEY not found in environment variables")
+
+    try:
+        import google.generativeai as genai
+
+        genai.configure(api_key=gemini_key)
+        model = genai.GenerativeModel("gemini-2.0-flash")
+        return model
+    except Exception as e:
+        raise Exception(f"Error configuring Gemini: {e}")
+
+
+class Event:
+    """A calendar event with its times converted to the target timezone.
+
+    `start`/`end` are "YYYY-MM-DD HH:MM:SS" local times, or the bare date for
+    all-day events; `error` is set when a time could not be converted.
+    `recurrence` describes the series an occurrence generated from a cached
+    series belongs to: {"series_id", "rule", "except": [ISO dates]}.
+    """
+
+    __slots__ = (
+        "summary",
+        "description",
+        "location",
+        "start",
+        "end",
+        "start_epoch",
+        "end_epoch",
+        "all_day",
+        "error",
+        "recurrence",
+    )
+
+    def __init__(
+        self,
+        summary,
+        description,
+        location,
+        start,
+        end,
+        start_epoch,
+        end_epoch,
+        all_day,
+        error=None,
+        recurrence=None,
+    ):
+        self.summary = summary
+        self.description = description
+        self.location = location
+        self.start = start
+        self.end = end
+        self.start_epoch = start_epoch
+        self.end_epoch = end_epoch
+        self.all_day = all_day
+        self.error = error
+        self.recurrence = recurrence
+
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Event({self.start!r}, {self.summary!r})"
+
+    def to_dict(self):
+        """Render the event as the JSON shape the API and prompts use."""
+        event = {
+            "summary": self.summary,
+            "description": self.description,
+            "location": self.location,
+            "start": self.start,
+            "end": self.end,
+            "start_epoch": self.start_epoch,
+            "end_epoch": self.end_epoch,
+            "all_day": self.all_day,
+        }
+        if self.error:
+            event["error"] = self.error
+        if self.recurrence:
+            event["recurrence"] = self.recurrence
+        return event
+
+
+def _describe_series(event, timezone_str):
+    """The `Event.recurrence` of an occurrence expanded from a cached series."""
+    if not event.get("recurrence") or "recurringEventId" not in event:
+        return None
+    start = event["start"]
+    rule, exceptions = describe_recurrence(
+        tuple(event["recurrence"]),
+        start.get("dateTime", start.get("date")),
+        timezone_str,
+    )
+    return {"series_id": event["recurringEventId"], "rule": rule, "except": list(exceptions)}
+
+
+def iter_normalized_events(events, timezone_str="Asia/Bangkok"):
+    """Lazily convert raw Calendar API events into `Event` records.
+
+    Start and end times are converted to the target timezone batch by batch;
+    an event whose times cannot be converted keeps its raw values and carries
+    an error instead of failing the whole result.
+    """
+    events = iter(events)
+    while True:
+        batch = list(islice(events, FORMAT_BATCH_SIZE))
+        if not batch:
+            return
+
+        starts = [
+            event["start"].get("dateTime", event["start"].get("date"))
+            for event in batch
+        ]
+        ends = [
+            event["end"].get("dateTime", event["end"].get("date")) for event in batch
+        ]
+        # Convert to target timezone
+        converted = convert_batch(starts + ends, timezone_str)
+
+        for index, event in enumerate(batch):
+            start_converted = converted[index]
+            end_converted = converted[len(batch) + index]
+            yield Event(
+                event.get("summary", "No title"),
+                event.get("description", ""),
+                event.get("location", ""),
+                start_converted.formatted,
+                end_converted.formatted,
+                start_converted.epoch,
+                end_converted.epoch,
+                "T" not in (starts[index] or ""),
+                start_converted.error or end_converted.error,
+                _describe_series(event, timezone_str),
+            )
+
+
+def iter_formatted_events(events, timezone_str="Asia/Bangkok"):
+    """Lazily format raw Calendar API events as JSON-ready dicts."""
+    for event in iter_normalized_events(events, timezone_str):
+        yield event.to_dict()
+
+
+def format_events(events, timezone_str="Asia/Bangkok"):
+    """Format raw Calendar API events for API responses and AI analysis."""
+    with stage("format_events"):
+        return list(iter_formatted_events(events, timezone_str))
+
+
+def day_range(timezone_str="Asia/Bangkok"):
+    """Get (today, start_utc, end_utc) for the current day in a timezone."""
+    target_tz = pytz.timezone(timezone_str)
+    today = datetime.now(target_tz).date()
+    start_of_day = target_tz.localize(datetime.combine(today, datetime.min.time()))
+    end_of_day = target_tz.localize(datetime.combine(today, datetime.max.time()))
+    return today, start_of_day.astimezone(pytz.utc), end_of_day.astimezone(pytz.utc)
+
+
+def fetch_upcoming_events(service, max_results=10, calendar_id="primary", timezone_str=None):
+    """Get raw upcoming events.
+
+    Served from the event cache when it holds enough of them; otherwise the
+    API is paged until max_results are read, with concurrent identical
+    lookups sharing one fetch. All-day events are dates in timezone_str.
+    """
+    with stage("fetch_events"):
+        now = datetime.now(pytz.utc)
+        events = event_store.get_upcoming(
+            service, calendar_id, now, max_results, timezone_str
+        )
+        if events is None:
+            # Callers joining an in-flight lookup share its "now", which is at
+            # most one round trip older than their own.
+            events = upstream_flight.do(
+                ("upcoming", id(service), calendar_id, max_results),
+                lambda: list(
+                    iter_events(
+                        service,
+                        calendar_id,
+                        max_results=max_results,
+                        timeMin=now.isoformat(),
+                        singleEvents=True,
+                        orderBy="startTime",
+                    )
+                ),
+            )
+        return events
+
+
+def fetch_today_events(service, timezone_str="Asia/Bangkok", calendar_id="primary"):
+    """Get (today, raw events) for the current day in a timezone."""
+    today, start_utc, end_utc = day_range(timezone_str)
+    with stage("fetch_events"):
+        return today, event_store.get_events(
+            service, calendar_id, start_utc, end_utc, timezone_str
+        )
+
+
+def fetch_busy_periods(
+    service, start_utc, end_utc, calendar_id="primary", timezone_str=None
+):
+    """Get merged (start, end) busy periods, from the event cache if it covers them.
+
+    Busy all-day events block their dates in timezone_str.
+    """
+    with stage("fetch_busy"):
+        busy = event_store.get_busy_periods(
+            service, calendar_id, start_utc, end_utc, timezone_str
+        )
+    if busy is not None:
+        return busy
+
+    def query():
+        body = {
+            "timeMin": start_utc.isoformat(),
+            "timeMax": end_utc.isoformat(),
+            "items": [{"id": calendar_id}],
+        }
+        request = service.freebusy().query(body=body)
+        events_result = call_upstream("calendar", request.execute)
+        calendar_dict = events_result["calendars"][calendar_id]
+        return [
+            (parse_api_time(period["start"]), parse_api_time(period["end"]))
+            for period in calendar_dict["busy"]
+        ]
+
+    with stage("fetch_busy"):
+        return upstream_flight.do(
+            ("busy", id(service), calendar_id, start_utc.isoformat(), end_utc.isoformat()),
+            query,
+        )
+
+
+def fetch_dashboard(
+    service,
+    timezone_str="Asia/Bangkok",
+    max_results=10,
+    calendar_ids=("primary",),
+    busy_range=None,
+    days=30,
+    calendar_id="primary",
+):
+    """Load a dashboard's reads in one batched round trip, plus one per page.
+
+    Syncs the cached window holding today, the upcoming events and the
+    `days`-day AI window, and queries free/busy for `calendar_ids` over
+    `busy_range` (default: today), all as sub-requests of one batch. Returns
+    (today, today's raw events, upcoming raw events, per-calendar free/busy
+    results shaped like query_freebusy's).
+    """
+    today, day_start, day_end = day_range(timezone_str)
+    now = datetime.now(pytz.utc)
+    busy_start, busy_end = busy_range or (day_start, day_end)
+    chunks = chunked(list(dict.fromkeys(calendar_ids)))
+
+    with stage("fetch_dashboard"):
+        reads, finish = event_store.batch_sync_reads(
+            service, [(calendar_id, min(day_start, now), now + timedelta(days=days))]
+        )
+        if any(key[0] == "full" for key in reads):
+            # Until the window is loaded it's unknown whether it holds enough
+            # upcoming events; read them alongside, first page only.
+            reads["upcoming"] = lambda page_token: None if page_token else (
+                service.events().list(
+                    calendarId=calendar_id,
+                    maxResults=max_results,
+                    timeMin=now.isoformat(),
+                    singleEvents=True,
+                    orderBy="startTime",
+                )
+            )
+        for index, chunk in enumerate(chunks):
+            reads[("busy", index)] = lambda page_token, chunk=chunk: (
+                freebusy_request(service, chunk, busy_start, busy_end)
+            )
+
+        results = {}
+        try:
+            results = execute_batch(service, reads)
+        finally:
+            finish(results)
+
+    # The window is fresh now, unless its read failed; then these sync it on
+    # their own and report the failure.
+    with stage("fetch_events"):
+        today_events = event_store.get_events(
+            service, calendar_id, day_start, day_end, timezone_str
+        )
+    upcoming_pages, upcoming_error = results.get("upcoming", ([], None))
+    if upcoming_pages and upcoming_error is None:
+        with stage("fetch_events"):
+            upcoming = event_store.get_upcoming(
+                service, calendar_id, now, max_results, timezone_str
+            )
+        if upcoming is None:
+            upcoming = upcoming_pages[0].get("items", [])[:max_results]
+    else:
+        upcoming = fetch_upcoming_events(service, max_results, calendar_id, timezone_str)
+
+    busy = {}
+    for index, chunk in enumerate(chunks):
+        pages, error = results[("busy", index)]
+        busy.update(
+            failed_chunk(chunk, error) if error else parse_freebusy_result(pages[0], chunk)
+        )
+    return today, today_events, upcoming, busy
+
+
+def daily_summary(service, timezone_str="Asia/Bangkok", calendar_id="primary"):
+    """Summarize today's events in a timezone: counts, busy time and span."""
+    today, start_utc, end_utc = day_range(timezone_str)
+    raw_events = event_store.get_events(
+        service, calendar_id, start_utc, end_utc, timezone_str
+    )
+    events = list(iter_normalized_events(raw_events, timezone_str))
+    timed = [event for event in events if not event.all_day and not event.error]
+    busy = fetch_busy_periods(service, start_utc, end_utc, calendar_id, timezone_str)
+    return {
+        "date": today.isoformat(),
+        "timezone": timezone_str,
+        "events": len(events),
+        "all_day_events": sum(1 for event in events if event.all_day),
+        "busy_minutes": int(sum((end - start).total_seconds() for start, end in busy))
+        // 60,
+        "first_start": min(event.start for event in timed)[:16] if timed else None,
+        "last_end": max(event.end for event in timed)[:16] if timed else None,
+    }
+
+
+def calendar_data_range(question=None, days=30, timezone_str="Asia/Bangkok"):
+    """Get the (start, end) UTC range an AI question needs events for.
+
+    The next `days` days, unless the question asks about a past period
+    ("last quarter", "yesterday", ...), which is then read instead.
+    """
+    now = datetime.now(pytz.utc)
+    target_tz = pytz.timezone(timezone_str)
+    window = None
+    if question:
+        window = past_window(question.lower(), now.astimezone(target_tz).date())
+    if window is None:
+        return now, now + timedelta(days=days)
+    first, last = window
+    start = target_tz.localize(datetime.combine(first, datetime.min.time()))
+    end = target_tz.localize(
+        datetime.combine(last + timedelta(days=1), datetime.min.time())
+    )
+    return start.astimezone(pytz.utc), end.astimezone(pytz.utc)
+
+
+def get_calendar_data(
+    service, days=30, timezone_str="Asia/Bangkok", question=None, calendar_id="primary"
+):
+    """Get calendar data for AI analysis.
+
+    Past periods named in the question are served from the persistent event
+    store when it already holds them.
+    """
+    try:
+        start, end = calendar_data_range(question, days, timezone_str)
+        with stage("fetch_events"):
+            events = event_store.get_events(service, calendar_id, start, end, timezone_str)
+
+        # Format events for AI analysis
+        return format_events(events, timezone_str)
+    except HttpError as error:
+        raise Exception(f"Error fetching calendar data: {error}")
+
+
+def get_question_data(
+    service, question, days=30, timezone_str="Asia/Bangkok", calendar_id="primary"
+):
+    """Get (calendar data, Retrieval or None) for an AI question.
+
+    A question about particular events ("when is my dentist appointment?")
+    gets only the best matching events (see event_index) of the period it
+    names, or of the next `days` days; other questions get every event, as
+    from get_calendar_data.
+    """
+    terms = question_terms(question) if RETRIEVAL_ENABLED else ()
+    if not terms:
+        return get_calendar_data(service, days, timezone_str, question, calendar_id), None
+
+    start, end = calendar_data_range(question, days, timezone_str)
+    target_tz = pytz.timezone(timezone_str)
+    window = question_window(question, datetime.now(target_tz).date())
+    if window is not None:
+        first = target_tz.localize(datetime.combine(window[0], datetime.min.time()))
+        last = target_tz.localize(
+            datetime.combine(window[1] + timedelta(days=1), datetime.min.time())
+        )
+        first, last = first.astimezone(pytz.utc), last.astimezone(pytz.utc)
+        # Within the range read anyway, unless the period lies outside it
+        if first < end and last > start:
+            first, last = max(first, start), min(last, end)
+        start, end = first, last
+
+    try:
+        with stage("fetch_events"):
+            events, considered = event_store.search_events(
+                service, calendar_id, start, end, terms, RETRIEVAL_TOP_K, timezone_str
+            )
+    except HttpError as error:
+        raise Exception(f"Error fetching calendar data: {error}")
+    if not events:
+        # Nothing mentions the terms; let the model see the whole period
+        return get_calendar_data(service, days, timezone_str, question, calendar_id), None
+    retrieval = Retrieval(
+        terms,
+        considered,
+        start.astimezone(target_tz).date().isoformat(),
+        (end - timedelta(microseconds=1)).astimezone(target_tz).date().isoformat(),
+    )
+    return format_events(events, timezone_str), retrieval
+
+
+def answer_cache_key(question, calendar_data, timezone_str="Asia/Bangkok"):
+    """Response cache key for a question about the given calendar data.
+
+    Answers depend on the events and on what "today" is, so both are part of
+    the key; a calendar change yields a different key.
+    """
+    today = datetime.now(pytz.timezone(timezone_str)).date()
+    return cache_key(question, calendar_data, timezone_str, today)
+
+
+def measure_prompt_tokens(model, prompt, response=None):
+    """Get the model's own prompt token count, if it is cheaply available.
+
+    Uses the response's usage metadata when the SDK provides it; otherwise
+    calls count_tokens (an extra round trip) only when PROMPT_COUNT_TOKENS is
+    enabled.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        return usage.prompt_token_count
+    if PROMPT_COUNT_TOKENS:
+        try:
+            return model.count_tokens(prompt).total_tokens
+        except Exception as e:
+            logger.warning("Error counting prompt tokens: %s", e)
+    return None
+
+
+def log_prompt_stats(model, context, stats, response=None):
+    measured = measure_prompt_tokens(model, context, response)
+    observe_prompt(len(context), stats.estimated_tokens, measured)
+    logger.debug(
+        "AI prompt: %d/%d events %s, %d chars, ~%d tokens estimated, %s measured",
+        stats.events_included,
+        stats.events_total,
+        stats.window,
+        len(context),
+        stats.estimated_tokens,
+        measured if measured is not None else "n/a",
+    )
+
+
+def ask_gemini_about_calendar(
+    model, calendar_data, question, timezone_str="Asia/Bangkok", retrieval=None
+):
+    """Ask Gemini AI about calendar data (narrowed down as `retrieval` says)."""
+    try:
+        # Create a compact, budgeted context for Gemini
+        with stage("build_prompt"):
+            context, stats = build_calendar_prompt(
+                calendar_data, question, timezone_str, retrieval=retrieval
+            )
+
+        with stage("gemini"):
+            response = call_upstream("gemini", lambda: model.generate_content(context))
+
+        log_prompt_stats(model, context, stats, response)
+        return response.text
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error asking Gemini: {e}")
+
+
+def stream_gemini_about_calendar(
+    model, calendar_data, question, timezone_str="Asia/Bangkok", retrieval=None
+):
+    """Ask Gemini AI about calendar data, yielding the answer as it is generated."""
+    try:
+        with stage("build_prompt"):
+            context, stats = build_calendar_prompt(
+                calendar_data, question, timezone_str, retrieval=retrieval
+            )
+
+        # Failures before the first chunk are retried; once text has been
+        # streamed out, an error ends the answer.
+        started = time.perf_counter()
+        first_chunk = True
+        response = call_upstream(
+            "gemini", lambda: model.generate_content(context, stream=True)
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. a bare finish reason)
+                continue
+            if text:
+                if first_chunk:
+                    observe_stage("gemini_first_chunk", time.perf_counter() - started)
+                    first_chunk = False
+                yield text
+        # Includes the time the caller spent relaying chunks
+        observe_stage("gemini", time.perf_counter() - started)
+
+        log_prompt_stats(model, context, stats, response)
+    except UpstreamError:
+        raise
+    except Exception as e:
+        error = classify("gemini", e)
+        if error is not None:
+            raise error from e
+        raise Exception(f"Error asking Gemini: {e}")
@@ -0,0 +1,57 @@
+"""
+Pagination-aware, lazy event fetching for the Google Calendar API.
+
+`events().list` returns at most one page per call and signals more data with
+`nextPageToken`. These generators follow the tokens one page at a time, so
+callers see every event without ever materializing the whole result set, and
+can stop early without fetching pages they don't need.
+"""
+from itertools import islice
+from typing import Optional
+
+from resilience import call_upstream
+
+# Largest page the Calendar API will return for events().list.
+MAX_PAGE_SIZE = 2500
+
+
+def iter_event_pages(service, calendar_id="primary", page_size=MAX_PAGE_SIZE, **params):
+    """Yield raw events().list result pages, following nextPageToken.
+
+    The last page carries `nextSyncToken` when the request was eligible for
+    incremental sync.
+    """
+    page_token = None
+    while True:
+        request = service.events().list(
+            calendarId=calendar_id,
+            maxResults=page_size,
+            pageToken=page_token,
+            **params,
+        )
+        result = call_upstream("calendar", request.execute)
+        yield result
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return
+
+
+def iter_events(
+    service,
+    calendar_id="primary",
+    max_results: Optional[int] = None,
+    page_size=MAX_PAGE_SIZE,
+    **params,
+):
+    """Yield raw events across pages, stopping once max_results are produced."""
+    if max_results is not None:
+        # Don't ask for a bigger page than we are going to read.
+        page_size = max(1, min(page_size, max_results))
+    events = (
+        event
+        for page in iter_event_pages(service, calendar_id, page_size, **params)
+        for event in page.get("items", [])
+    )
+    if max_results is not None:
+        events = islice(events, max_results)
+    yield from events
@@ -7,255 +7,176 @@ Prereqs:
 """
 import os
 import sys
-import json
 from datetime import datetime, timedelta
-from typing import Optional
 
+import pytz
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-import google.generativeai as genai
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
 from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt
 from rich.panel import Panel
-
-# If modifying these scopes, delete the file token.json.
-SCOPES = [
-    "https://www.googleapis.com/auth/calendar.readonly",
-    "https://www.googleapis.com/auth/calendar.events.freebusy",
-]
+from rich.live import Live
+
+import calendar_core
+from calendar_core import (
+    answer_cache_key,
+    fetch_busy_periods,
+    fetch_today_events,
+    fetch_upcoming_events,
+    iter_normalized_events,
+    response_cache,
+    stream_gemini_about_calendar,
+)
+from intent_router import route_question
+
+# Timezone events are shown in, matching the server's default.
+CLI_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "Asia/Bangkok")
 
 console = Console()
 
-def get_credentials():
-    """Get valid user credentials from storage or user input."""
-    creds = None
-    # The file token.json stores the user's access and refresh tokens.
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            print(f"Starting OAuth server on http://localhost:8080")
-            creds = flow.run_local_server(port=8080)
-
-        # Save the credentials for the next run
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-
-    return creds
 
 def get_service():
     """Get Google Calendar service using OAuth credentials."""
     try:
-        creds = get_credentials()
-        service = build("calendar", "v3", credentials=creds)
-        return service
+        return calendar_core.get_service()
     except FileNotFoundError:
         console.print("[red]Error: credentials.json not found.[/red]")
         console.print("Please download your Google Calendar API credentials and save as 'credentials.json'")
         sys.exit(1)
     except Exception as e:
-        console.print(f"[red]Error building service: {e}[/red]")
+        console.print(f"[red]{e}[/red]")
         sys.exit(1)
 
 
 def get_gemini_model():
     """Get Gemini AI model."""
-    gemini_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_key:
-        console.print(
-            "[red]Error: GEMINI_API_KEY not found in environment variables.[/red]"
-        )
-        console.print("Please set GEMINI_API_KEY in your .env file or environment.")
-        sys.exit(1)
-    
     try:
-        genai.configure(api_key=gemini_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        return model
+        return calendar_core.get_gemini_model()
     except Exception as e:
-        console.print(f"[red]Error configuring Gemini: {e}[/red]")
+        console.print(f"[red]Error: {e}.[/red]")
+        if not os.getenv("GEMINI_API_KEY"):
+            console.print("Please set GEMINI_API_KEY in your .env file or environment.")
         sys.exit(1)
 
 
-def get_calendar_data(service, days=30):
-    """Get calendar data for AI analysis."""
+def get_question_data(service, question, days=30):
+    """Get (calendar data, retrieval) for AI analysis of a question."""
     try:
-        # Get events for the next N days
-        now = datetime.utcnow().isoformat() + "Z"
-        end_date = (datetime.utcnow() + timedelta(days=days)).isoformat() + "Z"
-        
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now,
-                timeMax=end_date,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
-        
-        # Format events for AI analysis
-        formatted_events = []
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-            
-            formatted_event = {
-                "summary": event.get("summary", "No title"),
-                "description": event.get("description", ""),
-                "location": event.get("location", ""),
-                "start": start,
-                "end": end,
-                "all_day": "T" not in start
-            }
-            formatted_events.append(formatted_event)
-        
-        return formatted_events
-    except HttpError as error:
-        console.print(f"[red]Error fetching calendar data: {error}[/red]")
-        return []
-
-
-def ask_gemini_about_calendar(model, calendar_data, question):
-    """Ask Gemini AI about calendar data."""
-    try:
-        # Create context for Gemini
-        context = f"""
-You are a helpful AI assistant that analyzes Google Calendar data. 
-Here is the user's calendar data for the next 7 days:
+        return calendar_core.get_question_data(service, question, days, CLI_TIMEZONE)
+    except Exception as error:
+        console.print(f"[red]{error}[/red]")
+        return [], None
 
-{json.dumps(calendar_data, indent=2)}
 
-User Question: {question}
-
-Please provide a helpful analysis based on the calendar data above. Be concise and actionable.
-"""
-        
-        response = model.generate_content(context)
-        return response.text
+def answer_simple_question(service, question):
+    """Answer a simple question from the calendar directly; False if it isn't one."""
+    try:
+        routed = route_question(service, question, CLI_TIMEZONE)
+    except Exception as error:
+        console.print(f"[red]{error}[/red]")
+        return False
+    if routed is None:
+        return False
+    console.print(Panel(routed.answer, title="Calendar"))
+    return True
+
+
+def ask_gemini_about_calendar(model, calendar_data, question, retrieval=None):
+    """Ask Gemini AI about calendar data, yielding the answer as it is generated.
+
+    Answers are shared with the server's response cache logic, so a repeated
+    question about an unchanged calendar is answered without calling Gemini.
+    """
+    key = answer_cache_key(question, calendar_data, CLI_TIMEZONE)
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    try:
+        for text in stream_gemini_about_calendar(
+            model, calendar_data, question, CLI_TIMEZONE, retrieval
+        ):
+            parts.append(text)
+            yield text
+        response_cache.put(key, "".join(parts))
     except Exception as e:
-        console.print(f"[red]Error asking Gemini: {e}[/red]")
-        return "Sorry, I couldn't analyze your calendar at the moment."
+        console.print(f"[red]{e}[/red]")
+        yield "Sorry, I couldn't analyze your calendar at the moment."
+
+
+def show_gemini_answer(model, calendar_data, question, retrieval=None):
+    """Render Gemini's answer in a panel, updating it as chunks arrive."""
+    answer = ""
+    panel = Panel(answer, title="Gemini AI Response")
+    with Live(panel, console=console, refresh_per_second=10) as live:
+        for text in ask_gemini_about_calendar(model, calendar_data, question, retrieval):
+            answer += text
+            live.update(Panel(answer, title="Gemini AI Response"))
 
 
 def list_events(service, max_results=10):
     """List upcoming events from Google Calendar."""
     try:
-        # Call the Calendar API
-        now = datetime.utcnow().isoformat() + "Z"  # 'Z' indicates UTC time
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
+        events = list(
+            iter_normalized_events(
+                fetch_upcoming_events(service, max_results, timezone_str=CLI_TIMEZONE),
+                CLI_TIMEZONE,
             )
-            .execute()
         )
-        events = events_result.get("items", [])
 
         if not events:
             console.print("[yellow]No upcoming events found.[/yellow]")
             return
 
         # Create a table to display events
-        table = Table(title="Upcoming Events")
+        table = Table(title=f"Upcoming Events ({CLI_TIMEZONE})")
         table.add_column("Date", style="cyan")
         table.add_column("Time", style="green")
         table.add_column("Event", style="white")
         table.add_column("Location", style="yellow")
 
         for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            if "T" in start:  # Has time
-                start_dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
-                date_str = start_dt.strftime("%Y-%m-%d")
-                time_str = start_dt.strftime("%H:%M")
-            else:  # All-day event
-                date_str = start
-                time_str = "All day"
-
-            summary = event.get("summary", "No title")
-            location = event.get("location", "No location")
-
-            table.add_row(date_str, time_str, summary, location)
+            date_str = event.start[:10]
+            time_str = "All day" if event.all_day else event.start[11:16]
+            table.add_row(date_str, time_str, event.summary, event.location or "No location")
 
         console.print(table)
 
-    except HttpError as error:
+    except Exception as error:
         console.print(f"[red]An error occurred: {error}[/red]")
 
 
 def get_free_busy(service, start_time, end_time):
-    """Get free/busy information for a time period."""
+    """Get free/busy information for a time period (UTC datetimes)."""
     try:
-        body = {
-            "timeMin": start_time.isoformat() + "Z",
-            "timeMax": end_time.isoformat() + "Z",
-            "items": [{"id": "primary"}],
-        }
-
-        events_result = service.freebusy().query(body=body).execute()
-        calendar_dict = events_result["calendars"]["primary"]
+        busy = fetch_busy_periods(service, start_time, end_time, timezone_str=CLI_TIMEZONE)
+        target_tz = pytz.timezone(CLI_TIMEZONE)
 
-        print(calendar_dict)
-        if calendar_dict["busy"]:
+        if busy:
             console.print("[red]Busy periods:[/red]")
-            for busy_period in calendar_dict["busy"]:
-                start = datetime.fromisoformat(
-                    busy_period["start"].replace("Z", "+00:00")
-                )
-                end = datetime.fromisoformat(busy_period["end"].replace("Z", "+00:00"))
+            for start, end in busy:
+                start = start.astimezone(target_tz)
+                end = end.astimezone(target_tz)
                 console.print(
                     f"  {start.strftime('%Y-%m-%d %H:%M')} - {end.strftime('%H:%M')}"
                 )
         else:
             console.print("[green]No busy periods found in this time range.[/green]")
 
-    except HttpError as error:
+    except Exception as error:
         console.print(f"[red]An error occurred: {error}[/red]")
 
 
 def get_today_events(service):
     """Get today's events from Google Calendar."""
     try:
-        # Get today's date range
-        today = datetime.now().date()
-        start_of_day = datetime.combine(today, datetime.min.time())
-        end_of_day = datetime.combine(today, datetime.max.time())
-
-        # Call the Calendar API
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_of_day.isoformat() + "Z",
-                timeMax=end_of_day.isoformat() + "Z",
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
+        today, raw_events = fetch_today_events(service, CLI_TIMEZONE)
+        events = list(iter_normalized_events(raw_events, CLI_TIMEZONE))
 
         if not events:
             console.print(
@@ -271,29 +192,19 @@ def get_today_events(service):
         table.add_column("Duration", style="cyan")
 
         for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-
-            if "T" in start:  # Has time
-                start_dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
-                end_dt = datetime.fromisoformat(end.replace("Z", "+00:00"))
-                time_str = start_dt.strftime("%H:%M")
-                duration = end_dt - start_dt
-                duration_str = (
-                    f"{duration.seconds // 3600}h {(duration.seconds % 3600) // 60}m"
-                )
-            else:  # All-day event
+            if event.all_day:
                 time_str = "All day"
                 duration_str = "24h"
+            else:
+                time_str = event.start[11:16]
+                minutes = (event.end_epoch - event.start_epoch) // 60
+                duration_str = f"{minutes // 60}h {minutes % 60}m"
 
-            summary = event.get("summary", "No title")
-            location = event.get("location", "No location")
-
-            table.add_row(time_str, summary, location, duration_str)
+            table.add_row(time_str, event.summary, event.location or "No location", duration_str)
 
         console.print(table)
 
-    except HttpError as error:
+    except Exception as error:
         console.print(f"[red]An error occurred: {error}[/red]")
 
 
@@ -308,11 +219,21 @@ def main():
     )
 
     try:
-        # Get services
-        service = get_service()
-        gemini_model = get_gemini_model()
-        console.print("[green]✓ Connected to Google Calendar API (OAuth)[/green]")
-        console.print("[green]✓ Connected to Gemini AI[/green]\n")
+        # Clients are created on first use, so the menu shows up immediately
+        # and Gemini is only configured once the user asks a question.
+        clients = {}
+
+        def service():
+            if "calendar" not in clients:
+                clients["calendar"] = get_service()
+                console.print("[green]✓ Connected to Google Calendar API (OAuth)[/green]")
+            return clients["calendar"]
+
+        def gemini_model():
+            if "gemini" not in clients:
+                clients["gemini"] = get_gemini_model()
+                console.print("[green]✓ Connected to Gemini AI[/green]")
+            return clients["gemini"]
 
         while True:
             console.print("\n[bold]Available commands:[/bold]")
@@ -331,38 +252,42 @@ def main():
                 break
             elif choice == "list":
                 max_results = Prompt.ask("Number of events to show", default="10")
-                list_events(service, int(max_results))
+                list_events(service(), int(max_results))
             elif choice == "busy":
                 console.print("\n[bold]Check free/busy status:[/bold]")
+                target_tz = pytz.timezone(CLI_TIMEZONE)
+                now = datetime.now(target_tz)
                 start_date = Prompt.ask(
                     "Start date (YYYY-MM-DD)",
-                    default=datetime.now().strftime("%Y-%m-%d"),
+                    default=now.strftime("%Y-%m-%d"),
                 )
                 end_date = Prompt.ask(
                     "End date (YYYY-MM-DD)",
-                    default=(datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d"),
+                    default=(now + timedelta(days=30)).strftime("%Y-%m-%d"),
                 )
 
                 try:
-                    start_time = datetime.strptime(start_date, "%Y-%m-%d")
-                    end_time = datetime.strptime(end_date, "%Y-%m-%d")
-                    get_free_busy(service, start_time, end_time)
+                    # Dates are read in the CLI timezone, like the server does
+                    start_time = target_tz.localize(datetime.strptime(start_date, "%Y-%m-%d"))
+                    end_time = target_tz.localize(datetime.strptime(end_date, "%Y-%m-%d"))
+                    get_free_busy(
+                        service(), start_time.astimezone(pytz.utc), end_time.astimezone(pytz.utc)
+                    )
                 except ValueError:
                     console.print("[red]Invalid date format. Use YYYY-MM-DD[/red]")
             elif choice == "today":
-                get_today_events(service)
+                get_today_events(service())
             elif choice == "ai":
                 console.print("\n[bold]AI Calendar Analysis:[/bold]")
                 question = Prompt.ask("What would you like to know about your calendar?")
-                
-                if question.strip():
+
+                if question.strip() and not answer_simple_question(service(), question):
                     console.print("\n[blue]Fetching calendar data and analyzing...[/blue]")
-                    calendar_data = get_calendar_data(service)
-                    
+                    calendar_data, retrieval = get_question_data(service(), question)
+
                     if calendar_data:
-                        ai_response = ask_gemini_about_calendar(gemini_model, calendar_data, question)
                         console.print("\n[bold green]AI Analysis:[/bold green]")
-                        console.print(Panel(ai_response, title="Gemini AI Response"))
+                        show_gemini_answer(gemini_model(), calendar_data, question, retrieval)
                     else:
                         console.print("[yellow]No calendar data found to analyze.[/yellow]")
 
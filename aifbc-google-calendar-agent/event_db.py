@@ -0,0 +1,217 @@
+"""
+On-disk event store (SQLite) behind the in-memory event cache.
+
+Every sync of a cached window is written through: a full sync replaces the
+window's time range, an incremental sync upserts and deletes the changed
+events, and the range's sync token is kept alongside. Events are indexed on
+(calendar_id, start_epoch, end_epoch), so when a window is created again,
+after eviction or a restart, it is filled by an indexed range lookup and
+brought up to date with one incremental sync instead of a full download.
+
+A recurring series' master (series mode, see recurrence.py) is stored as
+spanning its first to last occurrence, and a cancelled occurrence of a series
+as a stub at its original start, so restoring a range still brings back the
+exceptions of the series it holds.
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from event_store import event_bounds
+from recurrence import Series, instance_time, is_series
+from tz_convert import MAX_AHEAD_OF_UTC, MAX_BEHIND_UTC
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    start_epoch INTEGER NOT NULL,
+    end_epoch INTEGER NOT NULL,
+    resource TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_by_time
+    ON events (calendar_id, start_epoch, end_epoch);
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    calendar_id TEXT NOT NULL,
+    time_min INTEGER NOT NULL,
+    time_max INTEGER NOT NULL,
+    sync_token TEXT,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (calendar_id, time_min, time_max)
+);
+"""
+
+
+def _epoch(dt) -> int:
+    return int(dt.timestamp())
+
+
+def _is_cancelled_occurrence(event):
+    return event.get("status") == "cancelled" and "originalStartTime" in event
+
+
+def _event_span(event):
+    """(start, end) an event is stored under; all-day dates by the widest span
+    they cover in any timezone (see event_store.event_bounds)."""
+    if _is_cancelled_occurrence(event):
+        start = instance_time(event)
+        if "dateTime" not in event["originalStartTime"]:
+            return start - MAX_AHEAD_OF_UTC, start + timedelta(days=1) + MAX_BEHIND_UTC
+        return start, start + timedelta(seconds=1)
+    start, end = event_bounds(event)
+    if is_series(event):
+        try:
+            series = Series(event)
+        except (KeyError, ValueError):
+            return start, end
+        end = series.span_end()
+        if series.all_day:
+            end += MAX_BEHIND_UTC
+    return start, end
+
+
+def _event_row(calendar_id, event):
+    """(calendar_id, event_id, start_epoch, end_epoch, resource) for an event."""
+    start, end = _event_span(event)
+    return (
+        calendar_id,
+        event["id"],
+        _epoch(start),
+        _epoch(end),
+        json.dumps(event, separators=(",", ":")),
+    )
+
+
+class StoredRange:
+    """A synced time range of one calendar as recorded on disk."""
+
+    __slots__ = ("calendar_id", "time_min", "time_max", "sync_token", "synced_at")
+
+    def __init__(self, calendar_id, time_min, time_max, sync_token, synced_at):
+        self.calendar_id = calendar_id
+        self.time_min = time_min
+        self.time_max = time_max
+        self.sync_token = sync_token
+        self.synced_at = synced_at
+
+    @property
+    def key(self):
+        return (self.calendar_id, self.time_min, self.time_max)
+
+
+class EventDatabase:
+    """SQLite-backed event store with a time-range index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        self.stats = {"range_writes": 0, "change_writes": 0, "restores": 0, "queries": 0}
+
+    def replace_range(self, calendar_id, time_min, time_max, events, sync_token):
+        """Record a full sync: the range now holds exactly `events`."""
+        lower, upper = _epoch(time_min), _epoch(time_max)
+        rows = [_event_row(calendar_id, event) for event in events]
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM events WHERE calendar_id = ? AND end_epoch > ? "
+                "AND start_epoch < ?",
+                (calendar_id, lower, upper),
+            )
+            self._db.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)", rows)
+            # Ranges inside this one are superseded by it.
+            self._db.execute(
+                "DELETE FROM synced_ranges WHERE calendar_id = ? AND time_min >= ? "
+                "AND time_max <= ?",
+                (calendar_id, lower, upper),
+            )
+            self._db.execute(
+                "INSERT INTO synced_ranges VALUES (?, ?, ?, ?, ?)",
+                (calendar_id, lower, upper, sync_token, time.time()),
+            )
+            self.stats["range_writes"] += 1
+        return (calendar_id, lower, upper)
+
+    def apply_changes(self, range_key, items, sync_token):
+        """Record an incremental sync of a stored range."""
+        calendar_id = range_key[0]
+        deleted = [
+            (calendar_id, event["id"])
+            for event in items
+            if event.get("status") == "cancelled" and not _is_cancelled_occurrence(event)
+        ]
+        rows = [
+            _event_row(calendar_id, event)
+            for event in items
+            if event.get("status") != "cancelled" or _is_cancelled_occurrence(event)
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?", deleted
+            )
+            self._db.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute(
+                "UPDATE synced_ranges SET sync_token = ?, synced_at = ? "
+                "WHERE calendar_id = ? AND time_min = ? AND time_max = ?",
+                (sync_token, time.time(), *range_key),
+            )
+            self.stats["change_writes"] += 1
+
+    def covering_range(self, calendar_id, time_min, time_max):
+        """Get the most recently synced stored range covering the range, if any."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT calendar_id, time_min, time_max, sync_token, synced_at "
+                "FROM synced_ranges WHERE calendar_id = ? AND time_min <= ? "
+                "AND time_max >= ? ORDER BY synced_at DESC LIMIT 1",
+                (calendar_id, _epoch(time_min), _epoch(time_max)),
+            ).fetchone()
+        return StoredRange(*row) if row is not None else None
+
+    def query(self, calendar_id, time_min, time_max):
+        """Get raw events overlapping [time_min, time_max), ordered by start."""
+        with self._lock:
+            self.stats["queries"] += 1
+            rows = self._db.execute(
+                "SELECT resource FROM events WHERE calendar_id = ? AND start_epoch < ? "
+                "AND end_epoch > ? ORDER BY start_epoch, end_epoch",
+                (calendar_id, _epoch(time_max), _epoch(time_min)),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def restore(self, calendar_id, time_min, time_max):
+        """Get (stored range, events) for a range covered on disk, or None."""
+        stored = self.covering_range(calendar_id, time_min, time_max)
+        if stored is None:
+            return None
+        events = self.query(calendar_id, time_min, time_max)
+        with self._lock:
+            self.stats["restores"] += 1
+        return stored, events
+
+    def forget(self, calendar_id=None):
+        """Delete stored events and ranges, for one calendar or all of them."""
+        with self._lock, self._db:
+            if calendar_id is None:
+                self._db.execute("DELETE FROM events")
+                self._db.execute("DELETE FROM synced_ranges")
+            else:
+                self._db.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+                self._db.execute(
+                    "DELETE FROM synced_ranges WHERE calendar_id = ?", (calendar_id,)
+                )
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["events"] = self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            stats["ranges"] = self._db.execute(
+                "SELECT COUNT(*) FROM synced_ranges"
+            ).fetchone()[0]
+            return stats
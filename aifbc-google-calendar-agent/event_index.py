@@ -0,0 +1,173 @@
+"""
+BM25 retrieval of the events an AI question is about.
+
+A targeted question ("when is my dentist appointment?") only needs the few
+events that mention what it asks about, not the whole 30-day window. Each
+cached event window keeps an inverted index over its events' summary,
+location and description (summary counting most), built on first use and
+then updated as syncs add, change and cancel events. Questions whose terms
+are all generic or that ask for an overview ("how many meetings this
+week?", "am I free on Friday?") are not narrowed down.
+"""
+import math
+import os
+import re
+from collections import defaultdict
+from typing import NamedTuple
+
+# Most events a question is narrowed down to.
+RETRIEVAL_TOP_K = int(os.getenv("PROMPT_RETRIEVAL_TOP_K", "20"))
+RETRIEVAL_ENABLED = os.getenv("PROMPT_RETRIEVAL_ENABLED", "true").lower() == "true"
+# Events scoring below this fraction of the best match are left out.
+MIN_RELATIVE_SCORE = 0.3
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Term frequency weight of each field
+FIELD_WEIGHTS = {"summary": 3, "location": 2, "description": 1}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    """
+    a about after all also am an and any are as at be before been by can could
+    did do does doing for from get go going had has have how i if in into is it
+    its me my need of on or our should so than that the their them then there
+    these they this those to too up us was we were what when where which who
+    whom why will with would you your
+    """.split()
+)
+
+# Words that say nothing about which events are meant
+GENERIC = frozenset(
+    """
+    appointment calendar day days event events meeting meetings month months
+    morning afternoon evening night tonight today tomorrow yesterday week weeks
+    weekend year quarter next last past previous coming upcoming this time
+    plan plans planned scheduled happen happening left
+    monday tuesday wednesday thursday friday saturday sunday
+    january february march april may june july august september october
+    november december
+    """.split()
+)
+
+# Questions about the shape of a whole period rather than particular events
+_OVERVIEW = re.compile(
+    r"\b(?:how many|how much|busiest|busy|free|available|availability|"
+    r"schedule|agenda|overview|summar\w*|everything|all my|list)\b"
+)
+
+
+class Retrieval(NamedTuple):
+    """How the events for a prompt were narrowed down."""
+
+    terms: tuple
+    considered: int
+    first: str
+    last: str
+
+
+def stem(word: str) -> str:
+    """Strip the commonest English suffixes, so "interviews" finds "interview"."""
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str):
+    """Lowercased, stemmed words of a text, without stopwords or bare numbers."""
+    return [
+        stem(word)
+        for word in _WORD.findall(text.lower())
+        if word not in STOPWORDS and not word.isdigit()
+    ]
+
+
+_GENERIC_STEMS = frozenset(stem(word) for word in GENERIC)
+
+
+def question_terms(question: str):
+    """Terms to retrieve events for a question by, or () to use every event."""
+    text = question.lower()
+    if _OVERVIEW.search(text):
+        return ()
+    terms = [term for term in tokenize(text) if term not in _GENERIC_STEMS]
+    return tuple(dict.fromkeys(terms))
+
+
+class EventIndex:
+    """Inverted index of raw Calendar API events, scored with BM25."""
+
+    def __init__(self):
+        # term -> {event id: weighted term frequency}
+        self._postings = defaultdict(dict)
+        # event id -> (length, {term: weighted term frequency})
+        self._docs = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, event_id, event):
+        """Index an event, replacing what was indexed for its ID before."""
+        self.remove(event_id)
+        frequencies = defaultdict(int)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(event.get(field) or ""):
+                frequencies[term] += weight
+        length = sum(frequencies.values())
+        self._docs[event_id] = (length, frequencies)
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            self._postings[term][event_id] = frequency
+
+    def remove(self, event_id):
+        doc = self._docs.pop(event_id, None)
+        if doc is None:
+            return
+        length, frequencies = doc
+        self._total_length -= length
+        for term in frequencies:
+            postings = self._postings[term]
+            del postings[event_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, terms, candidates=None, k=RETRIEVAL_TOP_K, tiebreak=None):
+        """Get up to k (event id, score) pairs for the terms, best first.
+
+        Only events in `candidates` (a set of IDs) are scored when it is
+        given; equal scores are ordered by tiebreak(event id).
+        """
+        if not self._docs:
+            return []
+        count = len(self._docs)
+        average_length = self._total_length / count or 1.0
+        scores = defaultdict(float)
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for event_id, frequency in postings.items():
+                if candidates is not None and event_id not in candidates:
+                    continue
+                length = self._docs[event_id][0]
+                scores[event_id] += idf * (
+                    frequency
+                    * (K1 + 1)
+                    / (frequency + K1 * (1 - B + B * length / average_length))
+                )
+        if not scores:
+            return []
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], tiebreak(item[0]) if tiebreak else 0),
+        )
+        cutoff = ranked[0][1] * MIN_RELATIVE_SCORE
+        return [item for item in ranked[:k] if item[1] >= cutoff]
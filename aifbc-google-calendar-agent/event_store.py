@@ -0,0 +1,654 @@
+"""
+In-process cache of Google Calendar events, kept fresh with incremental sync.
+
+Each cached window holds the raw event resources for one calendar between two
+UTC instants. A window is populated by one full `events().list` pass; after
+that only the changes since the last `nextSyncToken` are pulled, until the
+window's TTL runs out and it is rebuilt from scratch.
+
+With an EventDatabase attached (EVENT_CACHE_DB), every sync is written
+through to disk, and a new window is first restored from there and then
+brought up to date incrementally.
+
+In series mode (EVENT_CACHE_SERIES, see recurrence.py) recurring events are
+listed and kept as one master per series, plus their moved and cancelled
+occurrences, and expanded into instances only for the range a lookup asks
+for.
+
+All-day events carry a bare date, which covers a different 24 hours in every
+timezone. Windows hold them by the widest span the date can cover, and
+lookups pass the timezone the request is in, where each date then runs from
+local midnight to local midnight.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+from googleapiclient.errors import HttpError
+
+from calendar_fetch import MAX_PAGE_SIZE, iter_event_pages
+from event_index import EventIndex
+from freebusy import merge_intervals
+from recurrence import SERIES_MODE, Series, instance_time, is_series
+from resilience import AuthError, UpstreamError
+from single_flight import upstream_flight
+from tz_convert import MAX_AHEAD_OF_UTC, MAX_BEHIND_UTC, get_timezone
+
+# How far a freshly created window reaches, so that /today, the 30-day AI
+# window and /events all land in the same cached window.
+CACHE_WINDOW_DAYS = int(os.getenv("EVENT_CACHE_WINDOW_DAYS", "32"))
+# Pull incremental changes at most this often per window.
+SYNC_INTERVAL_SECONDS = float(os.getenv("EVENT_CACHE_SYNC_SECONDS", "60"))
+# Rebuild a window from scratch after this long.
+TTL_SECONDS = float(os.getenv("EVENT_CACHE_TTL_SECONDS", "3600"))
+# Upper bound on events held across all windows; least recently used windows
+# are evicted first.
+MAX_EVENTS = int(os.getenv("EVENT_CACHE_MAX_EVENTS", "50000"))
+# While Google is throttling, failing or circuit-broken, keep serving a
+# window's events for up to this long after its last successful sync.
+MAX_STALE_SECONDS = float(os.getenv("EVENT_CACHE_MAX_STALE_SECONDS", "86400"))
+# Path of the SQLite file events are persisted in; empty keeps them in memory.
+EVENT_CACHE_DB = os.getenv("EVENT_CACHE_DB", "")
+
+
+def parse_event_time(value: dict, timezone_str: Optional[str] = None) -> datetime:
+    """Parse an event start/end object into an aware UTC datetime.
+
+    All-day events carry a bare date, which is taken as midnight in
+    timezone_str (UTC when not given).
+    """
+    if "dateTime" in value:
+        dt = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = pytz.utc.localize(dt)
+        return dt.astimezone(pytz.utc)
+    day = datetime.strptime(value["date"], "%Y-%m-%d")
+    if not timezone_str or timezone_str == "UTC":
+        return pytz.utc.localize(day)
+    return get_timezone(timezone_str).localize(day).astimezone(pytz.utc)
+
+
+def event_bounds(event: dict):
+    """Get the widest (start, end) an event can cover in any timezone.
+
+    Equal to its actual start and end unless it is an all-day event.
+    """
+    start = parse_event_time(event["start"])
+    end = parse_event_time(event["end"])
+    if "dateTime" not in event["start"]:
+        start -= MAX_AHEAD_OF_UTC
+    if "dateTime" not in event["end"]:
+        end += MAX_BEHIND_UTC
+    return start, end
+
+
+def is_busy(event: dict) -> bool:
+    """Check whether an event blocks time the way free/busy would report it."""
+    if event.get("status") == "cancelled":
+        return False
+    if event.get("transparency") == "transparent":
+        return False
+    for attendee in event.get("attendees", []):
+        if attendee.get("self") and attendee.get("responseStatus") == "declined":
+            return False
+    return True
+
+
+def merge_busy_periods(events, timezone_str: Optional[str] = None):
+    """Merge the busy events into sorted, non-overlapping (start, end) pairs.
+
+    All-day events block their dates in timezone_str (UTC when not given).
+    """
+    return merge_intervals(
+        (
+            parse_event_time(event["start"], timezone_str),
+            parse_event_time(event["end"], timezone_str),
+        )
+        for event in events
+        if is_busy(event)
+    )
+
+
+def _floor_day(dt: datetime) -> datetime:
+    return dt.astimezone(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil_day(dt: datetime) -> datetime:
+    floor = _floor_day(dt)
+    return floor if floor == dt else floor + timedelta(days=1)
+
+
+class CachedWindow:
+    """Events of one calendar between time_min and time_max."""
+
+    def __init__(
+        self, calendar_id: str, time_min: datetime, time_max: datetime, series=False
+    ):
+        self.calendar_id = calendar_id
+        self.time_min = time_min
+        self.time_max = time_max
+        self.series_mode = series
+        self.lock = threading.Lock()
+        # event id -> (start, end, raw event); all-day events by event_bounds
+        self.events = {}
+        # Series mode only: master event id -> recurrence.Series, and
+        # master event id -> {instance id: (original start, raw instance)}
+        # for its moved and cancelled occurrences
+        self.series = {}
+        self.replaced = {}
+        self.sync_token = None
+        self.populated_at = 0.0
+        self.synced_at = 0.0
+        # Key of the on-disk range sync_token belongs to
+        self.stored_range = None
+        # event_index.EventIndex of the events, built on first search
+        self.index = None
+
+    def covers(self, time_min: datetime, time_max: datetime) -> bool:
+        return self.time_min <= time_min and time_max <= self.time_max
+
+    def apply(self, items):
+        """Apply a page of (full or incremental) results."""
+        for event in items:
+            if self.series_mode and "recurringEventId" in event and "originalStartTime" in event:
+                # A moved or cancelled occurrence replaces the generated one
+                self.replaced.setdefault(event["recurringEventId"], {})[event["id"]] = (
+                    instance_time(event),
+                    event,
+                )
+            if event.get("status") == "cancelled":
+                self.events.pop(event["id"], None)
+                if self.series.pop(event["id"], None) is not None:
+                    self.replaced.pop(event["id"], None)
+                if self.index is not None:
+                    self.index.remove(event["id"])
+                continue
+            series = self._series(event)
+            if series is not None:
+                self.series[event["id"]] = series
+                self.events.pop(event["id"], None)
+            else:
+                self.series.pop(event["id"], None)
+                self.events[event["id"]] = (*event_bounds(event), event)
+            if self.index is not None:
+                self.index.add(event["id"], event)
+
+    def _series(self, event):
+        if not self.series_mode or not is_series(event):
+            return None
+        try:
+            return Series(event)
+        except (KeyError, ValueError) as e:
+            # Keep a master whose rules can't be read as its first occurrence
+            print(f"Error reading recurrence of event {event['id']}: {e}")
+            return None
+
+    def reset(self):
+        """Drop every event, before a full sync refills the window."""
+        self.events = {}
+        self.series = {}
+        self.replaced = {}
+        self.index = None
+
+    def size(self):
+        """Number of events held, counting each series once."""
+        return len(self.events) + len(self.series)
+
+    def resources(self):
+        """The raw resources held: single events, series masters and the
+        cancelled occurrences of series."""
+        resources = [entry[2] for entry in self.events.values()]
+        resources.extend(series.event for series in self.series.values())
+        resources.extend(
+            entry[1]
+            for occurrences in self.replaced.values()
+            for entry in occurrences.values()
+            if entry[1].get("status") == "cancelled"
+        )
+        return resources
+
+    def _entries(self, time_min, time_max, timezone_str=None):
+        """(start, end, raw event, index id) of the events overlapping the
+        range, with series expanded into their occurrences and all-day
+        events placed in timezone_str."""
+        entries = []
+        for event_id, (start, end, event) in self.events.items():
+            if end <= time_min or start >= time_max:
+                continue
+            if "dateTime" not in event["start"]:
+                start = parse_event_time(event["start"], timezone_str)
+                end = parse_event_time(event["end"], timezone_str)
+                if end <= time_min or start >= time_max:
+                    continue
+            entries.append((start, end, event, event_id))
+        for series_id, series in self.series.items():
+            replaced = self.replaced.get(series_id)
+            starts = {entry[0] for entry in replaced.values()} if replaced else None
+            entries.extend(
+                (*entry, series_id)
+                for entry in series.occurrences(time_min, time_max, starts, timezone_str)
+            )
+        return entries
+
+    def search(self, terms, time_min, time_max, k, timezone_str=None):
+        """Get (the k events in the range best matching the terms, by start,
+        number of events in the range). No events match when none mention
+        any of the terms.
+        """
+        if self.index is None:
+            self.index = EventIndex()
+            for event_id, entry in self.events.items():
+                self.index.add(event_id, entry[2])
+            for series_id, series in self.series.items():
+                self.index.add(series_id, series.event)
+        entries = self._entries(time_min, time_max, timezone_str)
+        # A series is indexed once and matches with all its occurrences
+        by_id = {}
+        for entry in sorted(entries, key=lambda entry: (entry[0], entry[1])):
+            by_id.setdefault(entry[3], []).append(entry)
+        ranked = self.index.search(
+            terms, set(by_id), k, tiebreak=lambda event_id: by_id[event_id][0][0]
+        )
+        selected = []
+        for event_id, _ in ranked:
+            selected.extend(by_id[event_id])
+        selected = selected[:k]
+        selected.sort(key=lambda entry: (entry[0], entry[1]))
+        return [entry[2] for entry in selected], len(entries)
+
+    def select(
+        self,
+        time_min: datetime,
+        time_max: Optional[datetime] = None,
+        timezone_str: Optional[str] = None,
+    ):
+        """Return events overlapping the range, ordered by start time.
+
+        Matches events().list semantics: an event is included when it ends
+        after time_min and starts before time_max, all-day events taken as
+        dates in timezone_str.
+        """
+        selected = self._entries(time_min, time_max or self.time_max, timezone_str)
+        selected.sort(key=lambda entry: (entry[0], entry[1]))
+        return [entry[2] for entry in selected]
+
+
+class EventStore:
+    """Time-windowed, TTL/LRU-bounded event cache with incremental sync."""
+
+    def __init__(
+        self,
+        sync_interval=SYNC_INTERVAL_SECONDS,
+        ttl=TTL_SECONDS,
+        max_events=MAX_EVENTS,
+        window_days=CACHE_WINDOW_DAYS,
+        max_stale=MAX_STALE_SECONDS,
+        database=None,
+        series=SERIES_MODE,
+    ):
+        self.sync_interval = sync_interval
+        self.ttl = ttl
+        self.max_events = max_events
+        self.window_days = window_days
+        self.max_stale = max_stale
+        # Optional event_db.EventDatabase written through on every sync
+        self.database = database
+        # List recurring events as series masters rather than instances
+        self.series = series
+        self._lock = threading.Lock()
+        # (calendar_id, time_min, time_max) -> CachedWindow, in LRU order
+        self._windows = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "full_syncs": 0,
+            "incremental_syncs": 0,
+            "upstream_calls": 0,
+            "evictions": 0,
+            "stale_served": 0,
+            "restored": 0,
+            "searches": 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _find_window_locked(self, calendar_id, time_min, time_max):
+        for key, window in self._windows.items():
+            if window.calendar_id == calendar_id and window.covers(time_min, time_max):
+                self._windows.move_to_end(key)
+                return window
+        return None
+
+    def _find_window(self, calendar_id, time_min, time_max):
+        with self._lock:
+            return self._find_window_locked(calendar_id, time_min, time_max)
+
+    def _find_or_create_window(self, calendar_id, time_min, time_max):
+        """Get the window covering the range, creating it if there is none.
+
+        Lookup and creation happen under one lock, so concurrent misses for
+        the same range end up sharing a single window (and a single sync).
+        Returns (window, created).
+        """
+        with self._lock:
+            window = self._find_window_locked(calendar_id, time_min, time_max)
+            if window is not None:
+                return window, False
+            start = _floor_day(time_min)
+            end = max(_ceil_day(time_max), start + timedelta(days=self.window_days))
+            window = CachedWindow(calendar_id, start, end, self.series)
+            self._windows[(calendar_id, start, end)] = window
+            return window, True
+
+    def _list_pages(self, service, window, changes=None, **params):
+        """Run events().list across all pages, applying each to the window.
+
+        Applied items are also collected in `changes` when it is given.
+        """
+        sync_token = None
+        for page in iter_event_pages(
+            service, window.calendar_id, singleEvents=not self.series, **params
+        ):
+            self._count("upstream_calls")
+            window.apply(page.get("items", []))
+            if changes is not None:
+                changes.extend(page.get("items", []))
+            sync_token = page.get("nextSyncToken")
+        return sync_token
+
+    def _stored_id(self, calendar_id):
+        # Series and expanded instances of one calendar are stored apart
+        return f"{calendar_id}#series" if self.series else calendar_id
+
+    def _restore(self, window):
+        """Fill a new window from the database, leaving it due for an
+        incremental sync. Returns whether anything was restored."""
+        if self.database is None:
+            return False
+        try:
+            restored = self.database.restore(
+                self._stored_id(window.calendar_id), window.time_min, window.time_max
+            )
+        except sqlite3.Error as e:
+            print(f"Error restoring events for {window.calendar_id}: {e}")
+            return False
+        if restored is None:
+            return False
+        stored, events = restored
+        window.apply(events)
+        window.sync_token = stored.sync_token
+        window.stored_range = stored.key
+        window.populated_at = time.monotonic()
+        window.synced_at = 0.0
+        self._count("restored")
+        return True
+
+    def _persist(self, window, due, changes=()):
+        """Write a completed full ("full") or incremental sync through to disk."""
+        if self.database is None:
+            return
+        try:
+            if due == "full" or window.stored_range is None:
+                window.stored_range = self.database.replace_range(
+                    self._stored_id(window.calendar_id),
+                    window.time_min,
+                    window.time_max,
+                    window.resources(),
+                    window.sync_token,
+                )
+            else:
+                self.database.apply_changes(
+                    window.stored_range, changes, window.sync_token
+                )
+        except sqlite3.Error as e:
+            # The in-memory window is still good; only persistence is lost.
+            print(f"Error persisting events for {window.calendar_id}: {e}")
+
+    def _full_sync(self, service, window):
+        previous = (window.events, window.series, window.replaced)
+        window.reset()
+        try:
+            window.sync_token = self._list_pages(
+                service,
+                window,
+                timeMin=window.time_min.isoformat(),
+                timeMax=window.time_max.isoformat(),
+            )
+        except Exception:
+            # Keep the last good copy to serve stale
+            window.events, window.series, window.replaced = previous
+            raise
+        window.populated_at = window.synced_at = time.monotonic()
+        self._count("full_syncs")
+        self._persist(window, "full")
+
+    def _incremental_sync(self, service, window):
+        changes = []
+        try:
+            # Incremental results always include deletions, as cancelled items.
+            window.sync_token = self._list_pages(
+                service, window, changes, syncToken=window.sync_token
+            )
+        except HttpError as error:
+            # 410 Gone: the sync token is no longer valid, start over.
+            if error.resp.status != 410:
+                raise
+            self._full_sync(service, window)
+            return
+        window.synced_at = time.monotonic()
+        self._count("incremental_syncs")
+        self._persist(window, "incremental", changes)
+
+    def _sync_due(self, window, now):
+        """Get the sync a window needs: "full", "incremental" or None."""
+        if not window.populated_at or now - window.populated_at >= self.ttl:
+            return "full"
+        if now - window.synced_at >= self.sync_interval:
+            return "incremental" if window.sync_token else "full"
+        return None
+
+    def _sync(self, service, window):
+        with window.lock:
+            if not window.populated_at:
+                self._restore(window)
+            due = self._sync_due(window, time.monotonic())
+            if due == "full":
+                self._full_sync(service, window)
+            elif due == "incremental":
+                self._incremental_sync(service, window)
+
+    def _refresh(self, service, window):
+        # Requests arriving while a window is being synced wait for that sync
+        # instead of queueing up their own.
+        try:
+            upstream_flight.do(
+                ("events", window.calendar_id, window.time_min, window.time_max),
+                lambda: self._sync(service, window),
+            )
+        except UpstreamError as error:
+            # Revoked or missing access is not papered over with cached data
+            if (
+                isinstance(error, AuthError)
+                or not window.populated_at
+                or time.monotonic() - window.synced_at > self.max_stale
+            ):
+                raise
+            self._count("stale_served")
+            print(f"Serving stale events for {window.calendar_id}: {error}")
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used windows until the event budget is met."""
+        with self._lock:
+            total = sum(window.size() for window in self._windows.values())
+            while total > self.max_events and len(self._windows) > 1:
+                _, window = self._windows.popitem(last=False)
+                total -= window.size()
+                self.stats["evictions"] += 1
+
+    def batch_sync_reads(self, service, ranges):
+        """Claim the windows covering `ranges` that are due for a sync.
+
+        Returns (reads, finish) for calendar_batch.execute_batch: `reads` maps
+        one key per claimed window to a function building its events().list
+        request for a page token, and `finish(results)` applies the pages
+        read and releases the windows. Windows another request is already
+        syncing are left to it. A failed read leaves its window as it was, so
+        the next lookup syncs it on its own and reports (or serves stale
+        over) the failure as usual.
+        """
+        claimed = {}
+        now = time.monotonic()
+        for calendar_id, time_min, time_max in ranges:
+            window, created = self._find_or_create_window(calendar_id, time_min, time_max)
+            self._count("misses" if created else "hits")
+            if not window.lock.acquire(blocking=False):
+                continue
+            if not window.populated_at:
+                self._restore(window)
+            due = self._sync_due(window, now)
+            if due is None:
+                window.lock.release()
+                continue
+            claimed[(due, calendar_id, window.time_min, window.time_max)] = window
+
+        def build(key, window):
+            if key[0] == "incremental":
+                params = {"syncToken": window.sync_token}
+            else:
+                params = {
+                    "timeMin": window.time_min.isoformat(),
+                    "timeMax": window.time_max.isoformat(),
+                }
+            return lambda page_token: service.events().list(
+                calendarId=window.calendar_id,
+                maxResults=MAX_PAGE_SIZE,
+                pageToken=page_token,
+                singleEvents=not self.series,
+                **params,
+            )
+
+        reads = {key: build(key, window) for key, window in claimed.items()}
+
+        def finish(results):
+            try:
+                for key, window in claimed.items():
+                    pages, error = results.get(key, ([], None))
+                    if error is None:
+                        self._apply_batch_sync(window, key[0], pages)
+                    elif key[0] == "incremental" and getattr(
+                        getattr(error, "resp", None), "status", None
+                    ) == 410:
+                        # Expired sync token: start over on the next lookup.
+                        window.populated_at = 0.0
+            finally:
+                for window in claimed.values():
+                    window.lock.release()
+            self._evict()
+
+        return reads, finish
+
+    def _apply_batch_sync(self, window, due, pages):
+        self._count("upstream_calls", len(pages))
+        if due == "full":
+            window.reset()
+        changes = []
+        for page in pages:
+            window.apply(page.get("items", []))
+            changes.extend(page.get("items", []))
+        window.sync_token = pages[-1].get("nextSyncToken") if pages else None
+        window.synced_at = time.monotonic()
+        if due == "full":
+            window.populated_at = window.synced_at
+        self._count("full_syncs" if due == "full" else "incremental_syncs")
+        self._persist(window, due, changes)
+
+    def window_for(self, service, calendar_id, time_min, time_max):
+        """Get a fresh cached window covering the range, populating it if needed."""
+        window, created = self._find_or_create_window(calendar_id, time_min, time_max)
+        self._count("misses" if created else "hits")
+        self._refresh(service, window)
+        return window
+
+    def get_events(self, service, calendar_id, time_min, time_max, timezone_str=None):
+        """Get events overlapping [time_min, time_max), ordered by start.
+
+        All-day events are matched as dates in timezone_str (UTC when not
+        given), like every other lookup here.
+        """
+        window = self.window_for(service, calendar_id, time_min, time_max)
+        with window.lock:
+            return window.select(time_min, time_max, timezone_str)
+
+    def get_upcoming(
+        self, service, calendar_id, time_min, max_results, timezone_str=None
+    ):
+        """Get the next max_results events from the cache.
+
+        Returns None when the cached window holds fewer events than requested,
+        since more may exist past the end of the window.
+        """
+        window = self.window_for(service, calendar_id, time_min, time_min)
+        with window.lock:
+            events = window.select(time_min, timezone_str=timezone_str)
+        if len(events) < max_results:
+            return None
+        return events[:max_results]
+
+    def search_events(
+        self, service, calendar_id, time_min, time_max, terms, k, timezone_str=None
+    ):
+        """Get (best matching events, events in range) for a range (BM25).
+
+        The matches are at most k events, ordered by start, and empty when
+        no event in the range mentions any of the terms.
+        """
+        window = self.window_for(service, calendar_id, time_min, time_max)
+        with window.lock:
+            self._count("searches")
+            return window.search(terms, time_min, time_max, k, timezone_str)
+
+    def get_busy_periods(
+        self, service, calendar_id, time_min, time_max, timezone_str=None
+    ):
+        """Get merged busy periods clipped to the range, or None if not cached."""
+        window = self._find_window(calendar_id, time_min, time_max)
+        if window is None:
+            return None
+        self._count("hits")
+        self._refresh(service, window)
+        with window.lock:
+            events = window.select(time_min, time_max, timezone_str)
+        return [
+            (max(start, time_min), min(end, time_max))
+            for start, end in merge_busy_periods(events, timezone_str)
+        ]
+
+    def invalidate(self, calendar_id: Optional[str] = None):
+        """Drop cached windows and their stored copies, for one calendar or all."""
+        with self._lock:
+            for key in list(self._windows):
+                if calendar_id is None or key[0] == calendar_id:
+                    del self._windows[key]
+        if self.database is not None:
+            self.database.forget(
+                self._stored_id(calendar_id) if calendar_id is not None else None
+            )
+
+    def snapshot(self):
+        """Return cache counters plus current size."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["windows"] = len(self._windows)
+            stats["events"] = sum(window.size() for window in self._windows.values())
+            stats["series"] = sum(len(window.series) for window in self._windows.values())
+        if self.database is not None:
+            stats["database"] = self.database.snapshot()
+        return stats
@@ -0,0 +1,191 @@
+"""
+Deterministic "when are we all free?" engine.
+
+Busy periods are handled as plain integer epoch seconds held in flat sorted
+lists, so merging hundreds of calendars over a quarter is a couple of integer
+sorts and one linear sweep, with no per-interval objects. Working hours are
+expanded per attendee timezone (DST-aware) and intersected, then the merged
+busy time is subtracted to get candidate slots.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytz
+
+DEFAULT_WORKING_HOURS = {"start": "09:00", "end": "17:00", "days": [0, 1, 2, 3, 4]}
+
+
+def to_epoch(dt: datetime) -> int:
+    """Convert an aware datetime to integer epoch seconds."""
+    return int(dt.timestamp())
+
+
+def from_epoch(epoch: int, tz) -> datetime:
+    """Convert epoch seconds to an aware datetime in the given timezone."""
+    return datetime.fromtimestamp(epoch, tz)
+
+
+def union_intervals(starts, ends):
+    """Union intervals given as parallel start/end lists.
+
+    Starts and ends are sorted independently and swept with a depth counter,
+    which is valid for a union because only the count of open intervals
+    matters. Touching intervals are merged. Returns (starts, ends) lists.
+    """
+    starts = sorted(starts)
+    ends = sorted(ends)
+    merged_starts, merged_ends = [], []
+    depth = 0
+    i = j = 0
+    count = len(starts)
+    while j < count:
+        if i < count and starts[i] <= ends[j]:
+            if depth == 0:
+                merged_starts.append(starts[i])
+            depth += 1
+            i += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                merged_ends.append(ends[j])
+            j += 1
+    return merged_starts, merged_ends
+
+
+def intersect_intervals(a_starts, a_ends, b_starts, b_ends):
+    """Intersect two sorted, non-overlapping interval lists."""
+    starts, ends = [], []
+    i = j = 0
+    while i < len(a_starts) and j < len(b_starts):
+        start = max(a_starts[i], b_starts[j])
+        end = min(a_ends[i], b_ends[j])
+        if start < end:
+            starts.append(start)
+            ends.append(end)
+        if a_ends[i] < b_ends[j]:
+            i += 1
+        else:
+            j += 1
+    return starts, ends
+
+
+def subtract_intervals(a_starts, a_ends, b_starts, b_ends):
+    """Remove sorted, non-overlapping intervals b from sorted intervals a."""
+    starts, ends = [], []
+    j = 0
+    for start, end in zip(a_starts, a_ends):
+        # Skip busy blocks that end before this window starts
+        while j < len(b_starts) and b_ends[j] <= start:
+            j += 1
+        cursor = start
+        k = j
+        while k < len(b_starts) and b_starts[k] < end:
+            if b_starts[k] > cursor:
+                starts.append(cursor)
+                ends.append(b_starts[k])
+            cursor = max(cursor, b_ends[k])
+            k += 1
+        if cursor < end:
+            starts.append(cursor)
+            ends.append(end)
+    return starts, ends
+
+
+def _parse_clock(value: str):
+    hours, minutes = value.split(":")
+    return int(hours), int(minutes)
+
+
+def working_windows(time_min, time_max, timezone_str, working_hours=None):
+    """Expand working hours into epoch intervals between time_min and time_max.
+
+    Each day is localized separately, so DST transitions shift the window
+    correctly.
+    """
+    working_hours = working_hours or DEFAULT_WORKING_HOURS
+    tz = pytz.timezone(timezone_str)
+    start_hour, start_minute = _parse_clock(working_hours.get("start", "09:00"))
+    end_hour, end_minute = _parse_clock(working_hours.get("end", "17:00"))
+    days = set(working_hours.get("days", DEFAULT_WORKING_HOURS["days"]))
+    lower, upper = to_epoch(time_min), to_epoch(time_max)
+
+    starts, ends = [], []
+    day = time_min.astimezone(tz).date() - timedelta(days=1)
+    last_day = time_max.astimezone(tz).date()
+    while day <= last_day:
+        if day.weekday() in days:
+            opens = tz.localize(
+                datetime(day.year, day.month, day.day, start_hour, start_minute)
+            )
+            closes = tz.localize(
+                datetime(day.year, day.month, day.day, end_hour, end_minute)
+            )
+            start = max(to_epoch(opens), lower)
+            end = min(to_epoch(closes), upper)
+            if start < end:
+                starts.append(start)
+                ends.append(end)
+        day += timedelta(days=1)
+    return starts, ends
+
+
+def find_free_slots(
+    busy,
+    time_min,
+    time_max,
+    attendee_hours,
+    duration_minutes=30,
+    buffer_minutes=0,
+    granularity_minutes=15,
+    rank="earliest",
+    limit=10,
+):
+    """Find slots where every attendee is free within their working hours.
+
+    `busy` is an iterable of (start_epoch, end_epoch) pairs from all
+    calendars; `attendee_hours` is a list of (timezone, working_hours) pairs,
+    one per attendee (or per distinct timezone). Each candidate slot starts at
+    the first granularity-aligned instant of a free gap long enough for the
+    meeting. `rank` is "earliest" or "roomiest" (largest free gap first).
+    Returns (start_epoch, end_epoch, free_seconds) tuples.
+    """
+    duration = duration_minutes * 60
+    buffer = buffer_minutes * 60
+    granularity = max(granularity_minutes, 1) * 60
+
+    # Busy time padded by the buffer on both sides, as flat int lists
+    busy_starts, busy_ends = [], []
+    for start, end in busy:
+        busy_starts.append(start - buffer)
+        busy_ends.append(end + buffer)
+    busy_starts, busy_ends = union_intervals(busy_starts, busy_ends)
+
+    # Times inside everyone's working hours
+    allowed_starts, allowed_ends = [to_epoch(time_min)], [to_epoch(time_max)]
+    seen = set()
+    for timezone_str, working_hours in attendee_hours:
+        # Attendees sharing a timezone and schedule only need one pass
+        key = (timezone_str, json.dumps(working_hours, sort_keys=True))
+        if key in seen:
+            continue
+        seen.add(key)
+        starts, ends = working_windows(
+            time_min, time_max, timezone_str, working_hours
+        )
+        allowed_starts, allowed_ends = intersect_intervals(
+            allowed_starts, allowed_ends, starts, ends
+        )
+
+    free_starts, free_ends = subtract_intervals(
+        allowed_starts, allowed_ends, busy_starts, busy_ends
+    )
+
+    slots = []
+    for start, end in zip(free_starts, free_ends):
+        aligned = -(-start // granularity) * granularity
+        if aligned + duration <= end:
+            slots.append((aligned, aligned + duration, end - aligned))
+
+    if rank == "roomiest":
+        slots.sort(key=lambda slot: (-slot[2], slot[0]))
+    return slots[:limit] if limit else slots
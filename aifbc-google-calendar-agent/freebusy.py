@@ -0,0 +1,156 @@
+"""
+Batched free/busy lookups across many calendars.
+
+The Calendar API accepts a bounded number of calendars per freebusy().query
+call, so larger requests are split into chunks and the chunks are issued
+concurrently on a shared thread pool. A failure only affects the calendars in
+the failing chunk; every other calendar still gets its busy periods.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from resilience import UpstreamError, call_upstream, current_user
+from single_flight import upstream_flight
+
+# Per-query item limit of the freebusy endpoint.
+FREEBUSY_MAX_ITEMS = 50
+FREEBUSY_MAX_WORKERS = int(os.getenv("FREEBUSY_MAX_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=FREEBUSY_MAX_WORKERS, thread_name_prefix="freebusy"
+)
+
+
+def parse_api_time(value: str) -> datetime:
+    """Parse an RFC 3339 timestamp returned by the API."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def merge_intervals(intervals):
+    """Merge (start, end) pairs into sorted, non-overlapping intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def chunked(items, size=FREEBUSY_MAX_ITEMS):
+    """Split a list into consecutive chunks of at most `size` items."""
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def freebusy_request(service, calendar_ids, time_min, time_max):
+    """Build the freebusy().query request for a chunk of calendars."""
+    body = {
+        "timeMin": time_min.isoformat(),
+        "timeMax": time_max.isoformat(),
+        "items": [{"id": calendar_id} for calendar_id in calendar_ids],
+    }
+    return service.freebusy().query(body=body)
+
+
+def parse_freebusy_result(result, calendar_ids):
+    """Normalize a freebusy().query result to per-calendar busy/errors."""
+    calendars = result.get("calendars", {})
+
+    chunk_results = {}
+    for calendar_id in calendar_ids:
+        calendar = calendars.get(calendar_id)
+        if calendar is None:
+            chunk_results[calendar_id] = {
+                "busy": [],
+                "errors": [{"reason": "missing", "message": "Not in response"}],
+            }
+            continue
+        chunk_results[calendar_id] = {
+            "busy": [
+                (parse_api_time(period["start"]), parse_api_time(period["end"]))
+                for period in calendar.get("busy", [])
+            ],
+            "errors": calendar.get("errors", []),
+        }
+    return chunk_results
+
+
+def failed_chunk(calendar_ids, error):
+    """Per-calendar results for a chunk whose query failed as a whole."""
+    # Quota, auth and transient failures are reported as such.
+    reason = error.kind if isinstance(error, UpstreamError) else "requestFailed"
+    return {
+        calendar_id: {"busy": [], "errors": [{"reason": reason, "message": str(error)}]}
+        for calendar_id in calendar_ids
+    }
+
+
+def _query_chunk(service, calendar_ids, time_min, time_max, user=None):
+    """Run one freebusy().query for a chunk and normalize its result."""
+    request = freebusy_request(service, calendar_ids, time_min, time_max)
+    result = call_upstream("calendar", request.execute, user)
+    return parse_freebusy_result(result, calendar_ids)
+
+
+def query_freebusy(service_for, calendars, time_min, time_max, executor=None):
+    """Query free/busy for many calendars, possibly owned by different users.
+
+    `calendars` is a list of (calendar_id, token) pairs; `service_for(token)`
+    returns the Calendar service to use for that token (None meaning the
+    server's own credentials). Returns a dict keyed by calendar ID with the
+    calendar's busy (start, end) pairs and any per-calendar errors.
+
+    Identical chunks queried concurrently by other requests for the same
+    owner share one upstream call.
+    """
+    executor = executor or _executor
+    # Executor threads don't see the request's context; Google quotas are
+    # per user, so a caller-supplied token counts as its own user.
+    request_user = current_user.get()
+
+    # Group calendars by owner so each chunk goes out under one set of
+    # credentials, then split each group to the per-query item limit.
+    groups = {}
+    for calendar_id, token in calendars:
+        groups.setdefault(token, [])
+        if calendar_id not in groups[token]:
+            groups[token].append(calendar_id)
+
+    futures = []
+    for token, calendar_ids in groups.items():
+        # A token names its owner; calendars without one are read through
+        # the caller's service, which differs per user (see server.services_for).
+        owner = token if token is not None else id(service_for(None))
+        for chunk in chunked(calendar_ids):
+            futures.append(
+                (
+                    chunk,
+                    executor.submit(
+                        upstream_flight.do,
+                        (
+                            "freebusy",
+                            owner,
+                            tuple(chunk),
+                            time_min.isoformat(),
+                            time_max.isoformat(),
+                        ),
+                        lambda token=token, chunk=chunk: _query_chunk(
+                            service_for(token),
+                            chunk,
+                            time_min,
+                            time_max,
+                            token if token is not None else request_user,
+                        ),
+                    ),
+                )
+            )
+
+    results = {}
+    for chunk, future in futures:
+        try:
+            results.update(future.result())
+        except Exception as e:
+            results.update(failed_chunk(chunk, e))
+    return results
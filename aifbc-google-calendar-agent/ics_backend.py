@@ -0,0 +1,520 @@
+"""
+Local iCalendar (.ics) backend that stands in for the Google Calendar service.
+
+ICS files are parsed as a stream of unfolded lines, VEVENTs are converted to
+Calendar API-shaped event resources (recurring series expanded with their
+RRULE/EXDATE/RECURRENCE-ID within a horizon), and the events are indexed by
+start time. `IcsCalendarService` answers `events().list(...)` and
+`freebusy().query(...)` from that index, so every route works offline against
+the dummy calendars or large synthetic files. Listings with
+singleEvents=False get series masters carrying their recurrence lines instead,
+as Google returns them.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+import httplib2
+import pytz
+from dateutil.rrule import rrulestr
+from googleapiclient.errors import HttpError
+
+from calendar_fetch import MAX_PAGE_SIZE
+from event_store import is_busy
+from freebusy import merge_intervals, parse_api_time
+from recurrence import Series
+from tz_convert import format_iso, format_local, local_to_epoch, utc_offset
+
+# Recurring series are expanded between now - PAST_DAYS and now + FUTURE_DAYS.
+EXPAND_PAST_DAYS = int(os.getenv("ICS_EXPAND_PAST_DAYS", "365"))
+EXPAND_FUTURE_DAYS = int(os.getenv("ICS_EXPAND_FUTURE_DAYS", "365"))
+# Hard cap on occurrences generated for a single series.
+MAX_OCCURRENCES = int(os.getenv("ICS_MAX_OCCURRENCES", "10000"))
+
+DUMMY_CALENDARS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "aifbc-frontend",
+    "src",
+    "dummy-calendars",
+)
+
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_TEXT_ESCAPES = re.compile(r"\\([\\;,nN])")
+# Properties a series master lists in its `recurrence` field
+_RECURRENCE_PROPERTIES = ("RRULE", "EXRULE", "RDATE", "EXDATE")
+
+
+def unfold_lines(stream):
+    """Yield logical content lines, joining RFC 5545 folded continuations."""
+    current = None
+    for raw in stream:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_property(line: str):
+    """Split a content line into (name, params, value)."""
+    head, _, value = line.partition(":")
+    name, *raw_params = head.split(";")
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def unescape_text(value: str) -> str:
+    return _TEXT_ESCAPES.sub(
+        lambda match: "\n" if match.group(1) in "nN" else match.group(1), value
+    )
+
+
+def iter_vevents(stream):
+    """Yield each VEVENT as a dict of property name -> [(params, value), ...].
+
+    Nested components (VALARM) are skipped, and only one VEVENT is held in
+    memory at a time.
+    """
+    event = None
+    depth = 0
+    for line in unfold_lines(stream):
+        if line == "BEGIN:VEVENT":
+            event, depth = {}, 0
+        elif event is None:
+            continue
+        elif line.startswith("BEGIN:"):
+            depth += 1
+        elif line.startswith("END:"):
+            if line == "END:VEVENT" and depth == 0:
+                yield event
+                event = None
+            else:
+                depth -= 1
+        elif depth == 0:
+            name, params, value = parse_property(line)
+            event.setdefault(name, []).append((params, value))
+
+
+def parse_ics_time(value: str, params: dict, default_tz="UTC"):
+    """Parse a DATE or DATE-TIME value into (epoch, timezone name, all_day).
+
+    All-day dates come back as midnight UTC, which names the date rather
+    than the instant it starts at; load_ics places them in the calendar's
+    timezone. Wall-clock times are resolved through the cached transition tables rather
+    than localizing a datetime per value.
+    """
+    day = date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    midnight = (day.toordinal() - _EPOCH_ORDINAL) * 86400
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return midnight, None, True
+    local = (
+        midnight
+        + int(value[9:11]) * 3600
+        + int(value[11:13]) * 60
+        + int(value[13:15])
+    )
+    if value.endswith("Z"):
+        return local, "UTC", False
+    tz_name = params.get("TZID", default_tz)
+    try:
+        return local_to_epoch(tz_name, local), tz_name, False
+    except pytz.UnknownTimeZoneError:
+        # Non-Olson TZIDs (e.g. Windows zone names) fall back to the default.
+        return local_to_epoch(default_tz, local), default_tz, False
+
+
+def _local_seconds(epoch: int, tz_name) -> int:
+    return epoch if tz_name is None else epoch + utc_offset(tz_name, epoch)
+
+
+def _time_resource(epoch, tz_name, all_day):
+    if all_day:
+        return {"date": format_local(epoch)[:10]}
+    offset = utc_offset(tz_name, epoch)
+    resource = {"dateTime": format_iso(epoch + offset, offset)}
+    if tz_name != "UTC":
+        resource["timeZone"] = tz_name
+    return resource
+
+
+def _text(vevent, name, default=""):
+    """Get the value of a property's first occurrence."""
+    values = vevent.get(name)
+    return values[0][1] if values else default
+
+
+def _instance_suffix(epoch: int, all_day: bool) -> str:
+    """Instance ID suffix in Google's style: UTC start, or the date."""
+    compact = format_local(epoch).replace("-", "").replace(":", "")
+    return compact[:8] if all_day else compact.replace(" ", "T") + "Z"
+
+
+def _base_event(vevent, uid):
+    status = _text(vevent, "STATUS", "CONFIRMED").lower()
+    return {
+        "id": uid,
+        "iCalUID": uid,
+        "status": "cancelled" if status == "cancelled" else "confirmed",
+        "summary": unescape_text(_text(vevent, "SUMMARY", "No title")),
+        "description": unescape_text(_text(vevent, "DESCRIPTION")),
+        "location": unescape_text(_text(vevent, "LOCATION")),
+        "transparency": _text(vevent, "TRANSP", "OPAQUE").lower(),
+    }
+
+
+def _expand_rrule(rrule_value, start, tz_name, all_day, horizon_end):
+    """Yield occurrence start epochs of a series, up to horizon_end.
+
+    The rule is evaluated in the series' own wall-clock time, so a 09:00
+    meeting stays at 09:00 across DST changes.
+    """
+    naive_start = _NAIVE_EPOCH + timedelta(seconds=_local_seconds(start, tz_name))
+    parts = []
+    for part in rrule_value.split(";"):
+        key, _, value = part.partition("=")
+        if key.upper() == "UNTIL" and value.endswith("Z") and not all_day:
+            # dateutil wants UNTIL to match DTSTART's naivety; express it in
+            # the series' local time.
+            until, _, _ = parse_ics_time(value, {})
+            value = format_local(_local_seconds(until, tz_name))
+            value = value.replace("-", "").replace(":", "").replace(" ", "T")
+        parts.append(f"{key}={value}")
+    rule = rrulestr(";".join(parts), dtstart=naive_start)
+
+    for occurrence in islice(rule, MAX_OCCURRENCES):
+        local = (occurrence - _NAIVE_EPOCH) // timedelta(seconds=1)
+        epoch = local if all_day else local_to_epoch(tz_name, local)
+        if epoch > horizon_end:
+            return
+        yield epoch
+
+
+def vevent_to_events(vevent, horizon_start, horizon_end, overrides):
+    """Convert one parsed VEVENT into (start_epoch, end_epoch, event) entries.
+
+    Events are shaped like Calendar API event resources. Recurring series
+    produce one instance per occurrence within the horizon (epoch seconds);
+    instances replaced by a RECURRENCE-ID override or removed by EXDATE are
+    skipped.
+    """
+    uid = _text(vevent, "UID") or f"ics-{id(vevent)}"
+    start_params, start_value = vevent["DTSTART"][0]
+    start, tz_name, all_day = parse_ics_time(start_value, start_params)
+    if "DTEND" in vevent:
+        end_params, end_value = vevent["DTEND"][0]
+        end, _, _ = parse_ics_time(end_value, end_params, tz_name or "UTC")
+    else:
+        end = start + 86400 if all_day else start
+    duration = end - start
+    base = _base_event(vevent, uid)
+
+    if "RRULE" not in vevent:
+        event = dict(
+            base,
+            start=_time_resource(start, tz_name, all_day),
+            end=_time_resource(end, tz_name, all_day),
+        )
+        return [(start, end, event)]
+
+    excluded = set()
+    for params, value in vevent.get("EXDATE", []):
+        for item in value.split(","):
+            excluded.add(parse_ics_time(item, params, tz_name or "UTC")[0])
+
+    events = []
+    rrule_value = vevent["RRULE"][0][1]
+    for epoch in _expand_rrule(rrule_value, start, tz_name, all_day, horizon_end):
+        if epoch in excluded or (uid, epoch) in overrides:
+            continue
+        end_epoch = epoch + duration
+        if end_epoch <= horizon_start:
+            continue
+        event = dict(
+            base,
+            id=f"{uid}_{_instance_suffix(epoch, all_day)}",
+            recurringEventId=uid,
+            start=_time_resource(epoch, tz_name, all_day),
+            end=_time_resource(end_epoch, tz_name, all_day),
+        )
+        events.append((epoch, end_epoch, event))
+    return events
+
+
+def series_master(vevent):
+    """Convert a recurring VEVENT into (start, end, master) for listings with
+    singleEvents=False.
+
+    The master keeps the series' first start and end and its RRULE, EXRULE,
+    RDATE and EXDATE lines; it is indexed until its last occurrence ends.
+    """
+    single = {
+        name: values
+        for name, values in vevent.items()
+        if name not in _RECURRENCE_PROPERTIES
+    }
+    [(start, _, event)] = vevent_to_events(single, 0, 0, {})
+    event["recurrence"] = [
+        ";".join([name, *(f"{key}={value}" for key, value in params.items())])
+        + f":{value}"
+        for name in _RECURRENCE_PROPERTIES
+        for params, value in vevent.get(name, [])
+    ]
+    return start, int(Series(event).span_end().timestamp()), event
+
+
+class EventIndex:
+    """Events of one calendar sorted by start epoch for range lookups."""
+
+    def __init__(self, entries):
+        keyed = sorted(entries, key=lambda entry: (entry[0], entry[1]))
+        self.starts = [entry[0] for entry in keyed]
+        self.ends = [entry[1] for entry in keyed]
+        self.events = [entry[2] for entry in keyed]
+        self.max_duration = max(
+            (end - start for start, end in zip(self.starts, self.ends)), default=0
+        )
+
+    def __len__(self):
+        return len(self.events)
+
+    def query(self, time_min=None, time_max=None):
+        """Return (start, end, event) entries overlapping [time_min, time_max)."""
+        lo = 0
+        if time_min is not None:
+            lo = bisect_left(self.starts, time_min - self.max_duration)
+        hi = len(self.starts) if time_max is None else bisect_left(self.starts, time_max)
+        return [
+            (self.starts[i], self.ends[i], self.events[i])
+            for i in range(lo, hi)
+            if time_min is None or self.ends[i] > time_min
+        ]
+
+
+def _calendar_timezone(entries):
+    """The timezone of a calendar's timed events, taken as the calendar's own."""
+    for _, _, event in entries:
+        if "timeZone" in event["start"]:
+            return event["start"]["timeZone"]
+    return "UTC"
+
+
+def _place_all_day(entries, tz_name):
+    """Move all-day entries from midnight UTC to midnight in tz_name, where
+    Google's range queries compare them too."""
+    if tz_name == "UTC":
+        return entries
+    return [
+        (local_to_epoch(tz_name, start), local_to_epoch(tz_name, end), event)
+        if "date" in event["start"]
+        else (start, end, event)
+        for start, end, event in entries
+    ]
+
+
+def load_ics(path, horizon_start=None, horizon_end=None, series=False):
+    """Parse an ICS file into an EventIndex.
+
+    Recurring series are expanded into instances, or with `series` kept as
+    masters plus one item per moved or cancelled occurrence (carrying its
+    originalStartTime), like Google's singleEvents=False listings.
+    """
+    now = datetime.now(pytz.utc)
+    horizon_start = int(
+        (horizon_start or now - timedelta(days=EXPAND_PAST_DAYS)).timestamp()
+    )
+    horizon_end = int((horizon_end or now + timedelta(days=EXPAND_FUTURE_DAYS)).timestamp())
+
+    masters, entries, overrides = [], [], {}
+    with open(path, encoding="utf-8") as stream:
+        for vevent in iter_vevents(stream):
+            if "DTSTART" not in vevent:
+                continue
+            if "RECURRENCE-ID" in vevent:
+                params, value = vevent["RECURRENCE-ID"][0]
+                recurrence_id, tz_name, all_day = parse_ics_time(value, params)
+                uid = _text(vevent, "UID")
+                overrides[(uid, recurrence_id)] = (
+                    _instance_suffix(recurrence_id, all_day),
+                    _time_resource(recurrence_id, tz_name, all_day),
+                    vevent,
+                )
+            elif "RRULE" in vevent:
+                masters.append(vevent)
+            else:
+                entries.extend(vevent_to_events(vevent, 0, horizon_end, overrides))
+
+    # Series are expanded once every override in the file is known.
+    for vevent in masters:
+        if series:
+            entries.append(series_master(vevent))
+        else:
+            entries.extend(vevent_to_events(vevent, horizon_start, horizon_end, overrides))
+    for (uid, _), (suffix, original_start, vevent) in overrides.items():
+        for start, end, event in vevent_to_events(vevent, 0, horizon_end, {}):
+            event["id"] = f"{uid}_{suffix}"
+            event["recurringEventId"] = uid
+            if series:
+                event["originalStartTime"] = original_start
+            entries.append((start, end, event))
+
+    entries = _place_all_day(entries, _calendar_timezone(entries))
+    # Cancelled occurrences stay listed with their series, as on Google.
+    return EventIndex(
+        entry
+        for entry in entries
+        if entry[2]["status"] != "cancelled" or "originalStartTime" in entry[2]
+    )
+
+
+class _Request:
+    def __init__(self, handler):
+        self._handler = handler
+
+    def execute(self, **kwargs):
+        return self._handler()
+
+
+class _Events:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, calendarId, **params):
+        return _Request(lambda: self._service._list(calendarId, params))
+
+
+class _FreeBusy:
+    def __init__(self, service):
+        self._service = service
+
+    def query(self, body):
+        return _Request(lambda: self._service._freebusy(body))
+
+
+class IcsCalendarService:
+    """Calendar service look-alike serving events from local ICS files.
+
+    `paths` maps calendar IDs to ICS files. Files are re-parsed when their
+    modification time changes; a sync token issued before the change then
+    fails with 410 Gone, exactly like an expired Google sync token. Expanded
+    and series listings are indexed separately, on first use.
+    """
+
+    def __init__(self, paths):
+        self.paths = dict(paths)
+        self._lock = threading.Lock()
+        # (calendar id, series) -> (mtime_ns, EventIndex)
+        self._indexes = {}
+
+    def events(self):
+        return _Events(self)
+
+    def freebusy(self):
+        return _FreeBusy(self)
+
+    def _index(self, calendar_id, series=False):
+        path = self.paths.get(calendar_id)
+        if path is None:
+            raise HttpError(httplib2.Response({"status": 404}), b"Not Found")
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._indexes.get((calendar_id, series))
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, load_ics(path, series=series))
+                self._indexes[(calendar_id, series)] = cached
+            return cached
+
+    def _list(self, calendar_id, params):
+        # Google lists series masters unless singleEvents is set
+        mtime, index = self._index(calendar_id, series=not params.get("singleEvents"))
+        sync_token = f"ics-{mtime}"
+        if params.get("syncToken"):
+            if params["syncToken"] != sync_token:
+                raise HttpError(httplib2.Response({"status": 410}), b"Gone")
+            return {"items": [], "nextSyncToken": sync_token}
+
+        time_min = params.get("timeMin")
+        time_max = params.get("timeMax")
+        entries = index.query(
+            int(parse_api_time(time_min).timestamp()) if time_min else None,
+            int(parse_api_time(time_max).timestamp()) if time_max else None,
+        )
+        page_size = min(params.get("maxResults") or 250, MAX_PAGE_SIZE)
+        offset = int(params.get("pageToken") or 0)
+        result = {"items": [entry[2] for entry in entries[offset : offset + page_size]]}
+        if offset + page_size < len(entries):
+            result["nextPageToken"] = str(offset + page_size)
+        else:
+            result["nextSyncToken"] = sync_token
+        return result
+
+    def _freebusy(self, body):
+        time_min = parse_api_time(body["timeMin"])
+        time_max = parse_api_time(body["timeMax"])
+        calendars = {}
+        for item in body["items"]:
+            if item["id"] not in self.paths:
+                calendars[item["id"]] = {
+                    "busy": [],
+                    "errors": [{"domain": "global", "reason": "notFound"}],
+                }
+                continue
+            _, index = self._index(item["id"])
+            lower, upper = int(time_min.timestamp()), int(time_max.timestamp())
+            busy = merge_intervals(
+                (max(start, lower), min(end, upper))
+                for start, end, event in index.query(lower, upper)
+                if is_busy(event)
+            )
+            calendars[item["id"]] = {
+                "busy": [
+                    {
+                        "start": datetime.fromtimestamp(start, pytz.utc).isoformat(),
+                        "end": datetime.fromtimestamp(end, pytz.utc).isoformat(),
+                    }
+                    for start, end in busy
+                ]
+            }
+        return {"calendars": calendars}
+
+
+def ics_paths_from_env():
+    """Read calendar ID -> file mappings from ICS_CALENDARS.
+
+    ICS_CALENDARS is a comma-separated list of `id=path` entries or bare
+    paths (named after the file). The first entry also serves as "primary".
+    Without it, the frontend's dummy calendars are used.
+    """
+    spec = os.getenv("ICS_CALENDARS", "")
+    entries = [entry.strip() for entry in spec.split(",") if entry.strip()]
+    if not entries:
+        directory = os.path.normpath(DUMMY_CALENDARS_DIR)
+        entries = [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".ics")
+        ]
+        # Keep the busiest persona first so it becomes "primary".
+        entries.sort(key=lambda path: "corporate_executive" not in path)
+
+    paths = {}
+    for entry in entries:
+        calendar_id, sep, path = entry.partition("=")
+        if not sep:
+            path = calendar_id
+            calendar_id = os.path.splitext(os.path.basename(path))[0]
+        paths.setdefault("primary", path)
+        paths[calendar_id] = path
+    return paths
@@ -0,0 +1,305 @@
+"""
+Latency histograms and request profiling for the hot paths.
+
+`stage(name)` times a block (getting the service, fetching events, timezone
+formatting, prompt building, Gemini...) into a per-stage histogram; requests,
+response sizes, upstream calls and prompt sizes get histograms of their own.
+Everything is exported in the Prometheus text format by `render_prometheus`,
+alongside the JSON counters the other modules already keep.
+
+With INSTRUMENTATION_ENABLED=false, `stage()` hands back one shared no-op
+context manager and the observe functions return immediately; see
+benchmarks/bench_instrumentation.py for the measured cost of both modes.
+
+With PROFILE_REQUESTS=true, a request carrying `X-Profile: 1` is run under
+cProfile and answered with a summary of the slowest calls in an `X-Profile`
+header. The full report goes to the debug log, or with PROFILE_DIR set, to a
+pstats file there that the response names in `X-Profile-File`.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+from bisect import bisect_left
+
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "true").lower() == "true"
+# Honor the X-Profile request header (it exposes code paths, so opt in).
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+# Functions listed in a profile summary.
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "15"))
+# Directory to save each profile in (pstats format); unset logs the report.
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_PREFIX = "aifbc"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed buckets, keyed by label values."""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = f"{METRIC_PREFIX}_{name}"
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            }
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else _number(bound)
+                labels = _labels(self.label_names, label_values, [("le", le)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self):
+        """Return {"label,values": {"count", "sum"}} per series."""
+        with self._lock:
+            return {
+                ",".join(str(value) for value in key)
+                or "all": {
+                    "count": count,
+                    "sum": round(total, 6),
+                }
+                for key, (_, total, count) in self._series.items()
+            }
+
+
+stage_seconds = Histogram(
+    "stage_duration_seconds",
+    "Time spent per processing stage.",
+    LATENCY_BUCKETS,
+    ("stage",),
+)
+request_seconds = Histogram(
+    "request_duration_seconds",
+    "Request latency per route and status, including streamed bodies.",
+    LATENCY_BUCKETS,
+    ("route", "status"),
+)
+response_bytes = Histogram(
+    "response_size_bytes",
+    "Size of non-streamed response bodies.",
+    SIZE_BUCKETS,
+    ("route",),
+)
+upstream_seconds = Histogram(
+    "upstream_duration_seconds",
+    "Latency of each upstream request attempt, by outcome.",
+    LATENCY_BUCKETS,
+    ("upstream", "outcome"),
+)
+prompt_tokens = Histogram(
+    "prompt_tokens", "Gemini prompt size in tokens.", TOKEN_BUCKETS, ("source",)
+)
+prompt_chars = Histogram(
+    "prompt_chars", "Gemini prompt size in characters.", SIZE_BUCKETS
+)
+
+HISTOGRAMS = (
+    stage_seconds,
+    request_seconds,
+    response_bytes,
+    upstream_seconds,
+    prompt_tokens,
+    prompt_chars,
+)
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        stage_seconds.observe(time.perf_counter() - self.started, self.name)
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name):
+    """Context manager timing a block into the stage histogram."""
+    if not INSTRUMENTATION_ENABLED:
+        return _NOOP_STAGE
+    return _Stage(name)
+
+
+def observe_stage(name, seconds):
+    """Record a stage timed by hand (e.g. across a generator's yields)."""
+    if INSTRUMENTATION_ENABLED:
+        stage_seconds.observe(seconds, name)
+
+
+def observe_request(route, status, seconds, size=None):
+    if not INSTRUMENTATION_ENABLED:
+        return
+    request_seconds.observe(seconds, route, str(status))
+    if size is not None:
+        response_bytes.observe(size, route)
+
+
+def observe_upstream(upstream, outcome, seconds):
+    if INSTRUMENTATION_ENABLED:
+        upstream_seconds.observe(seconds, upstream, outcome)
+
+
+def observe_prompt(chars, estimated_tokens, measured_tokens=None):
+    if not INSTRUMENTATION_ENABLED:
+        return
+    prompt_chars.observe(chars)
+    prompt_tokens.observe(estimated_tokens, "estimated")
+    if measured_tokens is not None:
+        prompt_tokens.observe(measured_tokens, "measured")
+
+
+def snapshot():
+    """Return counts and sums of every histogram series, for JSON output."""
+    return {
+        "enabled": INSTRUMENTATION_ENABLED,
+        **{
+            histogram.name[len(METRIC_PREFIX) + 1 :]: histogram.snapshot()
+            for histogram in HISTOGRAMS
+        },
+    }
+
+
+def _flatten(prefix, value, lines):
+    """Export numeric leaves of nested counter dicts as untyped samples."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}", item, lines)
+    elif isinstance(value, bool):
+        lines.append(f"{prefix} {int(value)}")
+    elif isinstance(value, (int, float)):
+        lines.append(f"{prefix} {_number(value)}")
+
+
+def render_prometheus(counters=None):
+    """Render the histograms, plus nested JSON counters, in Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    _flatten(METRIC_PREFIX, counters or {}, lines)
+    return "\n".join(lines) + "\n"
+
+
+def wants_profile(headers):
+    return PROFILE_REQUESTS and headers.get("X-Profile") in ("1", "true")
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def profile_summary(profiler, top=PROFILE_TOP):
+    """Stop profiling; return (one-line header summary, full pstats text)."""
+    profiler.disable()
+    stats = pstats.Stats(profiler).sort_stats("cumulative")
+    entries = []
+    for (filename, line, function), (_, calls, _, cumulative, _) in sorted(
+        stats.stats.items(), key=lambda item: item[1][3], reverse=True
+    )[:top]:
+        location = f"{os.path.basename(filename)}:{line}" if line else filename
+        entries.append(f"{cumulative * 1000:.1f}ms {calls}x {function} ({location})")
+
+    text = io.StringIO()
+    stats.stream = text
+    stats.print_stats(top * 2)
+    return " | ".join(entries), text.getvalue()
+
+
+_profile_numbers = itertools.count(1)
+
+
+def save_profile(profiler, method, path, directory=PROFILE_DIR):
+    """Save a stopped profile to `directory`; return the file name."""
+    route = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_profile_numbers)}-{method}-{route}.prof"
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, name))
+    return name
@@ -0,0 +1,329 @@
+"""
+Deterministic answers to the commonest calendar questions.
+
+"What's next?", "am I free tomorrow at 3pm?", "how many meetings today?" and
+"what do I have on Friday?" need no language model: they are recognized by
+pattern and answered from the event cache or free/busy in milliseconds.
+Patterns match the whole question, so anything more specific ("what's next
+for the Q3 review?") still goes to Gemini. Questions and answers are
+counted, so the share of AI traffic this saves shows on /metrics.
+"""
+import os
+import re
+import threading
+from datetime import datetime, time, timedelta
+from typing import NamedTuple, Optional
+
+import pytz
+
+from calendar_core import (
+    event_store,
+    fetch_busy_periods,
+    fetch_upcoming_events,
+    iter_normalized_events,
+)
+from instrumentation import stage
+from prompt_builder import question_window
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+
+# Events listed in an answer before the rest are only counted
+MAX_LISTED_EVENTS = 10
+# Longest period (days) counted or listed without asking Gemini
+MAX_PERIOD_DAYS = 31
+# Slot length checked by "am I free at 3pm?" when no duration is given
+DEFAULT_SLOT_MINUTES = 30
+
+_lock = threading.Lock()
+stats = {
+    "questions": 0,
+    "answered": 0,
+    "fallbacks": 0,
+    "next_event": 0,
+    "free_at": 0,
+    "count_events": 0,
+    "agenda": 0,
+}
+
+
+def _count(*keys):
+    with _lock:
+        for key in keys:
+            stats[key] += 1
+
+
+def snapshot():
+    """Return question/answer counters and the share answered without Gemini."""
+    with _lock:
+        result = dict(stats)
+    result["hit_rate"] = (
+        round(result["answered"] / result["questions"], 4) if result["questions"] else 0.0
+    )
+    return result
+
+
+class RoutedAnswer(NamedTuple):
+    """A question answered without the model."""
+
+    intent: str
+    answer: str
+    # Raw Calendar API events the answer is about
+    events: list
+
+
+_WEEKDAY = r"(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+# Periods question_window understands; "next monday" is left to Gemini
+_WHEN = (
+    r"(?:today|tonight|tomorrow|yesterday|this week|next week|last week|"
+    r"(?:this |next )?weekend|this month|(?:on |this )?" + _WEEKDAY + r"|"
+    r"(?:in|over|for) the (?:next|coming) \d{1,3} days)"
+)
+_TIME = r"(?:\d{1,2}(?::\d{2})? ?(?:am|pm)?|noon|midday)"
+_DURATION = r"(?:an? hour|half an hour|\d{1,3} ?(?:hours?|hrs?|minutes?|mins?))"
+_EVENTS = r"(?:meetings|events|appointments|calls|things)"
+_CALENDAR = r"(?:on )?(?:my |the )?(?:calendar|schedule|agenda)"
+
+_NEXT = re.compile(
+    r"(?:(?:whats|what is|what do i have|whats coming|what is coming) (?:up )?next"
+    r"|(?:whats|what is) coming up(?: next)?"
+    r"|(?:whats|what is|when is|where is) (?:my |the )?next"
+    r" (?:meeting|event|appointment|call|thing))"
+    r"(?: " + _CALENDAR + r")?"
+)
+_FREE = re.compile(
+    r"(?:am i|will i be|are we) (?P<state>free|available|busy|booked)"
+    r"(?: (?P<day>" + _WHEN + r"))?"
+    r" at (?P<time>" + _TIME + r")"
+    r"(?: (?P<day2>" + _WHEN + r"))?"
+    r"(?: for (?P<duration>" + _DURATION + r"))?"
+)
+_HOW_MANY = re.compile(
+    r"how many " + _EVENTS + r"(?: do i have| have i got| have i had| did i have"
+    r"| are there| will i have| am i in)?(?: " + _CALENDAR + r")? (?P<when>" + _WHEN + r")"
+)
+_AGENDA = re.compile(
+    r"(?:what do i have|what have i got|whats on|what is on"
+    r"|(?:whats|what is|show|show me|list) (?:on )?(?:my |the )?(?:calendar|schedule|agenda)"
+    r"(?: like)?)"
+    r"(?: for)? (?P<when>" + _WHEN + r")"
+)
+
+
+def normalize(question: str) -> str:
+    """Lowercase a question and drop apostrophes, punctuation and extra spaces."""
+    text = question.lower().replace("’", "'").replace("'", "")
+    text = re.sub(r"[?!.,]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"^(?:hey|hi|ok|okay|please|so)\b ?", "", text)
+
+
+def parse_clock(value: str) -> Optional[time]:
+    """Parse "3pm", "15:30" or "noon"; a bare 1-7 is read as afternoon."""
+    if value in ("noon", "midday"):
+        return time(12, 0)
+    match = re.fullmatch(r"(\d{1,2})(?::(\d{2}))? ?(am|pm)?", value)
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    elif 1 <= hour <= 7:
+        hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def parse_duration(value: Optional[str]) -> int:
+    """Minutes in "an hour", "half an hour", "90 minutes", "2 hours"."""
+    if not value:
+        return DEFAULT_SLOT_MINUTES
+    if value.startswith("half"):
+        return 30
+    if value.startswith("a"):
+        return 60
+    amount = int(re.match(r"\d+", value).group())
+    return amount * 60 if value.rstrip("s").endswith(("hour", "hr")) else amount
+
+
+def _day_label(day, today) -> str:
+    if day == today:
+        return "today"
+    if day == today + timedelta(days=1):
+        return "tomorrow"
+    if day == today - timedelta(days=1):
+        return "yesterday"
+    return f"on {day.strftime('%a %Y-%m-%d')}"
+
+
+def _period_label(first, last, today) -> str:
+    if first == last:
+        return _day_label(first, today)
+    return f"from {first.strftime('%a %Y-%m-%d')} to {last.strftime('%a %Y-%m-%d')}"
+
+
+def _period_range(first, last, target_tz):
+    """UTC [start, end) covering local days first..last."""
+    start = target_tz.localize(datetime.combine(first, time.min))
+    end = target_tz.localize(datetime.combine(last + timedelta(days=1), time.min))
+    return start.astimezone(pytz.utc), end.astimezone(pytz.utc)
+
+
+def _event_line(event, multi_day) -> str:
+    if event.all_day:
+        when = "all day"
+    elif event.end[:10] != event.start[:10]:
+        when = f"{event.start[11:16]} to {event.end[:10]} {event.end[11:16]}"
+    else:
+        when = f"{event.start[11:16]}-{event.end[11:16]}"
+    if multi_day:
+        when = f"{event.start[:10]} {when}"
+    line = f"- {when} {event.summary}"
+    return f"{line} ({event.location})" if event.location else line
+
+
+def _event_list(events, multi_day) -> str:
+    lines = [_event_line(event, multi_day) for event in events[:MAX_LISTED_EVENTS]]
+    if len(events) > MAX_LISTED_EVENTS:
+        lines.append(f"...and {len(events) - MAX_LISTED_EVENTS} more")
+    return "\n".join(lines)
+
+
+def _window(when, today):
+    """(first, last) local days for a matched period, or None if too long."""
+    window = question_window(when, today) if when else (today, today)
+    if window is None or (window[1] - window[0]).days >= MAX_PERIOD_DAYS:
+        return None
+    return window
+
+
+def answer_next_event(service, now, timezone_str, calendar_id):
+    raw_events = fetch_upcoming_events(service, MAX_LISTED_EVENTS, calendar_id, timezone_str)
+    epoch = now.timestamp()
+    pairs = [
+        (raw, event)
+        for raw, event in zip(raw_events, iter_normalized_events(raw_events, timezone_str))
+        if not event.error
+    ]
+    current = [
+        event
+        for _, event in pairs
+        if not event.all_day and event.start_epoch <= epoch < event.end_epoch
+    ]
+    # All-day events start on their local date, not at an instant
+    today = now.date().isoformat()
+    upcoming = [
+        (raw, event)
+        for raw, event in pairs
+        if (event.start[:10] > today if event.all_day else event.start_epoch > epoch)
+    ]
+    if not upcoming and len(raw_events) == MAX_LISTED_EVENTS:
+        # All still running; what comes after them is past what was read
+        return None
+    # A day's timed events before its all-day ones, which "next" rarely means
+    upcoming.sort(key=lambda pair: (pair[1].start[:10], pair[1].all_day))
+    parts = [f'You are in "{event.summary}" until {event.end[11:16]}.' for event in current]
+    if upcoming:
+        raw, event = upcoming[0]
+        day = datetime.strptime(event.start[:10], "%Y-%m-%d").date()
+        when = "all day" if event.all_day else (
+            f"from {event.start[11:16]} to {event.end[11:16]}"
+        )
+        text = f'Your next event is "{event.summary}" {_day_label(day, now.date())} {when}'
+        parts.append(f"{text} at {event.location}." if event.location else f"{text}.")
+        return RoutedAnswer("next_event", " ".join(parts), [raw])
+    parts.append("You have nothing else coming up.")
+    return RoutedAnswer("next_event", " ".join(parts), [])
+
+
+def answer_free_at(service, match, now, target_tz, calendar_id):
+    clock = parse_clock(match.group("time"))
+    window = _window(match.group("day") or match.group("day2"), now.date())
+    if clock is None or window is None or window[0] != window[1]:
+        return None
+    day = window[0]
+    minutes = parse_duration(match.group("duration"))
+    start = target_tz.localize(datetime.combine(day, clock))
+    end = start + timedelta(minutes=minutes)
+    busy = [
+        (max(busy_start, start), min(busy_end, end))
+        for busy_start, busy_end in fetch_busy_periods(
+            service,
+            start.astimezone(pytz.utc),
+            end.astimezone(pytz.utc),
+            calendar_id,
+            target_tz.zone,
+        )
+        if busy_start < end and busy_end > start
+    ]
+    slot = f"{_day_label(day, now.date())} from {start:%H:%M} to {end:%H:%M}"
+    asked_free = match.group("state") in ("free", "available")
+    if not busy:
+        reply = "Yes" if asked_free else "No"
+        return RoutedAnswer("free_at", f"{reply}, you are free {slot}.", [])
+    reply = "No" if asked_free else "Yes"
+    busy_seconds = sum((busy_end - busy_start).total_seconds() for busy_start, busy_end in busy)
+    if busy_seconds >= minutes * 60:
+        return RoutedAnswer("free_at", f"{reply}, you are busy {slot}.", [])
+    periods = ", ".join(
+        f"{busy_start.astimezone(target_tz):%H:%M}-{busy_end.astimezone(target_tz):%H:%M}"
+        for busy_start, busy_end in busy
+    )
+    return RoutedAnswer("free_at", f"{reply}, you are busy for part of {slot} ({periods}).", [])
+
+
+def answer_period(intent, service, when, now, timezone_str, target_tz, calendar_id):
+    window = _window(when, now.date())
+    if window is None:
+        return None
+    first, last = window
+    start, end = _period_range(first, last, target_tz)
+    with stage("fetch_events"):
+        raw_events = event_store.get_events(service, calendar_id, start, end, timezone_str)
+    events = list(iter_normalized_events(raw_events, timezone_str))
+    label = _period_label(first, last, now.date())
+    multi_day = first != last
+    if intent == "count_events":
+        noun = "event" if len(events) == 1 else "events"
+        answer = f"You have {len(events)} {noun} {label}"
+        answer += f":\n{_event_list(events, multi_day)}" if events else "."
+    elif events:
+        answer = f"Your calendar {label}:\n{_event_list(events, multi_day)}"
+    else:
+        answer = f"You have nothing scheduled {label}."
+    return RoutedAnswer(intent, answer, raw_events)
+
+
+def answer_question(service, text, now, timezone_str, calendar_id):
+    """Answer a normalized question, or return None if it is not a simple one."""
+    target_tz = pytz.timezone(timezone_str)
+    if _NEXT.fullmatch(text):
+        return answer_next_event(service, now, timezone_str, calendar_id)
+    match = _FREE.fullmatch(text)
+    if match is not None:
+        return answer_free_at(service, match, now, target_tz, calendar_id)
+    for intent, pattern in (("count_events", _HOW_MANY), ("agenda", _AGENDA)):
+        match = pattern.fullmatch(text)
+        if match is not None:
+            return answer_period(
+                intent, service, match.group("when"), now, timezone_str, target_tz, calendar_id
+            )
+    return None
+
+
+def route_question(service, question, timezone_str="Asia/Bangkok", calendar_id="primary"):
+    """Answer a question without Gemini when it is a recognized simple one.
+
+    Returns a RoutedAnswer, or None for questions that need the model.
+    """
+    if not INTENT_ROUTER_ENABLED:
+        return None
+    _count("questions")
+    now = datetime.now(pytz.timezone(timezone_str))
+    with stage("intent_router"):
+        routed = answer_question(service, normalize(question), now, timezone_str, calendar_id)
+    if routed is None:
+        _count("fallbacks")
+    else:
+        _count("answered", routed.intent)
+    return routed
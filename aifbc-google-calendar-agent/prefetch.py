@@ -0,0 +1,228 @@
+"""
+Background prefetch of recently active calendars.
+
+Routes report the calendar and timezone they served through `touch()`. A
+daemon thread then keeps those targets warm: every interval (with jitter, so
+refreshes of many targets don't line up against the API quota) it syncs the
+event cache window covering today and the next PREFETCH_DAYS days and
+pre-computes the daily summary, so the next /today, /freebusy or /ai-query
+is a cache hit instead of a cold fetch. Failures back off exponentially, and
+targets nobody has asked about for PREFETCH_ACTIVE_SECONDS are dropped.
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from calendar_core import daily_summary, event_store
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_INTERVAL_SECONDS = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "300"))
+# Each refresh is scheduled up to this fraction of the interval early or late.
+PREFETCH_JITTER = float(os.getenv("PREFETCH_JITTER", "0.1"))
+# Matches the window /ai-query reads, so it lands in the same cache window.
+PREFETCH_DAYS = int(os.getenv("PREFETCH_DAYS", "30"))
+PREFETCH_ACTIVE_SECONDS = float(os.getenv("PREFETCH_ACTIVE_SECONDS", "3600"))
+PREFETCH_MAX_BACKOFF_SECONDS = float(os.getenv("PREFETCH_MAX_BACKOFF_SECONDS", "3600"))
+
+
+def _iso(epoch):
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(epoch, pytz.utc).isoformat()
+
+
+class PrefetchTarget:
+    """Refresh state of one (calendar, timezone) pair."""
+
+    def __init__(self, calendar_id, timezone_str, next_run):
+        self.calendar_id = calendar_id
+        self.timezone = timezone_str
+        self.last_active = time.time()
+        self.next_run = next_run
+        self.last_refresh = None
+        self.last_success = None
+        self.last_duration = None
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.summary = None
+
+    def snapshot(self, now):
+        return {
+            "calendar_id": self.calendar_id,
+            "timezone": self.timezone,
+            "last_active": _iso(self.last_active),
+            "last_refresh": _iso(self.last_refresh),
+            "last_success": _iso(self.last_success),
+            "lag_seconds": (
+                round(now - self.last_success, 1) if self.last_success else None
+            ),
+            "next_run": _iso(self.next_run),
+            "last_duration_ms": (
+                round(self.last_duration * 1000, 1)
+                if self.last_duration is not None
+                else None
+            ),
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class PrefetchScheduler:
+    """Keeps the event cache and daily summaries of active targets warm."""
+
+    def __init__(
+        self,
+        get_service,
+        interval=PREFETCH_INTERVAL_SECONDS,
+        jitter=PREFETCH_JITTER,
+        days=PREFETCH_DAYS,
+        active_seconds=PREFETCH_ACTIVE_SECONDS,
+        max_backoff=PREFETCH_MAX_BACKOFF_SECONDS,
+        enabled=PREFETCH_ENABLED,
+    ):
+        self.get_service = get_service
+        self.interval = interval
+        self.jitter = jitter
+        self.days = days
+        self.active_seconds = active_seconds
+        self.max_backoff = max_backoff
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # (calendar_id, timezone) -> PrefetchTarget
+        self._targets = {}
+
+    def _delay(self, failures=0):
+        """Seconds until the next run: the interval with jitter, doubled per failure."""
+        base = min(self.interval * (2**failures), max(self.max_backoff, self.interval))
+        return base * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def touch(self, timezone_str="Asia/Bangkok", calendar_id="primary"):
+        """Record that a request was served for a calendar in a timezone."""
+        if not self.enabled:
+            return
+        key = (calendar_id, timezone_str)
+        with self._lock:
+            target = self._targets.get(key)
+            if target is None:
+                # The request being served just fetched; refresh a period later.
+                target = PrefetchTarget(
+                    calendar_id, timezone_str, time.time() + self._delay()
+                )
+                self._targets[key] = target
+            target.last_active = time.time()
+        self.start()
+
+    def start(self):
+        """Start the background thread if it isn't running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="calendar-prefetch", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_due()
+            with self._lock:
+                next_runs = [target.next_run for target in self._targets.values()]
+            wait = min(next_runs, default=time.time() + self.interval) - time.time()
+            self._wake.wait(max(1.0, min(wait, self.interval)))
+            self._wake.clear()
+
+    def run_due(self):
+        """Refresh every target that is due; drop targets that went idle."""
+        now = time.time()
+        with self._lock:
+            for key, target in list(self._targets.items()):
+                if now - target.last_active > self.active_seconds:
+                    del self._targets[key]
+            due = [
+                target for target in self._targets.values() if target.next_run <= now
+            ]
+        for target in due:
+            self.refresh(target)
+
+    def refresh(self, target):
+        """Warm one target's events and summary, rescheduling it afterwards."""
+        started = time.time()
+        retry_after = None
+        try:
+            service = self.get_service()
+            time_min = datetime.now(pytz.utc)
+            event_store.get_events(
+                service,
+                target.calendar_id,
+                time_min,
+                time_min + timedelta(days=self.days),
+                target.timezone,
+            )
+            summary = daily_summary(service, target.timezone, target.calendar_id)
+            with self._lock:
+                target.summary = summary
+                target.last_success = time.time()
+                target.consecutive_failures = 0
+                target.last_error = None
+        except Exception as e:
+            print(f"Prefetch failed for {target.calendar_id} ({target.timezone}): {e}")
+            with self._lock:
+                target.failures += 1
+                target.consecutive_failures += 1
+                target.last_error = str(e)
+            # Don't come back before a throttling upstream asked us to
+            retry_after = getattr(e, "retry_after", None)
+        finally:
+            delay = self._delay(target.consecutive_failures)
+            with self._lock:
+                target.runs += 1
+                target.last_refresh = started
+                target.last_duration = time.time() - started
+                target.next_run = time.time() + max(delay, retry_after or 0)
+
+    def summary(self, timezone_str="Asia/Bangkok", calendar_id="primary"):
+        """Get the pre-computed daily summary, or None if it is missing or stale."""
+        with self._lock:
+            target = self._targets.get((calendar_id, timezone_str))
+            summary = target.summary if target is not None else None
+        if summary is None:
+            return None
+        today = datetime.now(pytz.timezone(timezone_str)).date().isoformat()
+        return summary if summary["date"] == today else None
+
+    def store_summary(self, summary, calendar_id="primary"):
+        """Keep a summary computed on demand for the target it belongs to."""
+        with self._lock:
+            target = self._targets.get((calendar_id, summary["timezone"]))
+            if target is not None:
+                target.summary = summary
+
+    def snapshot(self):
+        """Return scheduler settings and per-target refresh state."""
+        now = time.time()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "interval_seconds": self.interval,
+                "jitter": self.jitter,
+                "days": self.days,
+                "active_seconds": self.active_seconds,
+                "targets": [target.snapshot(now) for target in self._targets.values()],
+            }
@@ -0,0 +1,284 @@
+"""
+Compact, token-budgeted calendar prompts for Gemini.
+
+Events are rendered one per line instead of as indented JSON, empty fields
+are dropped and long descriptions truncated. When the question names a time
+scope ("today", "next week", "on Friday", "last quarter", ...) only events in
+that window are included, and rows stop being added once the token budget is
+reached. Occurrences of a cached recurring series (see recurrence.py) that
+share a time of day are collapsed into one row describing the series.
+"""
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+import pytz
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+PROMPT_MAX_DESCRIPTION_CHARS = int(os.getenv("PROMPT_MAX_DESCRIPTION_CHARS", "120"))
+# Rough characters-per-token ratio used for budgeting before the model's own
+# count is known.
+CHARS_PER_TOKEN = 4
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_NEXT_DAYS = re.compile(r"\b(?:next|coming)\s+(\d{1,3})\s+days?\b")
+_PAST_PERIOD = re.compile(r"\b(?:last|past|previous)\s+(\d{1,3})\s+(day|week|month)s?\b")
+_PERIOD_DAYS = {"day": 1, "week": 7, "month": 30}
+
+
+class PromptStats(NamedTuple):
+    """What went into a prompt."""
+
+    events_total: int
+    events_included: int
+    estimated_tokens: int
+    window: str
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used to enforce the budget."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _month_start(day: date, months_back: int = 0) -> date:
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def past_window(text: str, today: date):
+    """Infer a past date range ("yesterday", "last quarter", ...) or None."""
+    if "yesterday" in text:
+        day = today - timedelta(days=1)
+        return day, day
+    match = _PAST_PERIOD.search(text)
+    if match:
+        days = int(match.group(1)) * _PERIOD_DAYS[match.group(2)]
+        return today - timedelta(days=days), today - timedelta(days=1)
+    if re.search(r"\b(?:last|previous) week\b", text):
+        monday = today - timedelta(days=today.weekday() + 7)
+        return monday, monday + timedelta(days=6)
+    if re.search(r"\b(?:last|previous) month\b", text):
+        return _month_start(today, 1), _month_start(today) - timedelta(days=1)
+    if re.search(r"\b(?:last|previous) quarter\b", text):
+        current = _month_start(today, (today.month - 1) % 3)
+        return _month_start(current, 3), current - timedelta(days=1)
+    if re.search(r"\b(?:last|previous) year\b", text):
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    for index, name in enumerate(WEEKDAYS):
+        if re.search(rf"\blast {name}\b", text):
+            day = today - timedelta(days=(today.weekday() - index - 1) % 7 + 1)
+            return day, day
+    return None
+
+
+def question_window(question: str, today: date):
+    """Infer the date range a question is about.
+
+    Returns (first_day, last_day) inclusive, or None when the question has no
+    recognizable time scope.
+    """
+    text = question.lower()
+    window = past_window(text, today)
+    if window:
+        return window
+    if "tomorrow" in text:
+        day = today + timedelta(days=1)
+        return day, day
+    if "today" in text or "tonight" in text:
+        return today, today
+    if "weekend" in text:
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if "next weekend" in text:
+            saturday += timedelta(days=7)
+        return saturday, saturday + timedelta(days=1)
+    if "next week" in text:
+        monday = today + timedelta(days=7 - today.weekday())
+        return monday, monday + timedelta(days=6)
+    if "this week" in text or "my week" in text:
+        return today, today + timedelta(days=6 - today.weekday())
+    match = _NEXT_DAYS.search(text)
+    if match:
+        return today, today + timedelta(days=int(match.group(1)) - 1)
+    for index, name in enumerate(WEEKDAYS):
+        if re.search(rf"\b{name}\b", text):
+            day = today + timedelta(days=(index - today.weekday()) % 7)
+            return day, day
+    if "this month" in text:
+        next_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return today, next_month - timedelta(days=1)
+    return None
+
+
+def _event_details(event: dict) -> str:
+    row = f" | {event.get('summary') or 'No title'}"
+    if event.get("location"):
+        row += f" @ {event['location']}"
+    description = " ".join((event.get("description") or "").split())
+    if description:
+        if len(description) > PROMPT_MAX_DESCRIPTION_CHARS:
+            description = description[: PROMPT_MAX_DESCRIPTION_CHARS - 1] + "…"
+        row += f" | {description}"
+    return row
+
+
+def format_event_row(event: dict) -> str:
+    """Render one formatted event as a single compact line."""
+    start = event["start"]
+    end = event["end"]
+    if event.get("all_day"):
+        row = f"{start} all-day"
+        if end and end > start:
+            # All-day end dates are exclusive
+            last = date.fromisoformat(end[:10]) - timedelta(days=1)
+            if last.isoformat() != start[:10]:
+                row = f"{start}..{last.isoformat()} all-day"
+    else:
+        row = f"{start[:16]}-{end[11:16] if end[:10] == start[:10] else end[:16]}"
+    return row + _event_details(event)
+
+
+def _series_key(event: dict):
+    """Key grouping the occurrences of a series that can share one row."""
+    recurrence = event.get("recurrence")
+    if not recurrence:
+        return None
+    start, end = event["start"], event["end"] or event["start"]
+    if event.get("all_day"):
+        if date.fromisoformat(end[:10]) - date.fromisoformat(start[:10]) > timedelta(days=1):
+            return None
+    elif end[:10] != start[:10]:
+        return None
+    return (
+        recurrence["series_id"],
+        event.get("summary"),
+        event.get("location"),
+        event.get("description"),
+        start[11:16],
+        end[11:16],
+        bool(event.get("all_day")),
+    )
+
+
+def format_series_row(occurrences) -> str:
+    """Render the occurrences of one series as a single compact line."""
+    first, last = occurrences[0], occurrences[-1]
+    if first.get("all_day"):
+        times = "all-day"
+    else:
+        times = f"{first['start'][11:16]}-{first['end'][11:16]}"
+    row = f"{first['start'][:10]}..{last['start'][:10]} {times}" + _event_details(first)
+    recurrence = first["recurrence"]
+    row += f" | repeats {recurrence['rule']} ({len(occurrences)} times)"
+    exceptions = [
+        day
+        for day in recurrence.get("except", ())
+        if first["start"][:10] <= day <= last["start"][:10]
+    ]
+    if exceptions:
+        row += f", except {', '.join(exceptions)}"
+    return row
+
+
+def _group_series(events):
+    """Split events into rows: lists of one event, or of a series' occurrences."""
+    groups = {}
+    rows = []
+    for event in events:
+        key = _series_key(event)
+        if key is None:
+            rows.append([event])
+            continue
+        if key not in groups:
+            groups[key] = []
+            rows.append(groups[key])
+        groups[key].append(event)
+    return rows
+
+
+def build_calendar_prompt(
+    calendar_data,
+    question: str,
+    timezone_str: str = "Asia/Bangkok",
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+    now: Optional[datetime] = None,
+    retrieval=None,
+):
+    """Build the Gemini prompt for a calendar question.
+
+    `retrieval` (an event_index.Retrieval) says calendar_data holds only the
+    events matching the question. Returns (prompt, PromptStats).
+    """
+    now = now or datetime.now(pytz.timezone(timezone_str))
+    today = now.date()
+
+    window = question_window(question, today)
+    if retrieval is not None:
+        events = list(calendar_data)
+        scope = (
+            f"from {retrieval.first} to {retrieval.last} that match the question "
+            f"({len(events)} of {retrieval.considered}; the others are unrelated "
+            "and left out)"
+        )
+    elif window:
+        first, last = window[0].isoformat(), window[1].isoformat()
+        events = [
+            event
+            for event in calendar_data
+            if event["start"][:10] <= last and (event["end"] or event["start"])[:10] >= first
+        ]
+        scope = f"from {first} to {last}"
+    else:
+        events = list(calendar_data)
+        if events:
+            days = [event["start"][:10] for event in events]
+            scope = f"from {min(days)} to {max(days)}"
+        else:
+            scope = "in the upcoming period"
+
+    grouped = _group_series(events)
+    header = f"""You are a helpful AI assistant that analyzes Google Calendar data.
+The user's timezone is {timezone_str}. Today is {now.strftime('%A %Y-%m-%d %H:%M')}.
+Events {scope} (all times in {timezone_str}), one per line as
+"start-end | title @ location | description":
+"""
+    if len(grouped) < len(events):
+        header += """Repeating events are one line per series, as
+"first..last start-end | title @ location | description | repeats <rule> (<n> times), except <dates>":
+"""
+    footer = f"""
+User Question: {question}
+
+Please provide a helpful analysis based on the calendar data above. Be concise and actionable.
+All times mentioned should be in the user's timezone ({timezone_str}).
+"""
+
+    used = estimate_tokens(header) + estimate_tokens(footer)
+    rows = []
+    included = 0
+    for members in grouped:
+        if len(members) > 1:
+            row = format_series_row(members)
+        else:
+            row = format_event_row(members[0])
+        cost = estimate_tokens(row) + 1
+        if used + cost > token_budget:
+            break
+        rows.append(row)
+        included += len(members)
+        used += cost
+
+    omitted = len(events) - included
+    if omitted:
+        rows.append(f"... {omitted} more events omitted to fit the prompt budget")
+    if not rows:
+        rows.append("(no events)")
+
+    prompt = header + "\n".join(rows) + "\n" + footer
+    stats = PromptStats(
+        events_total=len(calendar_data) if retrieval is None else retrieval.considered,
+        events_included=len(events) - omitted,
+        estimated_tokens=estimate_tokens(prompt),
+        window=scope,
+    )
+    return prompt, stats
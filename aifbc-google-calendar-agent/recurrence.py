@@ -0,0 +1,333 @@
+"""
+Recurring event series, stored once and expanded on demand.
+
+With EVENT_CACHE_SERIES=true the event cache lists events with
+singleEvents=False: a daily standup then arrives as one master event carrying
+its RRULE/EXDATE/RDATE lines (plus one item per moved or cancelled
+occurrence) instead of one event per day. A `Series` generates the
+occurrences of just the range a lookup asks for, shaped like the instances
+Google returns, so everything downstream of the cache is unchanged. Each
+generated instance keeps the series' recurrence lines, with its moved and
+cancelled occurrences as EXDATEs, so prompts can describe the whole series
+in one line ("weekdays, except 2026-10-24") via `describe_recurrence`.
+"""
+import os
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+import pytz
+from dateutil.rrule import rruleset, rrulestr
+
+SERIES_MODE = os.getenv("EVENT_CACHE_SERIES", "false").lower() == "true"
+# Occurrences considered per series when expanding or finding its end
+MAX_OCCURRENCES = int(os.getenv("SERIES_MAX_OCCURRENCES", "10000"))
+# Stored end of series that never end
+FOREVER = pytz.utc.localize(datetime(9999, 12, 31))
+
+WEEKDAY_CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ORDINALS = {1: "first", 2: "second", 3: "third", 4: "fourth", 5: "fifth", -1: "last"}
+
+
+def _timezone(name):
+    try:
+        return pytz.timezone(name or "UTC")
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
+
+def _parse_line(line):
+    """Split "EXDATE;TZID=Asia/Bangkok:2026..." into (name, params, value)."""
+    head, _, value = line.partition(":")
+    name, *pairs = head.split(";")
+    params = dict(pair.partition("=")[::2] for pair in pairs)
+    return name.upper(), params, value
+
+
+def _rule_parts(value):
+    return dict(part.partition("=")[::2] for part in value.upper().split(";") if part)
+
+
+class Series:
+    """A recurring event's master resource and its compiled rules.
+
+    Rules are evaluated in the series' own wall-clock time, so a 09:00
+    meeting stays at 09:00 across DST changes. All-day series are kept by date
+    (anchored at midnight UTC, for IDs and exceptions) and their occurrences
+    placed in the timezone a lookup asks for.
+    """
+
+    __slots__ = (
+        "event",
+        "tz",
+        "all_day",
+        "local_start",
+        "duration",
+        "rules",
+        "bounded",
+        "_times",
+    )
+
+    def __init__(self, event):
+        self.event = event
+        start, end = event["start"], event["end"]
+        self.all_day = "dateTime" not in start
+        if self.all_day:
+            self.tz = pytz.utc
+            self.local_start = datetime.strptime(start["date"], "%Y-%m-%d")
+            self.duration = datetime.strptime(end["date"], "%Y-%m-%d") - self.local_start
+        else:
+            begin = datetime.fromisoformat(start["dateTime"].replace("Z", "+00:00"))
+            finish = datetime.fromisoformat(end["dateTime"].replace("Z", "+00:00"))
+            self.tz = _timezone(start.get("timeZone"))
+            self.local_start = begin.astimezone(self.tz).replace(tzinfo=None)
+            self.duration = finish - begin
+        self.rules = rruleset(cache=True)
+        self.bounded = True
+        # (wall-clock start, timezone of all-day dates) -> (anchor, start,
+        # end, start resource, end resource, id stamp) of the occurrences
+        # generated so far; timezone conversion is most of the cost of
+        # expanding a series
+        self._times = {}
+        for line in event.get("recurrence", []):
+            name, params, value = _parse_line(line)
+            if name in ("RRULE", "EXRULE"):
+                parts = _rule_parts(value)
+                if name == "RRULE" and "COUNT" not in parts and "UNTIL" not in parts:
+                    self.bounded = False
+                rule = rrulestr(self._local_rule(value), dtstart=self.local_start)
+                (self.rules.rrule if name == "RRULE" else self.rules.exrule)(rule)
+            elif name in ("RDATE", "EXDATE"):
+                add = self.rules.rdate if name == "RDATE" else self.rules.exdate
+                for item in value.split(","):
+                    add(self._local(item, params))
+        # The master's own start is always an occurrence
+        self.rules.rdate(self.local_start)
+
+    def _local(self, value, params=None):
+        """A DATE or DATE-TIME value as naive wall-clock time of the series."""
+        params = params or {}
+        if params.get("VALUE") == "DATE" or len(value) == 8:
+            day = datetime.strptime(value[:8], "%Y%m%d")
+            return datetime.combine(day.date(), self.local_start.time())
+        naive = datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+        if value.endswith("Z"):
+            moment = pytz.utc.localize(naive)
+        elif "TZID" in params:
+            moment = _timezone(params["TZID"]).localize(naive)
+        else:
+            return naive
+        return moment.astimezone(self.tz).replace(tzinfo=None)
+
+    def _local_rule(self, value):
+        # dateutil wants UNTIL to match DTSTART's naivety
+        parts = []
+        for part in value.split(";"):
+            key, _, item = part.partition("=")
+            if key.upper() == "UNTIL":
+                until = self._local(item)
+                if len(item) == 8:
+                    until = datetime.combine(until.date(), datetime.max.time())
+                item = until.strftime("%Y%m%dT%H%M%S")
+            parts.append(f"{key}={item}")
+        return ";".join(parts)
+
+    def _instant(self, local):
+        """Aware UTC start of an occurrence at naive wall-clock time `local`."""
+        return self.tz.localize(local).astimezone(pytz.utc)
+
+    def _naive(self, moment):
+        return moment.astimezone(self.tz).replace(tzinfo=None)
+
+    @property
+    def start(self):
+        return self._instant(self.local_start)
+
+    def span_end(self):
+        """End of the last occurrence, or FOREVER for open-ended series."""
+        if not self.bounded:
+            return FOREVER
+        last = None
+        for count, last in enumerate(islice(self.rules, MAX_OCCURRENCES + 1)):
+            if count == MAX_OCCURRENCES:
+                return FOREVER
+        return self._instant(last) + self.duration if last else self.start + self.duration
+
+    def _resource(self, moment):
+        if self.all_day:
+            return {"date": moment.strftime("%Y-%m-%d")}
+        return {"dateTime": moment.astimezone(self.tz).isoformat(), "timeZone": self.tz.zone}
+
+    def occurrences(self, time_min, time_max, replaced=None, timezone_str=None):
+        """Get (start, end, instance) for occurrences overlapping the range.
+
+        `replaced` holds the original starts of moved and cancelled
+        occurrences, which are left out and listed as EXDATEs on the
+        generated instances. All-day occurrences run from midnight to
+        midnight in timezone_str (UTC when not given).
+        """
+        replaced = replaced or ()
+        zone = timezone_str if self.all_day and timezone_str != "UTC" else None
+        # A date can start up to a day either side of its UTC anchor
+        margin = timedelta(days=1) if zone else timedelta(0)
+        lower = self._naive(time_min - self.duration - margin)
+        upper = self._naive(time_max + margin)
+        recurrence = list(self.event.get("recurrence", []))
+        stamp = "%Y%m%d" if self.all_day else "%Y%m%dT%H%M%SZ"
+        if replaced:
+            stamps = sorted(moment.strftime(stamp) for moment in replaced)
+            recurrence.append("EXDATE:" + ",".join(stamps))
+        base = {
+            key: value
+            for key, value in self.event.items()
+            if key not in ("id", "start", "end", "recurrence")
+        }
+        entries = []
+        for local in islice(self.rules.xafter(lower, inc=True), MAX_OCCURRENCES):
+            if local >= upper:
+                break
+            times = self._times.get((local, zone))
+            if times is None:
+                anchor = self._instant(local)
+                if zone:
+                    tz = _timezone(zone)
+                    start = tz.localize(local).astimezone(pytz.utc)
+                    end = tz.localize(local + self.duration).astimezone(pytz.utc)
+                else:
+                    start, end = anchor, anchor + self.duration
+                times = self._times[(local, zone)] = (
+                    anchor,
+                    start,
+                    end,
+                    self._resource(anchor),
+                    self._resource(anchor + self.duration),
+                    anchor.strftime(stamp),
+                )
+            anchor, start, end, start_resource, end_resource, start_stamp = times
+            if end <= time_min or start >= time_max or anchor in replaced:
+                continue
+            instance = dict(
+                base,
+                id=f"{self.event['id']}_{start_stamp}",
+                recurringEventId=self.event["id"],
+                originalStartTime=start_resource,
+                start=start_resource,
+                end=end_resource,
+                recurrence=recurrence,
+            )
+            entries.append((start, end, instance))
+        return entries
+
+
+def _weekday_list(codes):
+    return ", ".join(WEEKDAY_NAMES[WEEKDAY_CODES.index(code)][:3] for code in codes)
+
+
+def _shift_weekday(code, shift):
+    return WEEKDAY_CODES[(WEEKDAY_CODES.index(code) + shift) % 7]
+
+
+def describe_rule(value, first, shift=0):
+    """Describe an RRULE value in words; `first` is the first occurrence.
+
+    `first` is in the timezone the description is read in, and `shift` the
+    number of days that moved its date from the series' own timezone, so
+    BYDAY weekdays are named as they fall there.
+    """
+    parts = _rule_parts(value)
+    frequency = parts.get("FREQ")
+    interval = int(parts.get("INTERVAL", "1") or 1)
+    days = [
+        _shift_weekday(code[-2:], shift) for code in parts.get("BYDAY", "").split(",") if code
+    ]
+    if frequency in ("DAILY", "WEEKLY") and days:
+        if set(days) == set(WEEKDAY_CODES[:5]) and interval == 1:
+            text = "weekdays"
+        elif len(days) == 1:
+            name = WEEKDAY_NAMES[WEEKDAY_CODES.index(days[0])]
+            text = f"every {name}" if interval == 1 else f"every {interval} weeks on {name}"
+        else:
+            text = f"every {_weekday_list(days)}"
+            if interval > 1:
+                text = f"every {interval} weeks on {_weekday_list(days)}"
+    elif frequency == "DAILY":
+        text = "daily" if interval == 1 else f"every {interval} days"
+    elif frequency == "WEEKLY":
+        name = WEEKDAY_NAMES[first.weekday()]
+        text = f"every {name}" if interval == 1 else f"every {interval} weeks on {name}"
+    elif frequency == "MONTHLY":
+        text = "monthly" if interval == 1 else f"every {interval} months"
+        by_day = parts.get("BYDAY", "")
+        month_day = parts.get("BYMONTHDAY", str(first.day - shift))
+        if by_day and by_day[:-2].lstrip("+-").isdigit():
+            # "The second Tuesday" has no name a day later or earlier
+            if not shift:
+                position = int(by_day[:-2])
+                name = WEEKDAY_NAMES[WEEKDAY_CODES.index(by_day[-2:])]
+                text += f" on the {ORDINALS.get(position, position)} {name}"
+        elif not shift:
+            text += f" on day {month_day}"
+        elif month_day.isdigit() and 1 <= int(month_day) + shift <= 28:
+            text += f" on day {int(month_day) + shift}"
+    elif frequency == "YEARLY":
+        text = f"yearly on {first.strftime('%b')} {first.day}"
+    else:
+        return value
+    if "UNTIL" in parts:
+        until = parts["UNTIL"]
+        text += f" until {until[:4]}-{until[4:6]}-{until[6:8]}"
+    return text
+
+
+@lru_cache(maxsize=1024)
+def describe_recurrence(recurrence, first, timezone_str):
+    """Get (rule in words, exception dates) for an instance's recurrence lines.
+
+    `recurrence` is a tuple of RRULE/EXDATE/... lines and `first` an ISO
+    local start of the series; exception dates are ISO dates in timezone_str.
+    """
+    start = datetime.fromisoformat(first.replace("Z", "+00:00"))
+    target_tz = _timezone(timezone_str)
+    shift = 0
+    if start.tzinfo is not None:
+        # Name days as they fall where the description is read
+        local = start.astimezone(target_tz)
+        shift = (local.date() - start.date()).days
+        start = local
+    rules, exceptions = [], []
+    for line in recurrence:
+        name, params, value = _parse_line(line)
+        if name == "RRULE":
+            rules.append(describe_rule(value, start, shift))
+        elif name == "EXDATE":
+            for item in value.split(","):
+                if len(item) == 8 or params.get("VALUE") == "DATE":
+                    exceptions.append(f"{item[:4]}-{item[4:6]}-{item[6:8]}")
+                    continue
+                naive = datetime.strptime(item[:15], "%Y%m%dT%H%M%S")
+                if item.endswith("Z"):
+                    moment = pytz.utc.localize(naive)
+                else:
+                    tz = _timezone(params.get("TZID")) if "TZID" in params else None
+                    moment = tz.localize(naive) if tz else None
+                if moment is None:
+                    exceptions.append(naive.date().isoformat())
+                else:
+                    exceptions.append(moment.astimezone(target_tz).date().isoformat())
+    return " and ".join(rules) or "repeating", tuple(sorted(set(exceptions)))
+
+
+def instance_time(event):
+    """Aware UTC original start of a moved or cancelled occurrence."""
+    value = event["originalStartTime"]
+    if "dateTime" in value:
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")).astimezone(
+            pytz.utc
+        )
+    return pytz.utc.localize(datetime.strptime(value["date"], "%Y-%m-%d"))
+
+
+def is_series(event):
+    """Whether a resource is a recurring series' master event."""
+    return bool(event.get("recurrence")) and "recurringEventId" not in event
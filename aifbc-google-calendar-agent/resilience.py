@@ -0,0 +1,413 @@
+"""
+Retries, rate limiting and circuit breaking around upstream calls.
+
+Every request sent to Google Calendar or Gemini goes through
+`call_upstream(upstream, fn)`:
+
+- Failures are classified as QuotaError (429, rate-limit 403s), AuthError
+  (401, other 403s, failed token refreshes) or TransientError (5xx, timeouts,
+  dropped connections). Anything else (404, 410, bad requests) is the
+  caller's to handle and is raised unchanged.
+- Quota and transient failures are retried with exponential backoff and full
+  jitter, waiting at least as long as the upstream's Retry-After asks. A
+  Retry-After longer than RETRY_MAX_DELAY_SECONDS fails the call right away.
+- Token buckets per upstream, and per user of each upstream, pace calls
+  before they are sent, so bursts are smoothed here instead of being
+  throttled by Google. Calendar calls are only paced when
+  CALENDAR_RATE_PER_SECOND is set, and never for the local ICS backend.
+- A circuit breaker per upstream opens after repeated failures and fails
+  calls fast until a trial call succeeds; callers holding cached data (the
+  event store) serve it stale meanwhile.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+from instrumentation import observe_upstream
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+# Longest single wait between attempts.
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8"))
+# Longest a call waits for a rate limit token before failing as a quota error.
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "2"))
+# Share of an upstream's rate and burst a single user may use.
+USER_RATE_SHARE = float(os.getenv("USER_RATE_SHARE", "0.5"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# The ICS backend (CALENDAR_BACKEND=ics) reads local files, not Google.
+LOCAL_CALENDAR = os.getenv("CALENDAR_BACKEND", "google") == "ics"
+
+# Upstream -> (requests per second, burst); a rate of 0 disables the limit.
+# Google's Calendar quotas are per project and user, so calls are not paced
+# locally unless asked to be.
+RATE_LIMITS = {
+    "calendar": (
+        0.0 if LOCAL_CALENDAR else float(os.getenv("CALENDAR_RATE_PER_SECOND", "0")),
+        float(os.getenv("CALENDAR_RATE_BURST", "20")),
+    ),
+    "gemini": (
+        float(os.getenv("GEMINI_RATE_PER_SECOND", "1")),
+        float(os.getenv("GEMINI_RATE_BURST", "5")),
+    ),
+}
+
+# Most user buckets kept per upstream; the least recently used go first.
+MAX_USER_BUCKETS = 10000
+
+# 403 reasons the Calendar API uses for rate and quota limits.
+QUOTA_REASONS = {
+    "rateLimitExceeded",
+    "userRateLimitExceeded",
+    "quotaExceeded",
+    "dailyLimitExceeded",
+}
+
+# Who the current request is for; set by the server for each request.
+current_user = ContextVar("current_user", default=None)
+
+
+class UpstreamError(Exception):
+    """An upstream call failed in a way callers can report or act on."""
+
+    kind = "upstream"
+
+    def __init__(self, upstream, message, status=None, retry_after=None):
+        super().__init__(f"{upstream}: {message}")
+        self.upstream = upstream
+        self.status = status
+        self.retry_after = retry_after
+
+
+class QuotaError(UpstreamError):
+    """Rate or quota limit hit, upstream or by our own limiter."""
+
+    kind = "quota"
+
+
+class AuthError(UpstreamError):
+    """Credentials missing, expired, revoked or lacking permission."""
+
+    kind = "auth"
+
+
+class TransientError(UpstreamError):
+    """Server errors, timeouts and dropped connections."""
+
+    kind = "transient"
+
+
+class CircuitOpenError(TransientError):
+    """The upstream kept failing; calls are refused until it recovers."""
+
+    kind = "circuit_open"
+
+
+# Exceptions recognized by class name, so the Gemini SDK (google.api_core)
+# and google.auth don't have to be imported here.
+ERROR_TYPES_BY_NAME = {
+    "ResourceExhausted": QuotaError,
+    "TooManyRequests": QuotaError,
+    "Unauthenticated": AuthError,
+    "Unauthorized": AuthError,
+    "PermissionDenied": AuthError,
+    "Forbidden": AuthError,
+    "RefreshError": AuthError,
+    "InternalServerError": TransientError,
+    "BadGateway": TransientError,
+    "ServiceUnavailable": TransientError,
+    "GatewayTimeout": TransientError,
+    "DeadlineExceeded": TransientError,
+    "TransportError": TransientError,
+    "ServerNotFoundError": TransientError,
+}
+
+
+def _http_status(error):
+    resp = getattr(error, "resp", None)  # googleapiclient HttpError
+    if resp is not None:
+        return getattr(resp, "status", None)
+    code = getattr(error, "code", None)  # google.api_core exceptions
+    return code if isinstance(code, int) else None
+
+
+def _error_reasons(error):
+    try:
+        details = json.loads(getattr(error, "content", None))["error"]["errors"]
+        return {detail.get("reason") for detail in details}
+    except (TypeError, ValueError, KeyError, AttributeError):
+        return set()
+
+
+def _retry_after(error):
+    """Seconds from the error's Retry-After header, if it has one."""
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if hasattr(resp, "get") else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(upstream, error):
+    """Map an exception to an UpstreamError, or None if it isn't one."""
+    if isinstance(error, UpstreamError):
+        return error
+
+    status = _http_status(error)
+    error_type = ERROR_TYPES_BY_NAME.get(type(error).__name__)
+    if error_type is None and status is not None:
+        if status == 429:
+            error_type = QuotaError
+        elif status == 403:
+            error_type = (
+                QuotaError if _error_reasons(error) & QUOTA_REASONS else AuthError
+            )
+        elif status == 401:
+            error_type = AuthError
+        elif status >= 500:
+            error_type = TransientError
+    if error_type is None and isinstance(error, (TimeoutError, ConnectionError)):
+        error_type = TransientError
+    if error_type is None:
+        return None
+    return error_type(upstream, str(error), status, _retry_after(error))
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returning how long to wait before it is really available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def cancel(self):
+        """Give back a reserved token that won't be used."""
+        with self._lock:
+            self._tokens += 1
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one trial call through
+    once `reset_seconds` have passed, closing again if it succeeds."""
+
+    def __init__(self, upstream, threshold, reset_seconds):
+        self.upstream = upstream
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opens = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(
+                self.upstream,
+                "circuit open after repeated failures",
+                retry_after=max(remaining, 1.0),
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (
+                self.state == "closed" and self.failures >= self.threshold
+            ):
+                self.state = "open"
+                self.opens += 1
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class Upstream:
+    """Rate limits, retry policy and circuit breaker of one upstream API."""
+
+    def __init__(
+        self,
+        name,
+        rate,
+        burst,
+        user_share=USER_RATE_SHARE,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY_SECONDS,
+        max_delay=RETRY_MAX_DELAY_SECONDS,
+        max_wait=RATE_LIMIT_MAX_WAIT_SECONDS,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.user_share = user_share
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.breaker = CircuitBreaker(
+            name, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+        )
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._user_buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _user_bucket(self, user):
+        with self._lock:
+            bucket = self._user_buckets.get(user)
+            if bucket is None:
+                bucket = self._user_buckets[user] = TokenBucket(
+                    self.rate * self.user_share, self.burst * self.user_share
+                )
+                if len(self._user_buckets) > MAX_USER_BUCKETS:
+                    self._user_buckets.popitem(last=False)
+            self._user_buckets.move_to_end(user)
+            return bucket
+
+    def acquire(self, user=None):
+        """Wait for rate limit tokens, or raise QuotaError if the wait is too long."""
+        if self._bucket is None:
+            return
+        buckets = [self._bucket]
+        if user is not None:
+            buckets.append(self._user_bucket(user))
+        wait = max(bucket.reserve() for bucket in buckets)
+        if wait > self.max_wait:
+            for bucket in buckets:
+                bucket.cancel()
+            self._count("rate_limited")
+            raise QuotaError(self.name, "local rate limit exceeded", retry_after=wait)
+        if wait:
+            self._count("throttled")
+            time.sleep(wait)
+
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying after `attempt` failed, or None to give up."""
+        if isinstance(error, AuthError) or attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+        if error.retry_after is not None:
+            if error.retry_after > self.max_delay:
+                return None
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def call(self, fn, user=None):
+        """Run fn(), retrying quota and transient failures."""
+        self._count("calls")
+        self.acquire(user)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("short_circuited")
+            raise
+
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                error = classify(self.name, e)
+                observe_upstream(
+                    self.name,
+                    error.kind if error is not None else "error",
+                    time.perf_counter() - started,
+                )
+                if error is None or isinstance(error, AuthError):
+                    # The upstream answered; it just refused this request.
+                    self.breaker.record_success()
+                    if error is None:
+                        raise
+                    self._count(error.kind)
+                    raise error from e
+                self._count(error.kind)
+                delay = self.retry_delay(error, attempt)
+                if delay is None:
+                    self.breaker.record_failure()
+                    raise error from e
+                self._count("retries")
+                time.sleep(delay)
+                try:
+                    self.acquire(user)
+                except QuotaError:
+                    self.breaker.record_failure()
+                    raise
+                continue
+            observe_upstream(self.name, "ok", time.perf_counter() - started)
+            self.breaker.record_success()
+            return result
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["user_buckets"] = len(self._user_buckets)
+        stats["rate_per_second"] = self.rate
+        stats["circuit"] = self.breaker.state
+        stats["circuit_opens"] = self.breaker.opens
+        return stats
+
+
+upstreams = {name: Upstream(name, *limits) for name, limits in RATE_LIMITS.items()}
+
+
+def call_upstream(upstream, fn, user=None):
+    """Run fn() against an upstream ("calendar" or "gemini") with rate
+    limiting, retries and circuit breaking. `user` defaults to the current
+    request's user."""
+    if user is None:
+        user = current_user.get()
+    return upstreams[upstream].call(fn, user)
+
+
+def snapshot():
+    """Return per-upstream retry, rate limit and circuit breaker counters."""
+    return {name: upstream.snapshot() for name, upstream in upstreams.items()}
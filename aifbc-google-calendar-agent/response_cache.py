@@ -0,0 +1,140 @@
+"""
+Cache of Gemini answers for /ai-query.
+
+Entries are keyed on the normalized question, a content hash of the calendar
+data the answer was based on, the timezone and the local date. Any change to
+the events produces a new fingerprint, so stale answers are never served
+after a calendar edit; they simply age out. Entries live in an in-memory LRU
+with a TTL and can optionally be persisted to SQLite to survive restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+# Path of the SQLite file to persist entries in; empty keeps them in memory.
+AI_CACHE_DB = os.getenv("AI_CACHE_DB", "")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+# Only pleasantries are dropped: words like "can" or "you" change what a
+# question asks ("can you move my 3pm" is not "move my 3pm").
+_GREETINGS = {"please", "pls", "hey", "hi", "hello", "thanks"}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and greetings, collapse whitespace."""
+    words = _PUNCTUATION.sub(" ", question.lower()).split()
+    return " ".join(word for word in words if word not in _GREETINGS)
+
+
+def calendar_fingerprint(calendar_data) -> str:
+    """Content hash of the formatted events an answer is based on."""
+    payload = json.dumps(calendar_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_key(question, calendar_data, timezone_str, day) -> str:
+    parts = [
+        normalize_question(question),
+        calendar_fingerprint(calendar_data),
+        timezone_str,
+        str(day),
+    ]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """TTL/LRU cache of AI responses with optional SQLite persistence."""
+
+    def __init__(
+        self,
+        ttl=AI_CACHE_TTL_SECONDS,
+        max_entries=AI_CACHE_MAX_ENTRIES,
+        db_path=AI_CACHE_DB,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (created_at, response), in LRU order
+        self._entries = OrderedDict()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_responses ("
+                "key TEXT PRIMARY KEY, created_at REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.commit()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a fresh cached response, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created_at, response FROM ai_responses WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._entries[key] = entry
+                    self.stats["disk_hits"] += 1
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, response: str):
+        created_at = time.time()
+        with self._lock:
+            self._entries[key] = (created_at, response)
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ai_responses VALUES (?, ?, ?)",
+                    (key, created_at, response),
+                )
+                self._db.execute(
+                    "DELETE FROM ai_responses WHERE created_at < ?",
+                    (created_at - self.ttl,),
+                )
+                self._db.commit()
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                if self._db is not None:
+                    self._db.execute("DELETE FROM ai_responses WHERE key = ?", (evicted,))
+                    self._db.commit()
+                self.stats["evictions"] += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM ai_responses WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM ai_responses")
+                self._db.commit()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["persistent"] = self._db is not None
+            return stats
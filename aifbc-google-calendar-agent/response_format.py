@@ -0,0 +1,149 @@
+"""
+Response shaping for the event routes.
+
+- `fields=` projects formatted events down to the listed keys.
+- The columnar encoding sends an event list as parallel arrays, one per
+  field, instead of repeating every key in every event.
+- MessagePack is used instead of JSON when the client asks for it and the
+  optional `msgpack` package is installed.
+- Strong ETags are derived from the raw events a response is built from
+  plus everything else that shapes it, so an unchanged calendar is answered
+  with 304 before any event is converted or serialized.
+- Bodies are gzip-compressed for clients that accept it.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+# Every key a formatted event can carry (see calendar_core.Event.to_dict).
+EVENT_FIELDS = (
+    "summary",
+    "description",
+    "location",
+    "start",
+    "end",
+    "start_epoch",
+    "end_epoch",
+    "all_day",
+    "error",
+    "recurrence",
+)
+
+# Bodies smaller than this are sent uncompressed.
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+MSGPACK_MIMETYPE = "application/msgpack"
+# Representations that are compressed when the client accepts gzip.
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", MSGPACK_MIMETYPE}
+
+
+def parse_fields(value):
+    """Parse a `fields` parameter (comma-separated string or list).
+
+    Returns None for "all fields"; raises ValueError for unknown fields.
+    """
+    if not value:
+        return None
+    names = value.split(",") if isinstance(value, str) else list(value)
+    fields = [name.strip() for name in names if name.strip()]
+    unknown = [name for name in fields if name not in EVENT_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(unknown)} (known: {', '.join(EVENT_FIELDS)})"
+        )
+    return fields or None
+
+
+def project_events(events, fields):
+    """Keep only `fields` of each formatted event (all of them for None)."""
+    if fields is None:
+        return events
+    return [{name: event[name] for name in fields if name in event} for event in events]
+
+
+def to_columns(events, fields=None):
+    """Encode formatted events as {"count", "fields", "columns"} parallel arrays.
+
+    Keys missing from an event (e.g. "error") are null in its column.
+    """
+    fields = fields or [
+        name for name in EVENT_FIELDS if any(name in event for event in events)
+    ]
+    return {
+        "count": len(events),
+        "fields": fields,
+        "columns": {name: [event.get(name) for event in events] for name in fields},
+    }
+
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def encode_msgpack(payload) -> bytes:
+    import msgpack
+
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def event_set_etag(events, *variant) -> str:
+    """Strong ETag for a response built from raw Calendar API events.
+
+    Uses each event's own etag where the API provides one (the full resource
+    otherwise), plus `variant`: every other input that shapes the body, such
+    as the timezone, fields and encoding.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(variant, default=str).encode("utf-8"))
+    for event in events:
+        tag = event.get("etag")
+        if tag is None:
+            tag = json.dumps(event, sort_keys=True, separators=(",", ":"))
+        digest.update(b"\0")
+        digest.update(f"{event.get('id')}:{tag}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def gzip_etag(etag: str) -> str:
+    """ETag of the gzip-compressed representation of a body."""
+    return f"{etag}-gzip"
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Check an If-None-Match header against a body's ETag.
+
+    The compressed representation's tag matches too, since the decision
+    whether to compress is made afterwards from the same body.
+    """
+    if not if_none_match:
+        return False
+    candidates = {etag, gzip_etag(etag)}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') in candidates:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding) -> bool:
+    """Check an Accept-Encoding header for gzip with a non-zero q-value."""
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip() in ("gzip", "*"):
+            q = params.strip()
+            return not (q.startswith("q=") and float(q[2:] or 0) == 0)
+    return False
+
+
+def compress(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
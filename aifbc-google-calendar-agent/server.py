@@ -2,381 +2,844 @@
 """
 Flask server to expose Google Calendar functionality to Express server.
 """
-import os
-import sys
 import json
-from datetime import datetime, timedelta
-from typing import Optional
+import logging
+import math
+import time
+from datetime import datetime
 import pytz
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-import google.generativeai as genai
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
-# If modifying these scopes, delete the file token.json.
-SCOPES = [
-    "https://www.googleapis.com/auth/calendar.readonly",
-    "https://www.googleapis.com/auth/calendar.events.freebusy",
-]
+
+from calendar_core import (
+    CALENDAR_BACKEND,
+    answer_cache_key,
+    ask_gemini_about_calendar,
+    daily_summary,
+    event_store,
+    fetch_busy_periods,
+    fetch_dashboard,
+    fetch_today_events,
+    fetch_upcoming_events,
+    format_events,
+    get_question_data,
+    get_gemini_model,
+    get_service,
+    iter_formatted_events,
+    response_cache,
+    service_for_token,
+    service_holder,
+    stream_gemini_about_calendar,
+)
+from free_slots import find_free_slots, from_epoch, to_epoch
+from freebusy import merge_intervals, query_freebusy
+import calendar_batch
+import instrumentation
+import intent_router
+from instrumentation import (
+    PROMETHEUS_CONTENT_TYPE,
+    observe_request,
+    profile_summary,
+    render_prometheus,
+    save_profile,
+    stage,
+    start_profile,
+    wants_profile,
+)
+from prefetch import PrefetchScheduler
+import response_format
+from response_format import (
+    MSGPACK_MIMETYPE,
+    etag_matches,
+    event_set_etag,
+    parse_fields,
+    project_events,
+    to_columns,
+)
+from resilience import UpstreamError, current_user
+from resilience import snapshot as resilience_snapshot
+from single_flight import upstream_flight
+import user_credentials
+from user_credentials import open_pool
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+logger = logging.getLogger(__name__)
 
+# Keeps the calendars and timezones recent requests used warm in the background
+prefetch_scheduler = PrefetchScheduler(get_service)
 
-def get_credentials():
-    """Get valid user credentials from storage or user input."""
-    creds = None
-    # The file token.json stores the user's access and refresh tokens.
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+# Per-user credentials and Calendar clients, when USER_CREDENTIALS_DB is set
+user_clients = open_pool()
 
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            print(f"Starting OAuth server on http://localhost:8080")
-            creds = flow.run_local_server(port=8080)
+# A request handler must never block on a browser sign-in; a missing
+# token.json is reported as a 401 instead.
+service_holder.interactive = False
 
-        # Save the credentials for the next run
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
 
-    return creds
+def user_calendar():
+    """Get (Calendar service, primary calendar ID) for the request's user.
 
+    Requests naming a user (X-User-Id) are served with that user's stored
+    credentials when the credential store is enabled; all others with the
+    agent's own token.json and "primary".
+    """
+    user_id = current_user.get()
+    if user_clients is None or user_id is None or CALENDAR_BACKEND == "ics":
+        return get_service(), "primary"
+    with stage("get_service"):
+        return user_clients.get(user_id)
 
-def get_service():
-    """Get Google Calendar service using OAuth credentials."""
-    try:
-        creds = get_credentials()
-        service = build("calendar", "v3", credentials=creds)
-        return service
-    except FileNotFoundError:
-        raise Exception("credentials.json not found")
-    except Exception as e:
-        raise Exception(f"Error building service: {e}")
 
+def services_for(service):
+    """service_for_token, reading calendars without their own token through `service`."""
+    return lambda token: service if token is None else service_for_token(token)
 
-def get_gemini_model():
-    """Get Gemini AI model."""
-    gemini_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_key:
-        raise Exception("GEMINI_API_KEY not found in environment variables")
 
-    try:
-        genai.configure(api_key=gemini_key)
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        return model
-    except Exception as e:
-        raise Exception(f"Error configuring Gemini: {e}")
+def enter_upstream(upstream):
+    """Tell the serving layer the request is about to call `upstream`.
 
+    Under asgi_server.py this trades the request's concurrency slot for one
+    of that upstream's; served by Flask alone it does nothing.
+    """
+    enter = request.environ.get("aifbc.enter_upstream")
+    if enter is not None:
+        enter(upstream)
 
-def convert_to_timezone(date_str: str, timezone_str: str = "Asia/Bangkok") -> str:
-    """Convert a date string to the specified timezone."""
-    try:
-        # Parse the date string
-        if "T" in date_str:
-            # ISO format with time
-            dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-        else:
-            # Date only
-            dt = datetime.strptime(date_str, "%Y-%m-%d")
 
-        # Convert to target timezone
-        target_tz = pytz.timezone(timezone_str)
-        if dt.tzinfo is None:
-            # If no timezone info, assume UTC
-            dt = pytz.utc.localize(dt)
+def touch_prefetch(timezone_str, calendar_id):
+    """Record activity for the prefetch scheduler.
 
-        converted_dt = dt.astimezone(target_tz)
+    The scheduler reads with the agent's own credentials, so users'
+    calendars are only refreshed by their own requests.
+    """
+    if calendar_id == "primary":
+        prefetch_scheduler.touch(timezone_str)
 
-        # Format based on whether it's date-only or datetime
-        if "T" in date_str:
-            return converted_dt.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            return converted_dt.strftime("%Y-%m-%d")
-    except Exception as e:
-        print(f"Error converting timezone: {e}")
-        return date_str
 
+def format_busy_periods(busy, target_tz):
+    """Format (start, end) busy pairs in the target timezone."""
+    busy_periods = []
+    for start, end in busy:
+        # Convert to target timezone
+        start_converted = start.astimezone(target_tz)
+        end_converted = end.astimezone(target_tz)
+
+        busy_periods.append(
+            {
+                "start": start_converted.isoformat(),
+                "end": end_converted.isoformat(),
+                "start_formatted": start_converted.strftime("%Y-%m-%d %H:%M"),
+                "end_formatted": end_converted.strftime("%H:%M"),
+            }
+        )
+    return busy_periods
+
+
+def parse_date_range(data):
+    """Parse start_date/end_date (YYYY-MM-DD) in the request timezone to UTC."""
+    timezone_str = data.get("timezone", "Asia/Bangkok")
+    target_tz = pytz.timezone(timezone_str)
+    start_time = target_tz.localize(datetime.strptime(data["start_date"], "%Y-%m-%d"))
+    end_time = target_tz.localize(datetime.strptime(data["end_date"], "%Y-%m-%d"))
+    return start_time.astimezone(pytz.utc), end_time.astimezone(pytz.utc), target_tz
+
+
+# /free-slots numeric options: name -> (default, smallest value allowed)
+SLOT_OPTIONS = {
+    "duration_minutes": (30, 1),
+    "buffer_minutes": (0, 0),
+    "granularity_minutes": (15, 1),
+    "limit": (10, 0),
+}
+SLOT_RANKS = ("earliest", "roomiest")
+
+
+def parse_slot_options(data):
+    """Validate the /free-slots options; raises ValueError for bad ones."""
+    options = {}
+    for name, (default, minimum) in SLOT_OPTIONS.items():
+        value = data.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            raise ValueError(f"{name} must be an integer of at least {minimum}")
+        options[name] = value
+    rank = data.get("rank", "earliest")
+    if rank not in SLOT_RANKS:
+        raise ValueError(f"rank must be one of: {', '.join(SLOT_RANKS)}")
+    options["rank"] = rank
+    return options
+
+
+def parse_calendar_items(calendars):
+    """Normalize calendar IDs / {"id", "token"} objects to (id, token) pairs."""
+    return [
+        (item, None) if isinstance(item, str) else (item["id"], item.get("token"))
+        for item in calendars
+    ]
+
+
+def freebusy_payload(results, target_tz):
+    """Per-calendar busy periods, their union and the failed calendars."""
+    calendars = {}
+    for calendar_id, result in results.items():
+        busy_periods = format_busy_periods(result["busy"], target_tz)
+        calendars[calendar_id] = {
+            "busy_periods": busy_periods,
+            "is_busy": len(busy_periods) > 0,
+            "errors": result["errors"],
+        }
 
-def get_calendar_data(service, days=30, timezone_str="Asia/Bangkok"):
-    """Get calendar data for AI analysis."""
-    try:
-        # Get events for the next N days
-        now = datetime.utcnow().isoformat() + "Z"
-        end_date = (datetime.utcnow() + timedelta(days=days)).isoformat() + "Z"
-
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now,
-                timeMax=end_date,
-                singleEvents=True,
-                orderBy="startTime",
+    # Union of everyone's busy time, for finding a common free slot
+    combined = merge_intervals(
+        period for result in results.values() for period in result["busy"]
+    )
+    return {
+        "calendars": calendars,
+        "busy_periods": format_busy_periods(combined, target_tz),
+        "failed": sorted(
+            calendar_id for calendar_id, result in results.items() if result["errors"]
+        ),
+    }
+
+
+def ndjson_response(formatted_events):
+    """Stream formatted events as newline-delimited JSON, one event per line."""
+    lines = (json.dumps(event) + "\n" for event in formatted_events)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+def wants_msgpack() -> bool:
+    """Check whether the client asked for MessagePack and it can be produced."""
+    asked = request.args.get("format") == "msgpack" or (
+        request.accept_mimetypes.best == MSGPACK_MIMETYPE
+    )
+    return asked and response_format.msgpack_available()
+
+
+def event_list_response(events, timezone_str, fields, extra=None, variant=()):
+    """Respond with raw events, formatted as the query string asks.
+
+    `fields` (see parse_fields) projects each event and `format` picks the
+    encoding: "ndjson", "columns" for parallel arrays, "msgpack", or JSON by
+    default (msgpack is also chosen by `Accept: application/msgpack`, when
+    the msgpack package is installed). The ETag covers the raw
+    events and every input that shapes the body (`variant` holds the
+    route's own), so a matching If-None-Match gets a 304 before any event is
+    formatted.
+    """
+    encoding = request.args.get("format", "json")
+    if encoding not in ("ndjson", "columns"):
+        encoding = "json"
+    msgpack = encoding != "ndjson" and wants_msgpack()
+    etag = event_set_etag(events, timezone_str, fields, encoding, msgpack, *variant)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    formatted_events = iter_formatted_events(events, timezone_str)
+    if fields is not None:
+        formatted_events = (
+            {name: event[name] for name in fields if name in event}
+            for event in formatted_events
+        )
+    if encoding == "ndjson":
+        response = ndjson_response(formatted_events)
+    else:
+        with stage("format_events"):
+            formatted_events = list(formatted_events)
+        if encoding == "columns":
+            payload = {**to_columns(formatted_events, fields), **(extra or {})}
+        else:
+            payload = {"events": formatted_events, **(extra or {})}
+        if msgpack:
+            response = Response(
+                response_format.encode_msgpack(payload), mimetype=MSGPACK_MIMETYPE
+            )
+        else:
+            response = jsonify(payload)
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    # Clients may keep the body but must revalidate it before each use
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def sse_event(event, payload):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+# HTTP status for each kind of upstream failure; the rest are 503s.
+UPSTREAM_ERROR_STATUS = {"quota": 429, "auth": 401}
+
+
+def error_payload(e):
+    """Error body, saying which upstream failed and how for upstream errors."""
+    if not isinstance(e, UpstreamError):
+        return {"error": str(e)}
+    payload = {"error": str(e), "kind": e.kind, "upstream": e.upstream}
+    if e.retry_after is not None:
+        payload["retry_after"] = math.ceil(e.retry_after)
+    return payload
+
+
+def error_response(e):
+    """JSON error response: 429/401/503 with Retry-After for upstream failures."""
+    if not isinstance(e, UpstreamError):
+        return jsonify(error_payload(e)), 500
+    response = jsonify(error_payload(e))
+    response.status_code = UPSTREAM_ERROR_STATUS.get(e.kind, 503)
+    if e.retry_after is not None:
+        response.headers["Retry-After"] = str(math.ceil(e.retry_after))
+    return response
+
+
+UNTRUSTED_CALLER = {
+    "error": "X-User-Id and user credentials need X-Agent-Secret matching AGENT_SHARED_SECRET"
+}
+
+
+@app.before_request
+def identify_user():
+    """Rate limit upstream calls per user when the proxy says who that is.
+
+    Only the proxy that authenticated the user may name one (see
+    user_credentials.trusted_caller); anyone else naming a user is refused.
+    """
+    user_id = request.headers.get("X-User-Id")
+    if user_id is not None and not user_credentials.trusted_caller(request.headers):
+        return jsonify(UNTRUSTED_CALLER), 401
+    current_user.set(user_id)
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.profiler = start_profile() if wants_profile(request.headers) else None
+
+
+@app.after_request
+def finish_request_timing(response):
+    """Record latency once the body is sent, and attach any profile summary."""
+    if g.get("profiler") is not None:
+        # Run streamed bodies to completion inside the profile
+        response.direct_passthrough = False
+        response.get_data()
+        summary, report = profile_summary(g.profiler)
+        response.headers["X-Profile"] = summary
+        if instrumentation.PROFILE_DIR:
+            response.headers["X-Profile-File"] = save_profile(
+                g.profiler, request.method, request.path
+            )
+        else:
+            logger.debug("Profile of %s %s:\n%s", request.method, request.path, report)
+
+    started = g.get("request_started")
+    if started is not None and instrumentation.INSTRUMENTATION_ENABLED:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        size = None if response.is_streamed else response.calculate_content_length()
+        response.call_on_close(
+            lambda: observe_request(
+                route, response.status_code, time.perf_counter() - started, size
             )
-            .execute()
         )
-        events = events_result.get("items", [])
-
-        # Format events for AI analysis
-        formatted_events = []
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-
-            # Convert to target timezone
-            start_converted = convert_to_timezone(start, timezone_str)
-            end_converted = convert_to_timezone(end, timezone_str)
-
-            formatted_event = {
-                "summary": event.get("summary", "No title"),
-                "description": event.get("description", ""),
-                "location": event.get("location", ""),
-                "start": start_converted,
-                "end": end_converted,
-                "all_day": "T" not in start,
-            }
-            formatted_events.append(formatted_event)
-
-        return formatted_events
-    except HttpError as error:
-        raise Exception(f"Error fetching calendar data: {error}")
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Gzip JSON/NDJSON/MessagePack bodies for clients that accept it.
+
+    Registered after finish_request_timing so it runs first, and the
+    recorded response size is the compressed one. Streamed bodies are left
+    alone so their first chunks still go out as soon as they are ready.
+    """
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or response.mimetype not in response_format.COMPRESSIBLE_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < response_format.GZIP_MIN_BYTES or not response_format.accepts_gzip(
+        request.headers.get("Accept-Encoding")
+    ):
+        return response
+
+    response.set_data(response_format.compress(body))
+    response.headers["Content-Encoding"] = "gzip"
+    etag, weak = response.get_etag()
+    if etag:
+        # A different representation needs a different strong validator
+        response.set_etag(response_format.gzip_etag(etag), weak)
+    return response
 
 
-def ask_gemini_about_calendar(
-    model, calendar_data, question, timezone_str="Asia/Bangkok"
-):
-    """Ask Gemini AI about calendar data."""
+@app.route("/health", methods=["GET"])
+def health():
+    """Health check endpoint."""
+    return jsonify(
+        {
+            "status": "healthy",
+            "service": "google-calendar-agent",
+            "backend": CALENDAR_BACKEND,
+        }
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Expose service/credential, cache, upstream and prefetch counters.
+
+    `?format=prometheus` returns them with the latency, size and prompt
+    histograms in the Prometheus text format; JSON carries histogram counts
+    and sums under "latency".
+    """
+    counters = {
+        "calendar_service": service_holder.snapshot(),
+        "event_cache": event_store.snapshot(),
+        "ai_cache": response_cache.snapshot(),
+        "upstream_coalescing": upstream_flight.snapshot(),
+        "calendar_batch": calendar_batch.snapshot(),
+        "prefetch": prefetch_scheduler.snapshot(),
+        "upstreams": resilience_snapshot(),
+        "intent_router": intent_router.snapshot(),
+    }
+    if user_clients is not None:
+        counters["user_clients"] = user_clients.snapshot()
+    if request.args.get("format") == "prometheus":
+        return Response(render_prometheus(counters), content_type=PROMETHEUS_CONTENT_TYPE)
+    return jsonify({**counters, "latency": instrumentation.snapshot()})
+
+
+@app.route("/prefetch", methods=["GET"])
+def prefetch_state():
+    """Expose the background prefetch scheduler's per-target refresh state."""
+    return jsonify(prefetch_scheduler.snapshot())
+
+
+@app.route("/users/<user_id>/credentials", methods=["PUT"])
+def put_user_credentials(user_id):
+    """Store a user's Google credentials for requests sent with X-User-Id.
+
+    The body is authorized-user JSON (as Credentials.to_json() writes it,
+    with refresh_token, client_id and client_secret), optionally with the
+    user's "calendar_id"; without one it is looked up on first use. Like
+    DELETE, it needs the proxy's X-Agent-Secret.
+    """
+    if not user_credentials.trusted_caller(request.headers):
+        return jsonify(UNTRUSTED_CALLER), 401
+    if user_clients is None:
+        return jsonify({"error": "Per-user credentials are not enabled"}), 404
     try:
-        # Create context for Gemini
-        context = f"""
-You are a helpful AI assistant that analyzes Google Calendar data. 
-The user's timezone is {timezone_str}.
-Here is the user's calendar data for the next 7 days (all times in {timezone_str}):
-
-{json.dumps(calendar_data, indent=2)}
-
-User Question: {question}
-
-Please provide a helpful analysis based on the calendar data above. Be concise and actionable.
-All times mentioned should be in the user's timezone ({timezone_str}).
-"""
+        from google.oauth2.credentials import Credentials
 
-        response = model.generate_content(context)
-        return response.text
+        data = request.get_json()
+        calendar_id = data.pop("calendar_id", None)
+        try:
+            Credentials.from_authorized_user_info(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        user_clients.store.save(user_id, data, calendar_id)
+        user_clients.remove(user_id)
+        return jsonify({"user_id": user_id, "stored": True})
     except Exception as e:
-        raise Exception(f"Error asking Gemini: {e}")
+        return error_response(e)
 
 
-@app.route("/health", methods=["GET"])
-def health():
-    """Health check endpoint."""
-    return jsonify({"status": "healthy", "service": "google-calendar-agent"})
+@app.route("/users/<user_id>/credentials", methods=["DELETE"])
+def delete_user_credentials(user_id):
+    """Forget a user's stored credentials and pooled client."""
+    if not user_credentials.trusted_caller(request.headers):
+        return jsonify(UNTRUSTED_CALLER), 401
+    if user_clients is None:
+        return jsonify({"error": "Per-user credentials are not enabled"}), 404
+    try:
+        found = user_clients.store.delete(user_id)
+        user_clients.remove(user_id)
+        if not found:
+            return jsonify({"error": f"No credentials for user {user_id}"}), 404
+        return jsonify({"user_id": user_id, "deleted": True})
+    except Exception as e:
+        return error_response(e)
 
 
 @app.route("/events", methods=["GET"])
 def get_events():
-    """Get upcoming events."""
+    """Get upcoming events.
+
+    Takes `fields` and `format` and answers If-None-Match (see
+    event_list_response).
+    """
     try:
-        service = get_service()
+        service, calendar_id = user_calendar()
         max_results = request.args.get("max_results", 10, type=int)
         timezone_str = request.args.get("timezone", "Asia/Bangkok")
+        try:
+            fields = parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        touch_prefetch(timezone_str, calendar_id)
 
-        # Get events
-        now = datetime.utcnow().isoformat() + "Z"
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
-
-        # Format response
-        formatted_events = []
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-
-            # Convert to target timezone
-            start_converted = convert_to_timezone(start, timezone_str)
-            end_converted = convert_to_timezone(end, timezone_str)
-
-            formatted_event = {
-                "summary": event.get("summary", "No title"),
-                "description": event.get("description", ""),
-                "location": event.get("location", ""),
-                "start": start_converted,
-                "end": end_converted,
-                "all_day": "T" not in start,
-            }
-            formatted_events.append(formatted_event)
+        # Get events, from the cache when it holds enough of them
+        events = fetch_upcoming_events(service, max_results, calendar_id, timezone_str)
 
-        return jsonify({"events": formatted_events})
+        return event_list_response(events, timezone_str, fields, variant=(max_results,))
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/today", methods=["GET"])
 def get_today_events():
-    """Get today's events."""
+    """Get today's events.
+
+    Takes `fields` and `format` and answers If-None-Match (see
+    event_list_response).
+    """
     try:
-        service = get_service()
+        service, calendar_id = user_calendar()
         timezone_str = request.args.get("timezone", "Asia/Bangkok")
-
-        # Get today's date range in the target timezone
-        target_tz = pytz.timezone(timezone_str)
-        now = datetime.now(target_tz)
-        today = now.date()
-        start_of_day = target_tz.localize(datetime.combine(today, datetime.min.time()))
-        end_of_day = target_tz.localize(datetime.combine(today, datetime.max.time()))
-
-        # Convert to UTC for API call
-        start_utc = start_of_day.astimezone(pytz.utc)
-        end_utc = end_of_day.astimezone(pytz.utc)
-
-        # Get events
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_utc.isoformat(),
-                timeMax=end_utc.isoformat(),
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
+        try:
+            fields = parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        touch_prefetch(timezone_str, calendar_id)
+
+        # Get today's events in the target timezone
+        today, events = fetch_today_events(service, timezone_str, calendar_id)
+
+        date = today.strftime("%Y-%m-%d")
+        return event_list_response(
+            events, timezone_str, fields, extra={"date": date}, variant=(date,)
         )
-        events = events_result.get("items", [])
-
-        # Format response
-        formatted_events = []
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-
-            # Convert to target timezone
-            start_converted = convert_to_timezone(start, timezone_str)
-            end_converted = convert_to_timezone(end, timezone_str)
-
-            formatted_event = {
-                "summary": event.get("summary", "No title"),
-                "description": event.get("description", ""),
-                "location": event.get("location", ""),
-                "start": start_converted,
-                "end": end_converted,
-                "all_day": "T" not in start,
-            }
-            formatted_events.append(formatted_event)
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/summary", methods=["GET"])
+def get_summary():
+    """Get today's summary: event counts, busy minutes and the day's span.
 
-        return jsonify({"events": formatted_events, "date": today.strftime("%Y-%m-%d")})
+    Pre-computed by the prefetch scheduler for active timezones, computed
+    on demand otherwise (always, for users with their own credentials).
+    """
+    try:
+        service, calendar_id = user_calendar()
+        timezone_str = request.args.get("timezone", "Asia/Bangkok")
+        touch_prefetch(timezone_str, calendar_id)
+
+        summary = None
+        if calendar_id == "primary":
+            summary = prefetch_scheduler.summary(timezone_str)
+        cached = summary is not None
+        if not cached:
+            summary = daily_summary(service, timezone_str, calendar_id)
+            if calendar_id == "primary":
+                prefetch_scheduler.store_summary(summary)
+
+        return jsonify({**summary, "cached": cached})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/freebusy", methods=["POST"])
 def get_freebusy():
     """Get free/busy information for a time period."""
     try:
-        service = get_service()
+        service, calendar_id = user_calendar()
         data = request.get_json()
 
-        start_date = data.get("start_date")
-        end_date = data.get("end_date")
-        timezone_str = data.get("timezone", "Asia/Bangkok")
+        if not data.get("start_date") or not data.get("end_date"):
+            return jsonify({"error": "start_date and end_date are required"}), 400
+
+        # Parse dates in target timezone, converted to UTC for the API call
+        start_utc, end_utc, target_tz = parse_date_range(data)
+        touch_prefetch(data.get("timezone", "Asia/Bangkok"), calendar_id)
+
+        # Served from the event cache when it covers the range
+        busy = fetch_busy_periods(service, start_utc, end_utc, calendar_id, target_tz.zone)
+
+        busy_periods = format_busy_periods(busy, target_tz)
+        return jsonify({"busy_periods": busy_periods, "is_busy": len(busy_periods) > 0})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route("/freebusy/batch", methods=["POST"])
+def get_freebusy_batch():
+    """Get free/busy information for many calendars in one call.
+
+    `calendars` is a list of calendar IDs, or of {"id", "token"} objects for
+    calendars that must be read with another user's access token.
+    """
+    try:
+        data = request.get_json()
+        calendars = data.get("calendars") or []
 
-        if not start_date or not end_date:
+        if not data.get("start_date") or not data.get("end_date"):
             return jsonify({"error": "start_date and end_date are required"}), 400
+        if not calendars:
+            return jsonify({"error": "calendars is required"}), 400
+
+        start_utc, end_utc, target_tz = parse_date_range(data)
+        requested = parse_calendar_items(calendars)
+
+        service, _ = user_calendar()
+        results = query_freebusy(services_for(service), requested, start_utc, end_utc)
+        return jsonify(freebusy_payload(results, target_tz))
+    except Exception as e:
+        return error_response(e)
 
-        # Parse dates in target timezone
+
+@app.route("/dashboard", methods=["GET"])
+def get_dashboard():
+    """Get today's events, upcoming events and free/busy in one call.
+
+    The reads go to the Calendar API as one batched HTTP request (plus one
+    per extra page), which also refreshes the cached 30-day window /ai-query
+    reads. `calendars` is a comma-separated list of calendar IDs for the
+    free/busy part (default: primary); `start_date`/`end_date` set its range
+    (default: today).
+    """
+    try:
+        service, calendar_id = user_calendar()
+        timezone_str = request.args.get("timezone", "Asia/Bangkok")
+        max_results = request.args.get("max_results", 10, type=int)
+        calendars = [
+            item.strip()
+            for item in request.args.get("calendars", "primary").split(",")
+            if item.strip()
+        ]
+        touch_prefetch(timezone_str, calendar_id)
+
+        busy_range = None
         target_tz = pytz.timezone(timezone_str)
-        start_time = target_tz.localize(datetime.strptime(start_date, "%Y-%m-%d"))
-        end_time = target_tz.localize(datetime.strptime(end_date, "%Y-%m-%d"))
+        if request.args.get("start_date") and request.args.get("end_date"):
+            start_utc, end_utc, target_tz = parse_date_range(
+                {**request.args, "timezone": timezone_str}
+            )
+            busy_range = (start_utc, end_utc)
+
+        today, today_events, upcoming, busy = fetch_dashboard(
+            service,
+            timezone_str,
+            max_results,
+            calendars,
+            busy_range,
+            calendar_id=calendar_id,
+        )
+        return jsonify(
+            {
+                "date": today.strftime("%Y-%m-%d"),
+                "today": format_events(today_events, timezone_str),
+                "events": format_events(upcoming, timezone_str),
+                **freebusy_payload(busy, target_tz),
+            }
+        )
+    except Exception as e:
+        return error_response(e)
 
-        # Convert to UTC for API call
-        start_utc = start_time.astimezone(pytz.utc)
-        end_utc = end_time.astimezone(pytz.utc)
 
-        body = {
-            "timeMin": start_utc.isoformat(),
-            "timeMax": end_utc.isoformat(),
-            "items": [{"id": "primary"}],
-        }
+@app.route("/free-slots", methods=["POST"])
+def get_free_slots():
+    """Find meeting slots where every listed calendar is free.
 
-        events_result = service.freebusy().query(body=body).execute()
-        calendar_dict = events_result["calendars"]["primary"]
+    Each calendar may carry its own "timezone" and "working_hours"
+    ({"start": "09:00", "end": "17:00", "days": [0, 1, 2, 3, 4]}); otherwise
+    the request-level values apply. Slots already past are not offered.
+    """
+    try:
+        data = request.get_json()
+        calendars = data.get("calendars") or ["primary"]
 
-        busy_periods = []
-        if calendar_dict["busy"]:
-            for busy_period in calendar_dict["busy"]:
-                start = datetime.fromisoformat(
-                    busy_period["start"].replace("Z", "+00:00")
-                )
-                end = datetime.fromisoformat(busy_period["end"].replace("Z", "+00:00"))
-
-                # Convert to target timezone
-                start_converted = start.astimezone(target_tz)
-                end_converted = end.astimezone(target_tz)
-
-                busy_periods.append(
-                    {
-                        "start": start_converted.isoformat(),
-                        "end": end_converted.isoformat(),
-                        "start_formatted": start_converted.strftime("%Y-%m-%d %H:%M"),
-                        "end_formatted": end_converted.strftime("%H:%M"),
-                    }
-                )
+        if not data.get("start_date") or not data.get("end_date"):
+            return jsonify({"error": "start_date and end_date are required"}), 400
+        try:
+            start_utc, end_utc, target_tz = parse_date_range(data)
+            options = parse_slot_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        start_utc = max(start_utc, datetime.now(pytz.utc))
+        if start_utc >= end_utc:
+            return jsonify({"slots": [], "failed": []})
+        timezone_str = data.get("timezone", "Asia/Bangkok")
+        working_hours = data.get("working_hours")
+
+        attendee_hours = [
+            (timezone_str, working_hours)
+            if isinstance(item, str)
+            else (
+                item.get("timezone", timezone_str),
+                item.get("working_hours", working_hours),
+            )
+            for item in calendars
+        ]
 
-        return jsonify({"busy_periods": busy_periods, "is_busy": len(busy_periods) > 0})
+        service, _ = user_calendar()
+        results = query_freebusy(
+            services_for(service), parse_calendar_items(calendars), start_utc, end_utc
+        )
+        busy = [
+            (to_epoch(start), to_epoch(end))
+            for result in results.values()
+            for start, end in result["busy"]
+        ]
+
+        slots = find_free_slots(
+            busy,
+            start_utc,
+            end_utc,
+            attendee_hours,
+            **options,
+        )
+
+        formatted_slots = []
+        for start, end, free_seconds in slots:
+            start_converted = from_epoch(start, target_tz)
+            end_converted = from_epoch(end, target_tz)
+            formatted_slots.append(
+                {
+                    "start": start_converted.isoformat(),
+                    "end": end_converted.isoformat(),
+                    "start_formatted": start_converted.strftime("%Y-%m-%d %H:%M"),
+                    "end_formatted": end_converted.strftime("%H:%M"),
+                    "free_minutes": free_seconds // 60,
+                }
+            )
+
+        return jsonify(
+            {
+                "slots": formatted_slots,
+                "failed": sorted(
+                    calendar_id
+                    for calendar_id, result in results.items()
+                    if result["errors"]
+                ),
+            }
+        )
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 @app.route("/ai-query", methods=["POST"])
 def ai_query():
-    """Ask AI about calendar data."""
+    """Ask AI about calendar data.
+
+    With "stream": true the answer is relayed as server-sent events: "chunk"
+    events carrying {"text"} as Gemini generates it, then a "done" event (or
+    "error"). "include_calendar_data": false leaves the echoed events out,
+    and "fields" (a list or comma-separated string) projects them. Questions
+    about particular events are answered from, and echo, only the events
+    matching them; "retrieval" then says how they were picked. Simple
+    questions ("what's next?", "am I free at 3pm?") are answered without
+    Gemini, from the events or free/busy; "intent" then names the kind.
+    """
     try:
-        service = get_service()
-        gemini_model = get_gemini_model()
+        service, calendar_id = user_calendar()
         data = request.get_json()
 
         question = data.get("question")
         timezone_str = data.get("timezone", "Asia/Bangkok")
+        stream = bool(data.get("stream", False))
+        include_calendar_data = bool(data.get("include_calendar_data", True))
 
         if not question:
             return jsonify({"error": "question is required"}), 400
+        try:
+            fields = parse_fields(data.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        touch_prefetch(timezone_str, calendar_id)
+
+        routed = intent_router.route_question(service, question, timezone_str, calendar_id)
+        if routed is not None:
+            result = {"cached": False, "intent": routed.intent}
+            if include_calendar_data:
+                result["calendar_data"] = project_events(
+                    format_events(routed.events, timezone_str), fields
+                )
+            if stream:
+                return Response(
+                    sse_event("chunk", {"text": routed.answer}) + sse_event("done", result),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                )
+            result["response"] = routed.answer
+            return jsonify(result)
 
-        # Get calendar data
-        calendar_data = get_calendar_data(service, timezone_str=timezone_str)
+        # Get calendar data, only the matching events for targeted questions
+        calendar_data, retrieval = get_question_data(
+            service, question, timezone_str=timezone_str, calendar_id=calendar_id
+        )
 
         if not calendar_data:
             return jsonify({"error": "No calendar data found"}), 404
 
-        # Ask Gemini
-        ai_response = ask_gemini_about_calendar(
-            gemini_model, calendar_data, question, timezone_str
-        )
+        key = answer_cache_key(question, calendar_data, timezone_str)
+        with stage("ai_cache"):
+            ai_response = response_cache.get(key)
+        cached = ai_response is not None
+
+        result = {"cached": cached}
+        if retrieval is not None:
+            result["retrieval"] = {
+                "terms": list(retrieval.terms),
+                "matched": len(calendar_data),
+                "considered": retrieval.considered,
+            }
+        if include_calendar_data:
+            result["calendar_data"] = project_events(calendar_data, fields)
+
+        if not cached:
+            enter_upstream("gemini")
+
+        if stream:
+            gemini_model = None if cached else get_gemini_model()
+
+            def generate():
+                try:
+                    if cached:
+                        yield sse_event("chunk", {"text": ai_response})
+                    else:
+                        parts = []
+                        for text in stream_gemini_about_calendar(
+                            gemini_model, calendar_data, question, timezone_str, retrieval
+                        ):
+                            parts.append(text)
+                            yield sse_event("chunk", {"text": text})
+                        response_cache.put(key, "".join(parts))
+                    yield sse_event("done", result)
+                except Exception as e:
+                    yield sse_event("error", error_payload(e))
+
+            return Response(
+                stream_with_context(generate()),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        if not cached:
+            # Ask Gemini
+            gemini_model = get_gemini_model()
+            ai_response = ask_gemini_about_calendar(
+                gemini_model, calendar_data, question, timezone_str, retrieval
+            )
+            response_cache.put(key, ai_response)
 
-        return jsonify({"response": ai_response, "calendar_data": calendar_data})
+        result["response"] = ai_response
+        return jsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 
 if __name__ == "__main__":
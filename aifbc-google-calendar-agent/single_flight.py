@@ -0,0 +1,77 @@
+"""
+Single-flight coalescing of identical upstream calls.
+
+When several requests need the same upstream result at the same time (the
+frontend loading /events, /today and /freebusy in parallel, or many open
+tabs), only the first caller for a key runs the call; the others wait for it
+and share its result or exception. Nothing is cached once the call returns.
+"""
+import threading
+from collections import Counter
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key.
+
+    Keys are tuples whose first item names the kind of call ("events",
+    "freebusy", ...), which is used to break the counters down.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+        self._coalesced_by_kind = Counter()
+
+    def do(self, key, fn):
+        """Run fn() once per concurrent key and return its result to every caller."""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+                self._coalesced_by_kind[key[0]] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def snapshot(self):
+        """Return call counters, with coalesced calls broken down by kind."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+            stats["coalesced_by_kind"] = dict(self._coalesced_by_kind)
+            return stats
+
+
+# Shared by every upstream call path in the process.
+upstream_flight = SingleFlight()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Test the agent, not the upstream rate limits or background refreshes.
+os.environ["CALENDAR_RATE_PER_SECOND"] = "0"
+os.environ["PREFETCH_ENABLED"] = "false"
@@ -0,0 +1,101 @@
+"""Upstream slots taken by the ASGI serving mode."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import asgi_server
+import calendar_core
+import server
+from benchmarks.fake_calendar import FakeCalendarService
+from benchmarks.fake_gemini import FakeGeminiModel
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    start = datetime.now(pytz.utc) + timedelta(hours=1)
+    service = FakeCalendarService(
+        {
+            "primary": [
+                {
+                    "id": "review",
+                    "status": "confirmed",
+                    "summary": "Design review",
+                    "start": {"dateTime": start.isoformat()},
+                    "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+                }
+            ]
+        }
+    )
+    model = FakeGeminiModel(latency=0, chunk_latency=0.2, chunks=3)
+    monkeypatch.setattr(server, "get_service", lambda: service)
+    monkeypatch.setattr(server, "get_gemini_model", lambda: model)
+    calendar_core.event_store.invalidate()
+    calendar_core.response_cache.clear()
+    asgi_server._semaphores.clear()
+    yield model
+    asgi_server._semaphores.clear()
+    calendar_core.event_store.invalidate()
+    calendar_core.response_cache.clear()
+
+
+async def call(method, path, body=None):
+    """Send one request through the ASGI app; return (status, body)."""
+    payload = json.dumps(body).encode() if body is not None else b""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    await asgi_server.app(scope, receive, send)
+    chunks = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return messages[0]["status"], chunks
+
+
+def limit(upstream, slots):
+    asgi_server._semaphores[upstream] = asyncio.Semaphore(slots)
+
+
+def test_routed_questions_take_no_gemini_slot(gemini):
+    async def scenario():
+        limit("gemini", 0)
+        return await asyncio.wait_for(
+            call("POST", "/ai-query", {"question": "what's next?", "timezone": "UTC"}), 5
+        )
+
+    status, body = asyncio.run(scenario())
+    assert status == 200
+    assert json.loads(body)["intent"] == "next_event"
+    assert gemini.calls == 0
+
+
+def test_calendar_slot_is_free_while_an_answer_streams(gemini):
+    async def scenario():
+        limit("calendar", 1)
+        limit("gemini", 1)
+        question = {"question": "summarize my schedule", "timezone": "UTC", "stream": True}
+        streaming = asyncio.create_task(call("POST", "/ai-query", question))
+        while gemini.calls == 0:
+            await asyncio.sleep(0.01)
+        # The only Calendar slot must be free while the answer streams
+        events = await asyncio.wait_for(call("GET", "/events"), 0.5)
+        assert not streaming.done()
+        return events, await streaming
+
+    (status, _), (ai_status, body) = asyncio.run(scenario())
+    assert status == 200 and ai_status == 200
+    assert b"event: done" in body
+    semaphores = asgi_server._semaphores
+    assert semaphores["calendar"]._value == 1 and semaphores["gemini"]._value == 1
@@ -0,0 +1,98 @@
+"""On-disk event store: range replacement, sync-token upserts and restores."""
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from benchmarks.fake_calendar import FakeCalendarService
+from event_db import EventDatabase
+from event_store import EventStore
+
+START = datetime(2026, 10, 19, tzinfo=pytz.utc)
+END = START + timedelta(days=7)
+
+
+def meeting(event_id, day, hour=9, summary="Meeting"):
+    start = START + timedelta(days=day, hours=hour)
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": summary,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+    }
+
+
+@pytest.fixture
+def database(tmp_path):
+    return EventDatabase(str(tmp_path / "events.db"))
+
+
+def ids(events):
+    return [event["id"] for event in events]
+
+
+def test_full_sync_replaces_the_range(database):
+    database.replace_range("primary", START, END, [meeting("a", 0), meeting("b", 1)], "t1")
+    key = database.replace_range("primary", START, END, [meeting("b", 1), meeting("c", 2)], "t2")
+    assert ids(database.query("primary", START, END)) == ["b", "c"]
+    stored = database.covering_range("primary", START + timedelta(days=1), START + timedelta(days=2))
+    assert stored.key == key and stored.sync_token == "t2"
+    assert database.covering_range("primary", START, END + timedelta(days=1)) is None
+    assert database.query("other", START, END) == []
+
+
+def test_incremental_sync_upserts_and_deletes(database):
+    key = database.replace_range("primary", START, END, [meeting("a", 0), meeting("b", 1)], "t1")
+    changes = [
+        meeting("a", 3, summary="Moved"),
+        {"id": "b", "status": "cancelled"},
+        meeting("c", 2),
+    ]
+    database.apply_changes(key, changes, "t2")
+    events = database.query("primary", START, END)
+    assert ids(events) == ["c", "a"]
+    assert events[1]["summary"] == "Moved"
+    assert database.covering_range("primary", START, END).sync_token == "t2"
+
+
+def test_cancelled_occurrence_is_kept_at_its_original_start(database):
+    key = database.replace_range("primary", START, END, [], "t1")
+    original = (START + timedelta(days=2, hours=9)).isoformat()
+    cancelled = {
+        "id": "standup_20261021T090000Z",
+        "status": "cancelled",
+        "recurringEventId": "standup",
+        "originalStartTime": {"dateTime": original},
+    }
+    database.apply_changes(key, [cancelled], "t2")
+    day = START + timedelta(days=2)
+    assert ids(database.query("primary", day, day + timedelta(days=1))) == [cancelled["id"]]
+    assert database.query("primary", START, day) == []
+
+
+def test_series_master_is_found_across_its_whole_span(database):
+    master = meeting("standup", 0)
+    master["recurrence"] = ["RRULE:FREQ=DAILY;COUNT=30"]
+    database.replace_range("primary", START, END, [master], "t1")
+    later = START + timedelta(days=20)
+    assert ids(database.query("primary", later, later + timedelta(days=1))) == ["standup"]
+    after = START + timedelta(days=31)
+    assert database.query("primary", after, after + timedelta(days=1)) == []
+
+
+def test_restarted_store_restores_and_syncs_only_changes(database):
+    calendar = FakeCalendarService({"primary": [meeting("a", 0), meeting("b", 1)]})
+    first = EventStore(sync_interval=0, window_days=7, database=database, series=False)
+    assert ids(first.get_events(calendar, "primary", START, END)) == ["a", "b"]
+
+    calendar.put_event("primary", meeting("c", 2))
+    calendar.cancel_event("primary", "a")
+    calls = calendar.calls
+    restarted = EventStore(sync_interval=0, window_days=7, database=database, series=False)
+    assert ids(restarted.get_events(calendar, "primary", START, END)) == ["b", "c"]
+    assert calendar.calls == calls + 1
+    assert restarted.stats["restored"] == 1
+    assert restarted.stats["incremental_syncs"] == 1
+    assert restarted.stats["full_syncs"] == 0
+    assert ids(database.query("primary", START, END)) == ["b", "c"]
@@ -0,0 +1,100 @@
+"""BM25 retrieval of the events a question is about."""
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.fake_calendar import FakeCalendarService
+from event_index import EventIndex, question_terms, tokenize
+from event_store import EventStore
+
+START = datetime(2026, 10, 19, tzinfo=pytz.utc)
+CHORES = [f"chore{n}" for n in range(30)]
+
+
+def event(event_id, summary, description="", location="", day=0):
+    start = START + timedelta(days=day, hours=9)
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": summary,
+        "description": description,
+        "location": location,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+    }
+
+
+def index_of(*events):
+    index = EventIndex()
+    for item in events:
+        index.add(item["id"], item)
+    return index
+
+
+def test_tokenize_stems_and_drops_stopwords_and_numbers():
+    assert tokenize("My Interviews at 10 with the hiring team") == [
+        "interview",
+        "hir",
+        "team",
+    ]
+
+
+def test_question_terms():
+    assert question_terms("When is my dentist appointment next week?") == ("dentist",)
+    assert question_terms("Interviews, interviews and the interview") == ("interview",)
+    assert question_terms("How many meetings do I have this week?") == ()
+    assert question_terms("Am I free on Friday?") == ()
+
+
+def test_summary_matches_outrank_description_matches():
+    index = index_of(
+        event("notes", "Planning", description="bring the budget draft"),
+        event("budget", "Budget review"),
+        event("lunch", "Lunch"),
+    )
+    assert [event_id for event_id, _ in index.search(["budget"])] == ["budget", "notes"]
+    assert index.search(["dentist"]) == []
+
+
+def test_weak_matches_are_cut_off_and_k_is_respected():
+    index = index_of(
+        event("exact", "Dentist checkup", location="Dentist clinic"),
+        # One mention in a long description scores far below the best match
+        event("weak", "Errands", description="call dentist " + " ".join(CHORES)),
+        *(event(f"other-{n}", f"Sync {n}") for n in range(5)),
+    )
+    assert [event_id for event_id, _ in index.search(["dentist"])] == ["exact"]
+    index.add("second", event("second", "Dentist follow-up"))
+    assert len(index.search(["dentist"], k=1)) == 1
+
+
+def test_candidates_and_updates():
+    index = index_of(event("a", "Team offsite"), event("b", "Offsite planning"))
+    assert [event_id for event_id, _ in index.search(["offsite"], candidates={"b"})] == ["b"]
+    index.add("a", event("a", "Team dinner"))
+    index.remove("b")
+    index.remove("missing")
+    assert index.search(["offsite"]) == []
+    assert [event_id for event_id, _ in index.search(["dinner"])] == ["a"]
+    assert len(index) == 1
+
+
+def test_cached_window_search_follows_syncs():
+    calendar = FakeCalendarService(
+        {
+            "primary": [
+                event("dentist", "Dentist", day=1),
+                event("standup", "Standup", day=1),
+                event("review", "Design review", day=2),
+            ]
+        }
+    )
+    store = EventStore(sync_interval=0, window_days=7, series=False)
+    end = START + timedelta(days=7)
+    matches, considered = store.search_events(calendar, "primary", START, end, ["dentist"], 5)
+    assert [item["id"] for item in matches] == ["dentist"] and considered == 3
+
+    calendar.cancel_event("primary", "dentist")
+    calendar.put_event("primary", event("dentist-2", "Dentist (rescheduled)", day=3))
+    matches, considered = store.search_events(calendar, "primary", START, end, ["dentist"], 5)
+    assert [item["id"] for item in matches] == ["dentist-2"] and considered == 3
@@ -0,0 +1,162 @@
+"""The free-slot engine and the /free-slots route."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import server
+from benchmarks.fake_calendar import FakeCalendarService
+from free_slots import (
+    find_free_slots,
+    intersect_intervals,
+    subtract_intervals,
+    to_epoch,
+    union_intervals,
+    working_windows,
+)
+
+UTC_ALL_DAY = ("UTC", {"start": "00:00", "end": "23:59", "days": list(range(7))})
+MONDAY = pytz.utc.localize(datetime(2026, 10, 19))
+
+
+def test_union_merges_overlapping_and_touching_intervals():
+    assert union_intervals([5, 0, 12, 20], [8, 5, 15, 21]) == ([0, 12, 20], [8, 15, 21])
+    assert union_intervals([], []) == ([], [])
+
+
+def test_intersect():
+    assert intersect_intervals([0, 10], [5, 20], [3, 12], [11, 15]) == ([3, 10, 12], [5, 11, 15])
+
+
+def test_subtract():
+    assert subtract_intervals([0, 20], [10, 30], [2, 8, 25], [4, 22, 40]) == (
+        [0, 4, 22],
+        [2, 8, 25],
+    )
+
+
+def test_working_windows_follow_dst():
+    # US DST ends on Sunday Nov 1, 2026: 09:00 New York moves from 13:00 to 14:00 UTC
+    start = pytz.utc.localize(datetime(2026, 10, 30))
+    starts, ends = working_windows(start, start + timedelta(days=5), "America/New_York")
+    assert [datetime.fromtimestamp(s, pytz.utc).hour for s in starts] == [13, 14, 14]
+    assert all(end - start == 8 * 3600 for start, end in zip(starts, ends))
+
+
+def test_slots_avoid_busy_time_and_buffers():
+    busy = [(to_epoch(MONDAY + timedelta(hours=10)), to_epoch(MONDAY + timedelta(hours=11)))]
+    hours = [("UTC", {"start": "09:00", "end": "12:00", "days": [0]})]
+    slots = find_free_slots(
+        busy, MONDAY, MONDAY + timedelta(days=1), hours, duration_minutes=30, buffer_minutes=15
+    )
+    starts = [datetime.fromtimestamp(start, pytz.utc).strftime("%H:%M") for start, _, _ in slots]
+    assert starts == ["09:00", "11:15"]
+    assert [free for _, _, free in slots] == [45 * 60, 45 * 60]
+
+
+def test_slots_are_in_everyones_working_hours():
+    hours = [
+        ("Asia/Bangkok", {"start": "09:00", "end": "18:00", "days": [0]}),  # 02:00-11:00 UTC
+        ("Europe/London", {"start": "09:00", "end": "17:00", "days": [0]}),  # 08:00-16:00 UTC
+    ]
+    slots = find_free_slots([], MONDAY, MONDAY + timedelta(days=1), hours, duration_minutes=60)
+    assert [(s - to_epoch(MONDAY)) // 3600 for s, _, _ in slots] == [8]
+    assert slots[0][2] == 3 * 3600
+
+
+def test_roomiest_ranks_larger_gaps_first():
+    busy = [(to_epoch(MONDAY + timedelta(hours=1)), to_epoch(MONDAY + timedelta(hours=20)))]
+    slots = find_free_slots(
+        busy, MONDAY, MONDAY + timedelta(days=1), [UTC_ALL_DAY], rank="roomiest", limit=1
+    )
+    assert (slots[0][0] - to_epoch(MONDAY)) // 3600 == 20
+
+
+def test_matches_a_brute_force_scan():
+    rng = random.Random(7)
+    lower = to_epoch(MONDAY)
+    busy = []
+    for _ in range(40):
+        start = lower + rng.randrange(7 * 24 * 4) * 900
+        busy.append((start, start + rng.choice((900, 1800, 3600))))
+    hours = [("Asia/Tokyo", None), ("Asia/Bangkok", None)]
+    end = MONDAY + timedelta(days=7)
+    slots = find_free_slots(
+        busy, MONDAY, end, hours, duration_minutes=30, granularity_minutes=15, limit=0
+    )
+    windows = {zone: list(zip(*working_windows(MONDAY, end, zone))) for zone, _ in hours}
+
+    def free(minute):
+        moment = lower + minute * 60
+        if any(s <= moment < e for s, e in busy):
+            return False
+        return all(any(s <= moment < e for s, e in spans) for spans in windows.values())
+
+    minutes = 7 * 24 * 60
+    state = [free(minute) for minute in range(minutes)]
+    expected = []
+    minute = 0
+    while minute < minutes:
+        if state[minute] and (minute == 0 or not state[minute - 1]):
+            gap_end = minute
+            while gap_end < minutes and state[gap_end]:
+                gap_end += 1
+            aligned = -(-minute // 15) * 15
+            if aligned + 30 <= gap_end:
+                expected.append((lower + aligned * 60, lower + (aligned + 30) * 60))
+            minute = gap_end
+        minute += 1
+    assert expected
+    assert [(s, e) for s, e, _ in slots] == expected
+
+
+@pytest.fixture
+def client(monkeypatch):
+    service = FakeCalendarService({"primary": []})
+    monkeypatch.setattr(server, "get_service", lambda: service)
+    return server.app.test_client()
+
+
+def request_body(**options):
+    today = datetime.now(pytz.utc).date()
+    body = {
+        "start_date": (today - timedelta(days=1)).isoformat(),
+        "end_date": (today + timedelta(days=3)).isoformat(),
+        "timezone": "UTC",
+        "working_hours": {"start": "00:00", "end": "23:59", "days": list(range(7))},
+    }
+    body.update(options)
+    return body
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"duration_minutes": "30"},
+        {"duration_minutes": 0},
+        {"buffer_minutes": -5},
+        {"granularity_minutes": 1.5},
+        {"limit": True},
+        {"rank": "best"},
+        {"start_date": "next monday"},
+    ],
+)
+def test_bad_options_are_rejected(client, options):
+    response = client.post("/free-slots", json=request_body(**options))
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_past_slots_are_not_offered(client):
+    response = client.post("/free-slots", json=request_body(limit=1))
+    assert response.status_code == 200
+    slot = response.get_json()["slots"][0]
+    assert datetime.fromisoformat(slot["start"]) >= datetime.now(pytz.utc) - timedelta(minutes=1)
+
+
+def test_window_entirely_past_has_no_slots(client):
+    response = client.post(
+        "/free-slots", json=request_body(start_date="2020-01-01", end_date="2020-01-05")
+    )
+    assert response.get_json() == {"slots": [], "failed": []}
@@ -0,0 +1,44 @@
+"""Free/busy queries that share upstream calls must not share users' calendars."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.fake_calendar import FakeCalendarService
+from freebusy import query_freebusy
+
+START = datetime(2026, 10, 19, tzinfo=pytz.utc)
+END = START + timedelta(days=1)
+
+
+def calendar_with_meeting(hour):
+    start = START + timedelta(hours=hour)
+    return FakeCalendarService(
+        {
+            "primary": [
+                {
+                    "id": f"meeting-{hour}",
+                    "status": "confirmed",
+                    "summary": "Meeting",
+                    "start": {"dateTime": start.isoformat()},
+                    "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+                }
+            ]
+        },
+        latency=0.2,
+    )
+
+
+def test_concurrent_users_get_their_own_primary_calendar():
+    alice, bob = calendar_with_meeting(9), calendar_with_meeting(15)
+
+    def busy(service):
+        results = query_freebusy(lambda token: service, [("primary", None)], START, END)
+        return results["primary"]["busy"]
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        alice_busy, bob_busy = pool.map(busy, (alice, bob))
+
+    assert alice_busy == [(START + timedelta(hours=9), START + timedelta(hours=10))]
+    assert bob_busy == [(START + timedelta(hours=15), START + timedelta(hours=16))]
+    assert alice.calls == bob.calls == 1
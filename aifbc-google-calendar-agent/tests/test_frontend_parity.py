@@ -0,0 +1,148 @@
+"""
+The CLI (chat_cli.py) and the HTTP server (server.py) read events through
+the same calendar_core paths; these tests run both over one fake calendar
+and check they produce the same normalized events.
+"""
+import io
+from datetime import datetime, time, timedelta
+
+import pytest
+import pytz
+from rich.console import Console
+
+import calendar_core
+import chat_cli
+import server
+from benchmarks.fake_calendar import FakeCalendarService
+from benchmarks.fake_gemini import FakeGeminiModel
+
+TIMEZONE = chat_cli.CLI_TIMEZONE
+
+
+def timed(event_id, summary, start, minutes, **extra):
+    end = start + timedelta(minutes=minutes)
+    event = {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": summary,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+    }
+    event.update(extra)
+    return event
+
+
+def all_day(event_id, summary, day, days=1):
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": summary,
+        "start": {"date": day.isoformat()},
+        "end": {"date": (day + timedelta(days=days)).isoformat()},
+    }
+
+
+@pytest.fixture
+def service():
+    """A fake primary calendar around today in the CLI's timezone."""
+    tz = pytz.timezone(TIMEZONE)
+    today = datetime.now(tz).date()
+
+    def at(day, hour, minute=0, zone=tz):
+        return zone.localize(datetime.combine(today + timedelta(days=day), time(hour, minute)))
+
+    events = [
+        timed("standup", "Standup", at(0, 9), 15, location="Room 1"),
+        timed("lunch", "Lunch with Dana", at(0, 12), 60, description="Thai place"),
+        timed("late", "Late review", at(0, 23, 30), 60),
+        all_day("holiday", "Company holiday", today),
+        all_day("offsite", "Offsite", today + timedelta(days=2), days=3),
+        timed("dentist", "Dentist appointment", at(1, 15), 45, location="Clinic"),
+        timed("ny-call", "Call with New York", at(3, 9, zone=pytz.timezone("America/New_York")), 30),
+        timed(
+            "weekly",
+            "Weekly planning",
+            at(1, 10),
+            60,
+            recurrence=["RRULE:FREQ=WEEKLY;COUNT=4"],
+        ),
+    ]
+    events.extend(
+        timed(f"focus-{day}", "Focus time", at(day, 14), 120) for day in range(1, 8)
+    )
+    return FakeCalendarService({"primary": events})
+
+
+@pytest.fixture
+def cli_events(monkeypatch):
+    """Events the CLI normalized, and the CLI's printed output."""
+    captured = []
+    output = io.StringIO()
+
+    def record(events, timezone_str="Asia/Bangkok"):
+        for event in calendar_core.iter_normalized_events(events, timezone_str):
+            captured.append(event)
+            yield event
+
+    monkeypatch.setattr(chat_cli, "iter_normalized_events", record)
+    monkeypatch.setattr(chat_cli, "console", Console(file=output))
+    return captured, output
+
+
+@pytest.fixture
+def client(service, monkeypatch):
+    monkeypatch.setattr(server, "get_service", lambda: service)
+    monkeypatch.setattr(server, "get_gemini_model", lambda: FakeGeminiModel(latency=0))
+    return server.app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    calendar_core.event_store.invalidate()
+    calendar_core.response_cache.clear()
+    yield
+    calendar_core.event_store.invalidate()
+    calendar_core.response_cache.clear()
+
+
+def test_upcoming_events_match(service, client, cli_events):
+    captured, output = cli_events
+    chat_cli.list_events(service, 10)
+
+    response = client.get("/events", query_string={"max_results": 10, "timezone": TIMEZONE})
+
+    assert response.status_code == 200
+    assert "error" not in output.getvalue()
+    assert len(captured) == 10
+    assert [event.to_dict() for event in captured] == response.get_json()["events"]
+
+
+def test_today_events_match(service, client, cli_events):
+    captured, output = cli_events
+    chat_cli.get_today_events(service)
+
+    response = client.get("/today", query_string={"timezone": TIMEZONE})
+
+    assert response.status_code == 200
+    assert "error" not in output.getvalue()
+    summaries = {event.summary for event in captured}
+    assert {"Standup", "Lunch with Dana", "Late review", "Company holiday"} <= summaries
+    assert "Offsite" not in summaries
+    assert [event.to_dict() for event in captured] == response.get_json()["events"]
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["What should I prepare for this month?", "When is the dentist appointment?"],
+)
+def test_question_data_matches(service, client, question):
+    calendar_data, _ = chat_cli.get_question_data(service, question)
+    calendar_core.event_store.invalidate()
+
+    response = client.post("/ai-query", json={"question": question, "timezone": TIMEZONE})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert "intent" not in body
+    assert calendar_data
+    assert calendar_data == body["calendar_data"]
@@ -0,0 +1,127 @@
+"""Recurring ICS events listed as instances and as series."""
+from datetime import datetime
+
+import pytest
+import pytz
+
+from ics_backend import IcsCalendarService
+from recurrence import Series
+
+CALENDAR = """BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:standup
+SUMMARY:Standup
+DTSTART;TZID=America/New_York:20261026T090000
+DTEND;TZID=America/New_York:20261026T091500
+RRULE:FREQ=WEEKLY;BYDAY=MO,WE;COUNT=6
+EXDATE;TZID=America/New_York:20261028T090000
+END:VEVENT
+BEGIN:VEVENT
+UID:standup
+RECURRENCE-ID;TZID=America/New_York:20261102T090000
+SUMMARY:Standup (moved)
+DTSTART;TZID=America/New_York:20261102T130000
+DTEND;TZID=America/New_York:20261102T131500
+END:VEVENT
+BEGIN:VEVENT
+UID:standup
+RECURRENCE-ID;TZID=America/New_York:20261104T090000
+STATUS:CANCELLED
+SUMMARY:Standup
+DTSTART;TZID=America/New_York:20261104T090000
+DTEND;TZID=America/New_York:20261104T091500
+END:VEVENT
+BEGIN:VEVENT
+UID:review
+SUMMARY:Design review
+DTSTART:20261027T150000Z
+DTEND:20261027T160000Z
+END:VEVENT
+END:VCALENDAR
+"""
+
+TIME_MIN = "2026-10-26T00:00:00Z"
+TIME_MAX = "2026-11-16T00:00:00Z"
+
+
+@pytest.fixture
+def service(tmp_path):
+    path = tmp_path / "work.ics"
+    path.write_text(CALENDAR, encoding="utf-8")
+    return IcsCalendarService({"primary": str(path)})
+
+
+def list_events(service, single_events):
+    return service.events().list(
+        calendarId="primary",
+        singleEvents=single_events,
+        timeMin=TIME_MIN,
+        timeMax=TIME_MAX,
+    ).execute()["items"]
+
+
+def test_instances_apply_exdate_and_overrides(service):
+    items = list_events(service, True)
+    standups = [item for item in items if item.get("recurringEventId") == "standup"]
+    assert [(item["id"], item["start"]["dateTime"]) for item in standups] == [
+        ("standup_20261026T130000Z", "2026-10-26T09:00:00-04:00"),
+        ("standup_20261102T140000Z", "2026-11-02T13:00:00-05:00"),
+        ("standup_20261109T140000Z", "2026-11-09T09:00:00-05:00"),
+        ("standup_20261111T140000Z", "2026-11-11T09:00:00-05:00"),
+    ]
+    assert standups[1]["summary"] == "Standup (moved)"
+    assert all("recurrence" not in item for item in items)
+    assert any(item["id"] == "review" for item in items)
+
+
+def test_series_listing_returns_master_and_exceptions(service):
+    items = {item["id"]: item for item in list_events(service, False)}
+    assert set(items) == {
+        "standup",
+        "standup_20261102T140000Z",
+        "standup_20261104T140000Z",
+        "review",
+    }
+    master = items["standup"]
+    assert master["start"] == {
+        "dateTime": "2026-10-26T09:00:00-04:00",
+        "timeZone": "America/New_York",
+    }
+    assert master["recurrence"] == [
+        "RRULE:FREQ=WEEKLY;BYDAY=MO,WE;COUNT=6",
+        "EXDATE;TZID=America/New_York:20261028T090000",
+    ]
+    moved = items["standup_20261102T140000Z"]
+    assert moved["originalStartTime"]["dateTime"] == "2026-11-02T09:00:00-05:00"
+    assert items["standup_20261104T140000Z"]["status"] == "cancelled"
+
+
+def test_series_expand_to_the_same_instances(service):
+    items = list_events(service, False)
+    master = next(item for item in items if item["id"] == "standup")
+    replaced = {
+        datetime.fromisoformat(item["originalStartTime"]["dateTime"]).astimezone(pytz.utc)
+        for item in items
+        if "originalStartTime" in item
+    }
+    occurrences = Series(master).occurrences(
+        datetime(2026, 10, 26, tzinfo=pytz.utc),
+        datetime(2026, 11, 16, tzinfo=pytz.utc),
+        replaced,
+    )
+    assert [instance["id"] for _, _, instance in occurrences] == [
+        "standup_20261026T130000Z",
+        "standup_20261109T140000Z",
+        "standup_20261111T140000Z",
+    ]
+
+
+def test_series_listing_excludes_finished_series(service):
+    items = service.events().list(
+        calendarId="primary",
+        singleEvents=False,
+        timeMin="2026-11-12T00:00:00Z",
+        timeMax="2026-11-20T00:00:00Z",
+    ).execute()["items"]
+    assert items == []
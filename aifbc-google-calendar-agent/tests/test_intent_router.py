@@ -0,0 +1,116 @@
+"""Simple questions answered without Gemini."""
+from datetime import datetime, time, timedelta
+
+import pytest
+import pytz
+
+import calendar_core
+import intent_router
+from benchmarks.fake_calendar import FakeCalendarService
+from intent_router import normalize, parse_clock, parse_duration, route_question
+
+LOS_ANGELES = pytz.timezone("America/Los_Angeles")
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    calendar_core.event_store.invalidate()
+    yield
+    calendar_core.event_store.invalidate()
+
+
+def test_normalize_drops_greetings_and_punctuation():
+    assert normalize("Hey, what's   next?") == "whats next"
+    assert normalize("Please, how many meetings today?!") == "how many meetings today"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("3pm", time(15)), ("15:30", time(15, 30)), ("noon", time(12)), ("3", time(15)),
+     ("12am", time(0)), ("13pm", None), ("24:00", None)],
+)
+def test_parse_clock(value, expected):
+    assert parse_clock(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value, minutes",
+    [(None, 30), ("an hour", 60), ("half an hour", 30), ("90 minutes", 90), ("2 hours", 120)],
+)
+def test_parse_duration(value, minutes):
+    assert parse_duration(value) == minutes
+
+
+@pytest.mark.parametrize(
+    "question, intent",
+    [
+        ("what's next", "next_event"),
+        ("when is my next meeting?", "next_event"),
+        ("am I free tomorrow at 3pm for an hour?", "free_at"),
+        ("how many meetings do I have this week?", "count_events"),
+        ("what do I have on friday", "agenda"),
+        ("what's next for the Q3 review?", None),
+        ("summarize my week", None),
+    ],
+)
+def test_routes_whole_questions_only(question, intent):
+    service = FakeCalendarService({"primary": []})
+    routed = route_question(service, question, "UTC")
+    assert (routed and routed.intent) == intent
+
+
+def _all_day(event_id, summary, day):
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": summary,
+        "start": {"date": day.isoformat()},
+        "end": {"date": (day + timedelta(days=1)).isoformat()},
+    }
+
+
+def test_counts_events_in_the_period():
+    tz = pytz.timezone("Asia/Bangkok")
+    tomorrow = datetime.now(tz).date() + timedelta(days=1)
+    start = tz.localize(datetime.combine(tomorrow, time(10)))
+    service = FakeCalendarService(
+        {
+            "primary": [
+                _all_day("holiday", "Holiday", tomorrow),
+                {
+                    "id": "review",
+                    "status": "confirmed",
+                    "summary": "Review",
+                    "location": "Room 2",
+                    "start": {"dateTime": start.isoformat()},
+                    "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+                },
+            ]
+        }
+    )
+    routed = route_question(service, "how many meetings tomorrow?", "Asia/Bangkok")
+    assert routed.answer.startswith("You have 2 events tomorrow:")
+    assert "- 10:00-11:00 Review (Room 2)" in routed.answer
+    assert "- all day Holiday" in routed.answer
+
+
+def test_tomorrows_all_day_event_is_next_late_in_a_western_day(monkeypatch):
+    # 18:00 in Los Angeles is already Tuesday in UTC
+    now = LOS_ANGELES.localize(datetime(2026, 10, 19, 18))
+    later = LOS_ANGELES.localize(datetime(2026, 10, 21, 9))
+    raw_events = [
+        _all_day("offsite", "Offsite", now.date() + timedelta(days=1)),
+        {
+            "id": "sync",
+            "status": "confirmed",
+            "summary": "Sync",
+            "start": {"dateTime": later.isoformat()},
+            "end": {"dateTime": (later + timedelta(minutes=30)).isoformat()},
+        },
+    ]
+    monkeypatch.setattr(intent_router, "fetch_upcoming_events", lambda *args: raw_events)
+
+    routed = intent_router.answer_next_event(None, now, "America/Los_Angeles", "primary")
+
+    assert routed.answer == 'Your next event is "Offsite" tomorrow all day.'
+    assert routed.events == [raw_events[0]]
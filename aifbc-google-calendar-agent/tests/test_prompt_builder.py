@@ -0,0 +1,103 @@
+"""Compact, token-budgeted Gemini prompts."""
+import logging
+from datetime import date, datetime
+
+import pytz
+
+import calendar_core
+from prompt_builder import (
+    PromptStats,
+    build_calendar_prompt,
+    format_event_row,
+    past_window,
+    question_window,
+)
+
+NOW = pytz.timezone("Asia/Bangkok").localize(datetime(2026, 10, 14, 9))  # a Wednesday
+TODAY = NOW.date()
+
+
+def event(start, end, summary="Meeting", **extra):
+    fields = dict(summary=summary, description="", location="", start=start, end=end, all_day=False)
+    fields.update(extra)
+    return fields
+
+
+def test_question_windows():
+    assert question_window("what about tomorrow?", TODAY) == (date(2026, 10, 15),) * 2
+    assert question_window("how is next week", TODAY) == (date(2026, 10, 19), date(2026, 10, 25))
+    assert question_window("anything this weekend", TODAY) == (
+        date(2026, 10, 17),
+        date(2026, 10, 18),
+    )
+    assert question_window("the next 3 days", TODAY) == (date(2026, 10, 14), date(2026, 10, 16))
+    assert question_window("on Monday", TODAY) == (date(2026, 10, 19),) * 2
+    assert question_window("summarize everything", TODAY) is None
+
+
+def test_past_windows():
+    assert past_window("last month", TODAY) == (date(2026, 9, 1), date(2026, 9, 30))
+    assert past_window("last quarter", TODAY) == (date(2026, 7, 1), date(2026, 9, 30))
+    assert past_window("the past 2 weeks", TODAY) == (date(2026, 9, 30), date(2026, 10, 13))
+    assert past_window("last monday", TODAY) == (date(2026, 10, 12),) * 2
+
+
+def test_rows_are_compact():
+    timed = event(
+        "2026-10-14 09:00:00",
+        "2026-10-14 10:30:00",
+        location="Room 1",
+        description="Agenda:\n  roadmap",
+    )
+    assert format_event_row(timed) == "2026-10-14 09:00-10:30 | Meeting @ Room 1 | Agenda: roadmap"
+    offsite = dict(event("2026-10-15", "2026-10-18", "Offsite"), all_day=True)
+    assert format_event_row(offsite) == "2026-10-15..2026-10-17 all-day | Offsite"
+
+
+def test_only_the_questions_window_is_included():
+    events = [
+        event("2026-10-14 09:00:00", "2026-10-14 10:00:00", "Today"),
+        event("2026-10-15 09:00:00", "2026-10-15 10:00:00", "Tomorrow"),
+    ]
+    prompt, stats = build_calendar_prompt(events, "what about tomorrow?", now=NOW)
+    assert "Tomorrow" in prompt and "| Today" not in prompt
+    assert stats.events_total == 2 and stats.events_included == 1
+    assert stats.window == "from 2026-10-15 to 2026-10-15"
+
+
+def test_rows_stop_at_the_token_budget():
+    events = [
+        event(f"2026-10-{day} 09:00:00", f"2026-10-{day} 10:00:00", f"Event {day}")
+        for day in range(14, 31)
+    ]
+    small, stats = build_calendar_prompt(events, "anything?", now=NOW, token_budget=200)
+    assert 0 < stats.events_included < len(events)
+    assert f"... {len(events) - stats.events_included} more events omitted" in small
+    full, stats = build_calendar_prompt(events, "anything?", now=NOW, token_budget=10**6)
+    assert stats.events_included == len(events)
+    assert len(full) > len(small)
+
+
+def test_series_occurrences_share_a_row():
+    recurrence = {"series_id": "standup", "rule": "weekdays", "except": ["2026-10-15"]}
+    events = [
+        event(f"2026-10-{day} 09:00:00", f"2026-10-{day} 09:15:00", "Standup", recurrence=recurrence)
+        for day in (14, 16, 19)
+    ]
+    prompt, stats = build_calendar_prompt(events, "anything?", now=NOW)
+    assert (
+        "2026-10-14..2026-10-19 09:00-09:15 | Standup | repeats weekdays (3 times), "
+        "except 2026-10-15"
+    ) in prompt
+    assert stats.events_included == 3
+
+
+def test_prompt_stats_are_logged_not_printed(caplog, capsys):
+    stats = PromptStats(2, 1, 50, "from 2026-10-15 to 2026-10-15")
+    with caplog.at_level(logging.DEBUG, logger="calendar_core"):
+        calendar_core.log_prompt_stats(None, "x" * 200, stats)
+    assert capsys.readouterr().out == ""
+    assert caplog.messages == [
+        "AI prompt: 1/2 events from 2026-10-15 to 2026-10-15, 200 chars, "
+        "~50 tokens estimated, n/a measured"
+    ]
@@ -0,0 +1,87 @@
+"""Recurring series descriptions and expansion."""
+from datetime import datetime, timedelta
+
+import pytz
+
+from recurrence import Series, describe_recurrence, describe_rule
+
+
+def test_describes_rules_in_words():
+    first = datetime(2026, 10, 13, 14)
+    assert describe_rule("FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR", first) == "weekdays"
+    assert describe_rule("FREQ=WEEKLY;BYDAY=TU", first) == "every Tuesday"
+    assert describe_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH", first) == (
+        "every 2 weeks on Tue, Thu"
+    )
+    assert describe_rule("FREQ=WEEKLY", first) == "every Tuesday"
+    assert describe_rule("FREQ=DAILY;INTERVAL=3", first) == "every 3 days"
+    assert describe_rule("FREQ=MONTHLY;BYDAY=2TU", first) == "monthly on the second Tuesday"
+    assert describe_rule("FREQ=MONTHLY", first) == "monthly on day 13"
+    assert describe_rule("FREQ=YEARLY;UNTIL=20301231T000000Z", first) == (
+        "yearly on Oct 13 until 2030-12-31"
+    )
+
+
+def test_weekday_follows_the_readers_date():
+    # Tuesday 14:00 in New York is Wednesday 01:00 in Bangkok
+    lines = ("RRULE:FREQ=WEEKLY;BYDAY=TU",)
+    first = "2026-10-13T14:00:00-04:00"
+    assert describe_recurrence(lines, first, "America/New_York")[0] == "every Tuesday"
+    assert describe_recurrence(lines, first, "Asia/Bangkok")[0] == "every Wednesday"
+
+
+def test_weekday_shifts_back_across_the_date_line():
+    # Monday and Thursday 09:00 in Auckland are Sunday and Wednesday in Los Angeles
+    lines = ("RRULE:FREQ=WEEKLY;BYDAY=MO,TH",)
+    first = "2026-10-19T09:00:00+13:00"
+    assert describe_recurrence(lines, first, "Pacific/Auckland")[0] == "every Mon, Thu"
+    assert describe_recurrence(lines, first, "America/Los_Angeles")[0] == "every Sun, Wed"
+    daily = ("RRULE:FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR",)
+    assert describe_recurrence(daily, first, "America/Los_Angeles")[0] == (
+        "every Sun, Mon, Tue, Wed, Thu"
+    )
+
+
+def test_unshiftable_weekdays_are_left_out():
+    lines = ("RRULE:FREQ=MONTHLY;BYDAY=2TU",)
+    first = "2026-10-13T14:00:00-04:00"
+    assert describe_recurrence(lines, first, "Asia/Bangkok")[0] == "monthly"
+    assert describe_recurrence(("RRULE:FREQ=MONTHLY",), first, "Asia/Bangkok")[0] == (
+        "monthly on day 14"
+    )
+
+
+def test_exceptions_are_dates_in_the_readers_timezone():
+    lines = (
+        "RRULE:FREQ=WEEKLY;BYDAY=TU",
+        "EXDATE;TZID=America/New_York:20261020T140000",
+    )
+    first = "2026-10-13T14:00:00-04:00"
+    assert describe_recurrence(lines, first, "Asia/Bangkok")[1] == ("2026-10-21",)
+
+
+def test_all_day_series_keep_their_dates():
+    lines = ("RRULE:FREQ=WEEKLY;BYDAY=TU",)
+    assert describe_recurrence(lines, "2026-10-13", "Asia/Bangkok")[0] == "every Tuesday"
+
+
+def test_expands_occurrences_in_the_series_wall_clock():
+    series = Series(
+        {
+            "id": "standup",
+            "summary": "Standup",
+            "start": {"dateTime": "2026-10-30T09:00:00-04:00", "timeZone": "America/New_York"},
+            "end": {"dateTime": "2026-10-30T09:15:00-04:00", "timeZone": "America/New_York"},
+            "recurrence": ["RRULE:FREQ=DAILY;COUNT=4", "EXDATE;TZID=America/New_York:20261031T090000"],
+        }
+    )
+    start = pytz.utc.localize(datetime(2026, 10, 30))
+    occurrences = series.occurrences(start, start + timedelta(days=7))
+    starts = [occurrence[0] for occurrence in occurrences]
+    # US DST ends on Nov 1: 09:00 stays 09:00 local, one hour later in UTC
+    assert starts == [
+        pytz.utc.localize(datetime(2026, 10, 30, 13)),
+        pytz.utc.localize(datetime(2026, 11, 1, 14)),
+        pytz.utc.localize(datetime(2026, 11, 2, 14)),
+    ]
+    assert all(occurrence[2]["recurringEventId"] == "standup" for occurrence in occurrences)
@@ -0,0 +1,181 @@
+"""Upstream error classification, rate limits, retries and the circuit breaker."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from resilience import (
+    AuthError,
+    CircuitBreaker,
+    CircuitOpenError,
+    QuotaError,
+    TokenBucket,
+    TransientError,
+    Upstream,
+    classify,
+)
+
+
+class Response(dict):
+    status = None
+
+
+class HttpError(Exception):
+    """Shaped like googleapiclient's HttpError."""
+
+    def __init__(self, status, reasons=(), retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.resp = Response({"retry-after": retry_after} if retry_after else {})
+        self.resp.status = status
+        self.content = json.dumps(
+            {"error": {"errors": [{"reason": reason} for reason in reasons]}}
+        )
+
+
+@pytest.mark.parametrize(
+    "error, kind",
+    [
+        (HttpError(429), "quota"),
+        (HttpError(403, ["rateLimitExceeded"]), "quota"),
+        (HttpError(403, ["forbidden"]), "auth"),
+        (HttpError(401), "auth"),
+        (HttpError(503), "transient"),
+        (TimeoutError(), "transient"),
+        (HttpError(404), None),
+        (ValueError(), None),
+    ],
+)
+def test_classify(error, kind):
+    result = classify("calendar", error)
+    assert (result and result.kind) == kind
+
+
+def test_classify_reads_retry_after():
+    assert classify("calendar", HttpError(429, retry_after="3")).retry_after == 3.0
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    bucket.cancel()
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_circuit_opens_after_repeated_failures_and_closes_after_a_trial():
+    breaker = CircuitBreaker("calendar", threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.reset_seconds = 0
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # one trial at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker("calendar", threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opens == 2
+
+
+def failing(*errors, result="ok"):
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return call
+
+
+def upstream(**kwargs):
+    options = dict(rate=0, burst=1, base_delay=0, max_delay=1, max_attempts=3)
+    options.update(kwargs)
+    return Upstream("calendar", **options)
+
+
+def test_retries_transient_failures():
+    calendar = upstream()
+    assert calendar.call(failing(HttpError(503), HttpError(429))) == "ok"
+    assert calendar.stats["retries"] == 2
+    assert calendar.breaker.state == "closed"
+
+
+def test_gives_up_after_max_attempts():
+    calendar = upstream()
+    with pytest.raises(TransientError):
+        calendar.call(failing(*[HttpError(500)] * 3))
+    assert calendar.breaker.failures == 1
+
+
+def test_auth_and_caller_errors_are_not_retried():
+    calendar = upstream()
+    with pytest.raises(AuthError):
+        calendar.call(failing(HttpError(401)))
+    with pytest.raises(HttpError):
+        calendar.call(failing(HttpError(404)))
+    assert calendar.stats["retries"] == 0
+
+
+def test_retry_after_beyond_the_longest_delay_fails_fast():
+    calendar = upstream()
+    with pytest.raises(QuotaError):
+        calendar.call(failing(HttpError(429, retry_after="30")))
+    assert calendar.stats["retries"] == 0
+
+
+def test_local_rate_limit_refuses_long_waits():
+    calendar = upstream(rate=0.1, burst=1, max_wait=0.5)
+    calendar.call(failing())
+    with pytest.raises(QuotaError):
+        calendar.call(failing())
+    assert calendar.stats["rate_limited"] == 1
+
+
+def test_each_user_gets_a_share_of_the_rate():
+    calendar = upstream(rate=0.1, burst=2, user_share=0.5, max_wait=0.5)
+    calendar.call(failing(), user="alice")
+    with pytest.raises(QuotaError):
+        calendar.call(failing(), user="alice")
+    calendar.call(failing(), user="bob")
+
+
+@pytest.mark.parametrize(
+    "env, rate",
+    [
+        ({}, 0.0),
+        ({"CALENDAR_RATE_PER_SECOND": "5"}, 5.0),
+        ({"CALENDAR_RATE_PER_SECOND": "5", "CALENDAR_BACKEND": "ics"}, 0.0),
+    ],
+)
+def test_calendar_rate_limit_is_opt_in(env, rate):
+    # Limits are read at import, so check them in a fresh interpreter
+    clean = {
+        name: value
+        for name, value in os.environ.items()
+        if name not in ("CALENDAR_RATE_PER_SECOND", "CALENDAR_BACKEND")
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", "import resilience; print(resilience.RATE_LIMITS['calendar'][0])"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**clean, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert float(output) == rate
@@ -0,0 +1,60 @@
+"""AI response cache keys and expiry."""
+from response_cache import ResponseCache, cache_key, normalize_question
+
+EVENTS = [{"summary": "Standup", "start": "2026-10-19T09:00:00Z"}]
+DAY = "2026-10-19"
+
+
+def key(question, events=EVENTS, timezone="UTC", day=DAY):
+    return cache_key(question, events, timezone, day)
+
+
+def test_normalization_ignores_case_punctuation_and_greetings():
+    assert normalize_question("Hey, what's on   my calendar today? Please!") == (
+        "what s on my calendar today"
+    )
+    assert key("What's on my calendar today?") == key("hey what's on my calendar today")
+
+
+def test_questions_with_different_meaning_get_different_keys():
+    assert key("can you move my 3pm") != key("move my 3pm")
+    assert key("tell me about my day") != key("about my day")
+
+
+def test_key_depends_on_events_timezone_and_day():
+    moved = [{"summary": "Standup", "start": "2026-10-19T10:00:00Z"}]
+    base = key("what's next")
+    assert key("what's next", events=moved) != base
+    assert key("what's next", timezone="Europe/Berlin") != base
+    assert key("what's next", day="2026-10-20") != base
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(ttl=60, max_entries=10, db_path="")
+    cache.put("k", "answer")
+    now[0] += 59
+    assert cache.get("k") == "answer"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(ttl=60, max_entries=2, db_path="")
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_entries_survive_restart_when_persisted(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(ttl=60, max_entries=10, db_path=path).put("k", "answer")
+    reopened = ResponseCache(ttl=60, max_entries=10, db_path=path)
+    assert reopened.get("k") == "answer"
+    assert reopened.snapshot()["disk_hits"] == 1
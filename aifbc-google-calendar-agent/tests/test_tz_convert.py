@@ -0,0 +1,69 @@
+"""Batch timezone conversion of event times."""
+from datetime import datetime
+
+import pytz
+
+from calendar_core import format_events
+from tz_convert import convert_batch, format_iso, local_to_epoch, parse_epoch
+
+
+def reference(value, timezone_str):
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment.astimezone(pytz.timezone(timezone_str)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def test_batch_matches_pytz_across_dst_changes():
+    values = [
+        "2026-03-08T06:59:59Z",
+        "2026-03-08T07:00:00Z",
+        "2026-11-01T05:30:00Z",
+        "2026-11-01T06:30:00Z",
+        "2026-10-19T09:00:00+07:00",
+    ]
+    for timezone_str in ("America/New_York", "Asia/Kolkata", "UTC"):
+        converted = convert_batch(values, timezone_str)
+        assert [item.formatted for item in converted] == [
+            reference(value, timezone_str) for value in values
+        ]
+        assert [item.epoch for item in converted] == [parse_epoch(value) for value in values]
+        assert all(item.error is None for item in converted)
+
+
+def test_all_day_dates_are_kept():
+    [converted] = convert_batch(["2026-10-19"], "America/Los_Angeles")
+    assert converted.formatted == "2026-10-19"
+    assert converted.epoch == parse_epoch("2026-10-19")
+
+
+def test_bad_values_fail_alone():
+    converted = convert_batch(["not a time", None, "2026-10-19T09:00:00Z"], "Asia/Bangkok")
+    assert converted[0].epoch is None and converted[0].error.startswith("Invalid timestamp")
+    assert converted[0].formatted == "not a time"
+    assert converted[1].error is not None
+    assert converted[2] == ("2026-10-19 16:00:00", parse_epoch("2026-10-19T09:00:00Z"), None)
+
+
+def test_bad_event_time_is_reported_on_that_event():
+    events = [
+        {
+            "summary": "Broken",
+            "start": {"dateTime": "tomorrow-ish"},
+            "end": {"dateTime": "2026-10-19T10:00:00Z"},
+        },
+        {
+            "summary": "Fine",
+            "start": {"dateTime": "2026-10-19T09:00:00Z"},
+            "end": {"dateTime": "2026-10-19T10:00:00Z"},
+        },
+    ]
+    broken, fine = format_events(events, "Asia/Bangkok")
+    assert broken["start"] == "tomorrow-ish"
+    assert "Invalid timestamp" in broken["error"]
+    assert fine["start"] == "2026-10-19 16:00:00" and "error" not in fine
+
+
+def test_local_to_epoch_and_format_iso_round_trip():
+    local = parse_epoch("2026-07-01T09:00:00")
+    epoch = local_to_epoch("America/New_York", local)
+    assert epoch == parse_epoch("2026-07-01T13:00:00Z")
+    assert format_iso(local, -4 * 3600) == "2026-07-01T09:00:00-04:00"
@@ -0,0 +1,67 @@
+"""Only the proxy holding AGENT_SHARED_SECRET may name a user."""
+import pytest
+
+import server
+import user_credentials
+from benchmarks.fake_calendar import FakeCalendarService
+
+SECRET = "proxy-secret"
+
+
+class FakeStore:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, user_id):
+        self.deleted.append(user_id)
+        return True
+
+
+class FakePool:
+    def __init__(self):
+        self.store = FakeStore()
+
+    def remove(self, user_id):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    service = FakeCalendarService({"primary": []})
+    monkeypatch.setattr(server, "get_service", lambda: service)
+    monkeypatch.setattr(user_credentials, "AGENT_SHARED_SECRET", SECRET)
+    return server.app.test_client()
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Agent-Secret": "guess"}])
+def test_user_id_needs_the_secret(client, headers):
+    response = client.get("/events", headers={"X-User-Id": "alice", **headers})
+    assert response.status_code == 401
+
+
+def test_user_id_refused_without_a_configured_secret(client, monkeypatch):
+    monkeypatch.setattr(user_credentials, "AGENT_SHARED_SECRET", "")
+    response = client.get("/events", headers={"X-User-Id": "alice", "X-Agent-Secret": ""})
+    assert response.status_code == 401
+
+
+def test_requests_without_a_user_are_unchanged(client):
+    assert client.get("/events").status_code == 200
+
+
+def test_proxy_may_name_a_user(client):
+    response = client.get("/events", headers={"X-User-Id": "alice", "X-Agent-Secret": SECRET})
+    assert response.status_code == 200
+
+
+def test_credential_routes_need_the_secret(client, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(server, "user_clients", pool)
+
+    assert client.delete("/users/alice/credentials").status_code == 401
+    assert client.put("/users/alice/credentials", json={}).status_code == 401
+    assert pool.store.deleted == []
+
+    response = client.delete("/users/alice/credentials", headers={"X-Agent-Secret": SECRET})
+    assert response.status_code == 200
+    assert pool.store.deleted == ["alice"]
@@ -0,0 +1,142 @@
+"""
+Batch timestamp conversion into a target timezone.
+
+Timezone objects and their UTC-offset transition tables are cached across
+requests. A batch is converted by parsing every timestamp to epoch seconds,
+looking up the offset with a binary search over the transition table, and
+formatting the shifted value with integer arithmetic, instead of building
+and localizing an aware datetime per value.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import pytz
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Furthest any timezone runs ahead of and behind UTC. An all-day date is a
+# different 24 hours in each timezone, but always within midnight UTC - 14h
+# and the next midnight UTC + 12h.
+MAX_AHEAD_OF_UTC = timedelta(hours=14)
+MAX_BEHIND_UTC = timedelta(hours=12)
+
+
+class ConvertedTime(NamedTuple):
+    """One converted timestamp; `error` is set when conversion failed."""
+
+    formatted: str
+    epoch: Optional[int]
+    error: Optional[str] = None
+
+
+@lru_cache(maxsize=None)
+def get_timezone(timezone_str: str):
+    """Get a cached pytz timezone, raising UnknownTimeZoneError if invalid."""
+    return pytz.timezone(timezone_str)
+
+
+@lru_cache(maxsize=256)
+def get_transitions(timezone_str: str):
+    """Get (transition epochs, UTC offsets in seconds) for a timezone.
+
+    Fixed-offset zones have no transitions and a single offset.
+    """
+    tz = get_timezone(timezone_str)
+    transition_times = getattr(tz, "_utc_transition_times", None)
+    if not transition_times:
+        offset = tz.utcoffset(datetime(2000, 1, 1))
+        return [], [int(offset.total_seconds()) if offset else 0]
+    epochs = [int((moment - _EPOCH).total_seconds()) for moment in transition_times]
+    offsets = [int(info[0].total_seconds()) for info in tz._transition_info]
+    return epochs, offsets
+
+
+def utc_offset(timezone_str: str, epoch: int) -> int:
+    """Get the UTC offset in seconds of a timezone at an instant."""
+    epochs_table, offsets = get_transitions(timezone_str)
+    if not epochs_table:
+        return offsets[0]
+    index = bisect_right(epochs_table, epoch) - 1
+    return offsets[index if index >= 0 else 0]
+
+
+def local_to_epoch(timezone_str: str, local_seconds: int) -> int:
+    """Convert wall-clock seconds in a timezone to epoch seconds.
+
+    The offset is looked up at a first guess and then at the corrected
+    instant, which resolves everything except the hour skipped or repeated by
+    a DST change (those land on one of the two valid readings).
+    """
+    guess = local_seconds - utc_offset(timezone_str, local_seconds)
+    return local_seconds - utc_offset(timezone_str, guess)
+
+
+def parse_epoch(value: str) -> int:
+    """Parse an ISO timestamp or bare date to epoch seconds (naive means UTC)."""
+    if "T" not in value:
+        return (datetime.strptime(value, "%Y-%m-%d") - _EPOCH) // timedelta(seconds=1)
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        return (dt - _EPOCH) // timedelta(seconds=1)
+    return int(dt.timestamp())
+
+
+@lru_cache(maxsize=4096)
+def _format_day(days: int) -> str:
+    return date.fromordinal(_EPOCH_ORDINAL + days).isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _format_clock(seconds: int) -> str:
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def format_local(local_seconds: int) -> str:
+    """Format local wall-clock seconds since the epoch as YYYY-MM-DD HH:MM:SS.
+
+    Calendars reuse the same days and the same few times of day over and
+    over, so both halves are memoized.
+    """
+    days, seconds = divmod(local_seconds, 86400)
+    return _format_day(days) + " " + _format_clock(seconds)
+
+
+def format_iso(local_seconds: int, offset: int) -> str:
+    """Format wall-clock seconds and their UTC offset as an RFC 3339 string."""
+    sign = "-" if offset < 0 else "+"
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    days, seconds = divmod(local_seconds, 86400)
+    return f"{_format_day(days)}T{_format_clock(seconds)}{sign}{hours:02d}:{minutes:02d}"
+
+
+def convert_batch(values, timezone_str: str = "Asia/Bangkok"):
+    """Convert many timestamps to the target timezone at once.
+
+    Timed values become "YYYY-MM-DD HH:MM:SS" local time; all-day dates are
+    calendar dates and are returned unchanged. Every value gets its epoch, and
+    values that fail to parse carry an error instead of failing the batch.
+    """
+    epochs_table, offsets = get_transitions(timezone_str)
+    fixed_offset = offsets[0] if not epochs_table else None
+
+    results = []
+    for value in values:
+        try:
+            epoch = parse_epoch(value)
+        except (TypeError, ValueError) as e:
+            results.append(ConvertedTime(value, None, f"Invalid timestamp: {e}"))
+            continue
+        if "T" not in value:
+            results.append(ConvertedTime(value, epoch))
+            continue
+        if fixed_offset is not None:
+            offset = fixed_offset
+        else:
+            index = bisect_right(epochs_table, epoch) - 1
+            offset = offsets[index if index >= 0 else 0]
+        results.append(ConvertedTime(format_local(epoch + offset), epoch))
+    return results
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+"""
+Per-user Google credentials and a pool of authorized Calendar clients.
+
+Credentials are kept in SQLite, one row per user, encrypted with Fernet
+(USER_CREDENTIALS_KEY). Requests that name their user (X-User-Id) are served
+with that user's own Calendar client, taken from a bounded LRU pool:
+clients idle for longer than USER_CLIENT_IDLE_SECONDS, or beyond the
+MAX_USER_CLIENTS most recently used, are dropped along with their
+transports. Concurrent requests for a user whose client is not in the pool
+share one load from the store, and share one token refresh through the
+client's CalendarServiceHolder; refreshed tokens are written back to the
+store.
+
+X-User-Id is only honored from the proxy that authenticated the user: the
+request must carry X-Agent-Secret matching AGENT_SHARED_SECRET, which also
+guards the credential routes (see trusted_caller).
+
+Each user's primary calendar is addressed by its real ID (the account's
+email address) rather than "primary", so their events get cache entries of
+their own.
+
+Manage the stored users with:
+    python user_credentials.py generate-key
+    python user_credentials.py add USER_ID [--token token.json] [--calendar-id ID]
+    python user_credentials.py remove USER_ID
+    python user_credentials.py list
+"""
+import argparse
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from calendar_core import SCOPES, CalendarServiceHolder, get_credentials
+from resilience import AuthError, call_upstream, classify
+from single_flight import SingleFlight
+
+# Path of the SQLite credential store; empty keeps the agent single-user.
+USER_CREDENTIALS_DB = os.getenv("USER_CREDENTIALS_DB", "")
+# Fernet key the stored credentials are encrypted with (see generate-key).
+USER_CREDENTIALS_KEY = os.getenv("USER_CREDENTIALS_KEY", "")
+MAX_USER_CLIENTS = int(os.getenv("MAX_USER_CLIENTS", "256"))
+USER_CLIENT_IDLE_SECONDS = float(os.getenv("USER_CLIENT_IDLE_SECONDS", "900"))
+# Shared with the proxy; without it no caller may name a user.
+AGENT_SHARED_SECRET = os.getenv("AGENT_SHARED_SECRET", "")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_credentials (
+    user_id TEXT PRIMARY KEY,
+    calendar_id TEXT,
+    credentials BLOB NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class CredentialStore:
+    """Encrypted per-user OAuth credentials in SQLite."""
+
+    def __init__(self, path, key):
+        from cryptography.fernet import Fernet
+
+        if not key:
+            raise ValueError("USER_CREDENTIALS_KEY is required for the credential store")
+        self.path = path
+        self._fernet = Fernet(key)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        self.stats = {"loads": 0, "saves": 0, "missing": 0}
+
+    def load(self, user_id):
+        """Get (authorized-user info, calendar ID or None) for a user, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT credentials, calendar_id FROM user_credentials WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            self.stats["loads" if row is not None else "missing"] += 1
+        if row is None:
+            return None
+        return json.loads(self._fernet.decrypt(row[0])), row[1]
+
+    def save(self, user_id, info, calendar_id=None):
+        """Store a user's authorized-user info (Credentials.to_json() fields).
+
+        A None calendar_id keeps the one already stored.
+        """
+        token = self._fernet.encrypt(json.dumps(info).encode("utf-8"))
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO user_credentials VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET credentials = excluded.credentials, "
+                "calendar_id = COALESCE(excluded.calendar_id, calendar_id), "
+                "updated_at = excluded.updated_at",
+                (user_id, calendar_id, token, time.time()),
+            )
+            self.stats["saves"] += 1
+
+    def delete(self, user_id):
+        """Remove a user's credentials; returns whether there were any."""
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "DELETE FROM user_credentials WHERE user_id = ?", (user_id,)
+            )
+            return cursor.rowcount > 0
+
+    def users(self):
+        """List (user_id, calendar_id, updated_at) for every stored user."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT user_id, calendar_id, updated_at FROM user_credentials "
+                "ORDER BY user_id"
+            ).fetchall()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["users"] = self._db.execute(
+                "SELECT COUNT(*) FROM user_credentials"
+            ).fetchone()[0]
+            return stats
+
+
+class UserClient:
+    """A pooled user's service holder and primary calendar ID."""
+
+    __slots__ = ("holder", "calendar_id", "last_used")
+
+    def __init__(self, holder, calendar_id):
+        self.holder = holder
+        self.calendar_id = calendar_id
+        self.last_used = time.monotonic()
+
+
+class UserClientPool:
+    """Bounded LRU of authorized Calendar clients, one per user."""
+
+    def __init__(
+        self,
+        store,
+        max_clients=MAX_USER_CLIENTS,
+        idle_seconds=USER_CLIENT_IDLE_SECONDS,
+        token_uri=None,
+    ):
+        self.store = store
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        # Token endpoint to refresh against instead of Google's (benchmarks);
+        # a token_uri in stored credentials is never trusted.
+        self.token_uri = token_uri
+        self._lock = threading.Lock()
+        # user_id -> UserClient, least recently used first
+        self._clients = OrderedDict()
+        # Concurrent misses for one user share a single load from the store
+        self._loads = SingleFlight()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "idle_evictions": 0,
+            "refreshes": 0,
+            "unknown_users": 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _evict_locked(self, now):
+        """Drop idle clients, then the least recently used beyond the limit."""
+        while self._clients:
+            client = next(iter(self._clients.values()))
+            if now - client.last_used < self.idle_seconds:
+                break
+            # Requests still using the client keep it alive until they finish
+            self._clients.popitem(last=False)
+            self.stats["idle_evictions"] += 1
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _load(self, user_id):
+        from google.oauth2.credentials import Credentials
+
+        stored = self.store.load(user_id)
+        if stored is None:
+            self._count("unknown_users")
+            raise AuthError("calendar", f"No stored Google credentials for user {user_id}")
+        info, calendar_id = stored
+
+        def save_refreshed(creds):
+            self.store.save(user_id, json.loads(creds.to_json()))
+            self._count("refreshes")
+
+        creds = Credentials.from_authorized_user_info(info, SCOPES)
+        if self.token_uri is not None:
+            expiry = creds.expiry
+            creds = creds.with_token_uri(self.token_uri)
+            creds.expiry = expiry
+        holder = CalendarServiceHolder(
+            token_path=None,
+            creds=creds,
+            interactive=False,
+            on_refresh=save_refreshed,
+        )
+        client = UserClient(holder, calendar_id)
+        with self._lock:
+            self._clients[user_id] = client
+            self._evict_locked(time.monotonic())
+        return client
+
+    def _client(self, user_id):
+        with self._lock:
+            now = time.monotonic()
+            self._evict_locked(now)
+            client = self._clients.get(user_id)
+            if client is not None:
+                self._clients.move_to_end(user_id)
+                client.last_used = now
+                self.stats["hits"] += 1
+                return client
+            self.stats["misses"] += 1
+        return self._loads.do(("user_client", user_id), lambda: self._load(user_id))
+
+    def get(self, user_id):
+        """Get (Calendar service, primary calendar ID) for a user.
+
+        Raises AuthError for users without stored credentials and for
+        credentials that can no longer be refreshed.
+        """
+        client = self._client(user_id)
+        try:
+            service = client.holder.get_service()
+        except Exception as e:
+            error = classify("calendar", e)
+            if error is not None:
+                raise error from e
+            raise
+        if client.calendar_id is None:
+            # Looked up once and stored: the primary calendar's ID is the
+            # account's address.
+            calendar = call_upstream(
+                "calendar",
+                lambda: service.calendars().get(calendarId="primary").execute(),
+                user_id,
+            )
+            client.calendar_id = calendar["id"]
+            stored = self.store.load(user_id)
+            if stored is not None:
+                self.store.save(user_id, stored[0], client.calendar_id)
+        return service, client.calendar_id
+
+    def remove(self, user_id):
+        """Drop a user's pooled client (e.g. after their credentials changed)."""
+        with self._lock:
+            self._clients.pop(user_id, None)
+
+    def snapshot(self):
+        """Return pool counters plus current size."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["clients"] = len(self._clients)
+            stats["max_clients"] = self.max_clients
+        stats["store"] = self.store.snapshot()
+        return stats
+
+
+def trusted_caller(headers, secret=None):
+    """Whether a request comes from the proxy holding AGENT_SHARED_SECRET."""
+    secret = AGENT_SHARED_SECRET if secret is None else secret
+    if not secret:
+        return False
+    return hmac.compare_digest(
+        headers.get("X-Agent-Secret", "").encode("utf-8"), secret.encode("utf-8")
+    )
+
+
+def open_pool():
+    """Get the pool for USER_CREDENTIALS_DB, or None when it is not set."""
+    if not USER_CREDENTIALS_DB:
+        return None
+    return UserClientPool(CredentialStore(USER_CREDENTIALS_DB, USER_CREDENTIALS_KEY))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage stored per-user Google credentials")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("generate-key", help="print a new USER_CREDENTIALS_KEY")
+    add = commands.add_parser("add", help="sign a user in (or import a token file)")
+    add.add_argument("user_id")
+    add.add_argument("--token", help="authorized-user JSON to import instead of signing in")
+    add.add_argument("--calendar-id", help="the user's primary calendar ID (email)")
+    remove = commands.add_parser("remove", help="delete a user's credentials")
+    remove.add_argument("user_id")
+    commands.add_parser("list", help="list stored users")
+    args = parser.parse_args()
+
+    if args.command == "generate-key":
+        from cryptography.fernet import Fernet
+
+        print(Fernet.generate_key().decode("ascii"))
+        return
+    if not USER_CREDENTIALS_DB:
+        parser.error("USER_CREDENTIALS_DB is not set")
+    store = CredentialStore(USER_CREDENTIALS_DB, USER_CREDENTIALS_KEY)
+
+    if args.command == "add":
+        if args.token:
+            with open(args.token) as token:
+                info = json.load(token)
+        else:
+            # Signs in through the browser without touching token.json
+            import tempfile
+
+            with tempfile.TemporaryDirectory() as directory:
+                creds = get_credentials(os.path.join(directory, "token.json"))
+            info = json.loads(creds.to_json())
+        store.save(args.user_id, info, args.calendar_id)
+        print(f"Stored credentials for {args.user_id}")
+    elif args.command == "remove":
+        found = store.delete(args.user_id)
+        print(f"Removed {args.user_id}" if found else f"No credentials for {args.user_id}")
+    else:
+        for user_id, calendar_id, updated_at in store.users():
+            updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(updated_at))
+            print(f"{user_id}\t{calendar_id or '-'}\t{updated}")
+
+
+if __name__ == "__main__":
+    main()